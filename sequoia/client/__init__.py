@@ -1,2 +1,4 @@
 from .setting_proxy import SettingProxy
-from .env_proxy import EnvironmentProxy
\ No newline at end of file
+from .env_proxy import EnvironmentProxy
+from .remote import RemoteClient, RemoteObject
+from .server import EnvironmentServer, start_local_server
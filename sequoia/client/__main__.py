@@ -1,14 +1,35 @@
-""" TODO: launch the 'sequoia gRPC server' at a given address / port. """
+""" Launches a Sequoia environment server at a given address / port. """
 import argparse
+import os
+import secrets
+
 from .server import server
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument("--ip", type=str, help="gRPC host ip", default="")
-    parser.add_argument("-p", "--port", type=int, help="gRPC port", default=13337)
+    parser.add_argument("--ip", type=str, help="Server host ip", default="localhost")
+    parser.add_argument("-p", "--port", type=int, help="Server port", default=13337)
+    parser.add_argument(
+        "--authkey",
+        type=str,
+        help="Authentication key that clients need to use (hex string). Generated "
+        "randomly when not set.",
+        default=os.environ.get("SEQUOIA_SERVER_AUTHKEY"),
+    )
+    parser.add_argument(
+        "--shared_memory",
+        action="store_true",
+        help="Send large buffers through shared memory (clients on the same machine).",
+    )
     args = parser.parse_args()
 
+    authkey: str = args.authkey or secrets.token_hex(32)
+    if not args.authkey:
+        print(f"Authentication key: {authkey}")
+
     server(
-        grpc_host=args.ip,
-        grpc_port=args.port,
+        host=args.ip,
+        port=args.port,
+        authkey=bytes.fromhex(authkey),
+        shared_memory=args.shared_memory,
     )
@@ -1,6 +1,8 @@
-"""TODO: Create an 'environment proxy' that relays observations / actions etc from a remote environment via gRPC.
+""" 'Environment proxy' that relays observations / actions etc from an environment.
 
-For now this simply holds the 'remote' environment in memory.
+The environment is either held in memory, or is a `RemoteObject` living in the
+process of an `EnvironmentServer` (see `server.py`), in which case the observations,
+actions and rewards are transferred as raw binary buffers, once per (vector) step.
 """
 from typing import (
     Any,
@@ -28,17 +30,21 @@ from sequoia.settings import (
 )
 from torch import Tensor
 
+from .remote import RemoteObject, remote_type
+
 MISSING = object()
 
 
 class EnvironmentProxy(Environment[ObservationType, ActionType, RewardType]):
     def __init__(self, env_fn, setting_type: Type[Setting]):
-        # TODO: Actually interact with a given environment of the remote Setting
-        # TODO: env_fn is just a callable that returns the actual env now, but the idea
-        # is that it would perhaps be a handle/address/whatever which we could contact?
+        # NOTE: env_fn either returns the actual env, or a handle to the env on the
+        # server, when the SettingProxy uses a server.
         self.__environment = env_fn()
         # TODO: Remove this if possible
-        self._environment_type = type(self.__environment)
+        if isinstance(self.__environment, RemoteObject):
+            self._environment_type = remote_type(self.__environment)
+        else:
+            self._environment_type = type(self.__environment)
         self._setting_type = setting_type
 
         self.observation_space = self.get_attribute("observation_space")
@@ -58,7 +64,6 @@ class EnvironmentProxy(Environment[ObservationType, ActionType, RewardType]):
 
     def get_attribute(self, name: str, default: Any = MISSING) -> Any:
         if default is MISSING:
-            # TODO: actually get the value from the 'remote' env.
             return getattr(self.__environment, name)
         else:
             return getattr(self.__environment, name, default)
@@ -82,7 +87,6 @@ class EnvironmentProxy(Environment[ObservationType, ActionType, RewardType]):
         if isinstance(actions, Actions):
             actions = actions.numpy()
         actions_pkl = actions
-        # TODO: Use some kind of gRPC endpoint.
         observations_pkl, rewards_pkl, done_pkl, info_pkl = self.__environment.step(
             actions_pkl
         )
@@ -0,0 +1,183 @@
+""" Client-side handles to the objects held by an `EnvironmentServer`. """
+import weakref
+from multiprocessing.connection import Client
+from typing import Any, Callable, Dict, List, Optional
+
+from sequoia.utils.logging_utils import get_logger
+
+from .server import Address, MethodReference, Reference
+from .transport import SharedMemoryArena, _SharedMemoryReader, recv_message, send_message
+
+logger = get_logger(__file__)
+
+
+class RemoteClient:
+    """ Connection to an `EnvironmentServer`.
+
+    Parameters
+    ----------
+    address : Address
+        Address of the server (path to a Unix socket, or (host, port) tuple).
+    authkey : bytes, optional
+        Authentication key of the server.
+    shared_memory : bool, optional
+        Wether to send the large buffers of the requests (e.g. batches of actions)
+        through shared memory rather than through the connection. Only makes sense
+        when the server is on the same machine. By default False.
+    """
+
+    def __init__(
+        self, address: Address, authkey: bytes = None, shared_memory: bool = False
+    ):
+        self._conn = Client(address, authkey=authkey)
+        self._arena = SharedMemoryArena() if shared_memory else None
+        self._shm_reader = _SharedMemoryReader()
+        # Ids of the remote objects whose handles were garbage-collected. These are
+        # sent along with the next request, rather than right away, since `__del__`
+        # could be called in the middle of another request.
+        self._released: List[int] = []
+        # There is at most one handle per remote object, so that the remote object
+        # only gets released once all references to it are gone.
+        self._handles: "weakref.WeakValueDictionary[int, RemoteObject]" = (
+            weakref.WeakValueDictionary()
+        )
+        self.closed = False
+
+    def request(self, operation: str, *args) -> Any:
+        """ Sends a request to the server and returns the response value.
+
+        Exceptions raised on the server are raised again here.
+        """
+        if self.closed:
+            raise RuntimeError("Can't send requests after the client was closed.")
+        released, self._released = self._released, []
+        send_message(
+            self._conn,
+            (released, operation, *args),
+            arena=self._arena,
+            persistent_ref=_remote_id,
+        )
+        status, value = recv_message(
+            self._conn, shm_reader=self._shm_reader, load_ref=self._handle
+        )
+        if status == "error":
+            raise value
+        if isinstance(value, MethodReference):
+            return RemoteMethod(self, value.obj_id, value.name)
+        if isinstance(value, Reference):
+            return self._handle(value.obj_id)
+        return value
+
+    def create(self, function: Callable, *args, **kwargs) -> "RemoteObject":
+        """ Calls `function(*args, **kwargs)` on the server, and returns a handle to
+        the resulting object.
+        """
+        return self.request("create", function, args, kwargs)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self.request("close")
+        except (EOFError, OSError):
+            pass
+        self.closed = True
+        self._conn.close()
+        self._shm_reader.close()
+        if self._arena is not None:
+            self._arena.close()
+
+    def _handle(self, obj_id: int) -> "RemoteObject":
+        handle = self._handles.get(obj_id)
+        if handle is None:
+            if obj_id in self._released:
+                # The previous handle was collected, but the release wasn't sent yet.
+                self._released.remove(obj_id)
+            handle = RemoteObject(self, obj_id)
+            self._handles[obj_id] = handle
+        return handle
+
+    def _release(self, obj_id: int) -> None:
+        self._released.append(obj_id)
+
+
+def _remote_id(value: Any) -> Optional[int]:
+    # Handles get sent as references to the objects on the server.
+    if isinstance(value, RemoteObject):
+        return object.__getattribute__(value, "_remote_id")
+    return None
+
+
+def remote_type(handle: "RemoteObject") -> type:
+    """ Returns the type of the object on the server. """
+    client: RemoteClient = object.__getattribute__(handle, "_remote_client")
+    return client.request("type", object.__getattribute__(handle, "_remote_id"))
+
+
+class RemoteMethod:
+    """ Method of an object held by the server. """
+
+    def __init__(self, client: RemoteClient, obj_id: int, name: str):
+        self._client = client
+        self._obj_id = obj_id
+        # Keep the handle to the object alive for as long as its method is.
+        self._owner = client._handles.get(obj_id)
+        self.__name__ = name
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self._client.request("call", self._obj_id, self.__name__, args, kwargs)
+
+    def __repr__(self) -> str:
+        return f"<RemoteMethod {self.__name__} of remote object {self._obj_id}>"
+
+
+class RemoteObject:
+    """ Handle to an object held by the server.
+
+    Attribute accesses, attribute assignments and method calls are forwarded to the
+    object on the server. The methods are looked up only once.
+    """
+
+    def __init__(self, client: RemoteClient, obj_id: int):
+        object.__setattr__(self, "_remote_client", client)
+        object.__setattr__(self, "_remote_id", obj_id)
+        object.__setattr__(self, "_remote_methods", {})
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        methods: Dict[str, RemoteMethod] = object.__getattribute__(
+            self, "_remote_methods"
+        )
+        if name in methods:
+            return methods[name]
+        value = self._remote_client.request("getattr", self._remote_id, name)
+        if isinstance(value, RemoteMethod):
+            methods[name] = value
+        return value
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        self._remote_client.request("setattr", self._remote_id, name, value)
+
+    def _call(self, name: str, *args, **kwargs) -> Any:
+        return self._remote_client.request("call", self._remote_id, name, args, kwargs)
+
+    def __len__(self) -> int:
+        return self._call("__len__")
+
+    def __iter__(self):
+        return self._call("__iter__")
+
+    def __next__(self):
+        return self._call("__next__")
+
+    def __repr__(self) -> str:
+        return f"<RemoteObject {self._remote_id}>"
+
+    def __del__(self):
+        try:
+            client: RemoteClient = object.__getattribute__(self, "_remote_client")
+            if not client.closed:
+                client._release(object.__getattribute__(self, "_remote_id"))
+        except Exception:
+            pass
@@ -1,3 +1,225 @@
+""" Server that holds a Setting (and its environments) in a separate process.
 
-def server(grpc_host: str, grpc_port: int):
-    raise NotImplementedError(f"TODO")
+The `SettingProxy` and `EnvironmentProxy` talk to this server through a
+`RemoteClient` (see `remote.py`), over a Unix socket (or a localhost TCP socket
+when Unix sockets aren't available). Messages are encoded with `transport.py`.
+
+The server keeps a registry of the objects it holds (the Setting, its environments,
+iterators over those, etc). The client can create objects, get/set their attributes
+and call their methods. Environments, iterators and other 'stateful' objects are
+returned by reference, while everything else (observations, rewards, spaces,
+results, ...) is returned by value.
+"""
+import inspect
+import itertools
+import multiprocessing as mp
+import os
+import pickle
+import secrets
+import socket
+import tempfile
+import traceback
+from collections.abc import Iterator
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Dict, Optional, Tuple, Union
+
+import gym
+
+from sequoia.settings.base import SettingABC
+from sequoia.utils.logging_utils import get_logger
+
+from .transport import SharedMemoryArena, _SharedMemoryReader, recv_message, send_message
+
+logger = get_logger(__file__)
+
+Address = Union[str, Tuple[str, int]]
+
+
+class Reference:
+    """ Reference to an object held by the server. """
+
+    def __init__(self, obj_id: int):
+        self.obj_id = obj_id
+
+
+class MethodReference(Reference):
+    """ Reference to a method of an object held by the server. """
+
+    def __init__(self, obj_id: int, name: str):
+        super().__init__(obj_id)
+        self.name = name
+
+
+def _is_sent_by_reference(value: Any) -> bool:
+    """ Returns wether `value` should be kept on the server and sent by reference. """
+    return isinstance(value, (gym.Env, Iterator, SettingABC))
+
+
+class EnvironmentServer:
+    """ Serves the requests of a `RemoteClient`, one connection at a time.
+
+    Parameters
+    ----------
+    shared_memory : bool, optional
+        Wether to send the large buffers of the responses through shared memory,
+        rather than through the connection. By default False.
+    """
+
+    def __init__(self, shared_memory: bool = False):
+        self.shared_memory = shared_memory
+        self._objects: Dict[int, Any] = {}
+        # Map from the `id` of an object to its index in `self._objects`.
+        self._ids: Dict[int, int] = {}
+        self._counter = itertools.count()
+
+    def serve(self, listener: Listener, forever: bool = False) -> None:
+        """ Accepts connections from clients and serves their requests. """
+        while True:
+            with listener.accept() as conn:
+                logger.debug(f"Accepted connection from {listener.last_accepted}")
+                self.serve_connection(conn)
+            self._objects.clear()
+            self._ids.clear()
+            if not forever:
+                break
+
+    def serve_connection(self, conn: Connection) -> None:
+        """ Serves the requests of a single client, until it closes the connection.
+        """
+        arena = SharedMemoryArena() if self.shared_memory else None
+        shm_reader = _SharedMemoryReader()
+        try:
+            while True:
+                try:
+                    request = recv_message(
+                        conn, shm_reader=shm_reader, load_ref=self._objects.__getitem__
+                    )
+                except EOFError:
+                    break
+                released, operation, *args = request
+                for obj_id in released:
+                    self._release(obj_id)
+                if operation == "close":
+                    send_message(conn, ("ok", None))
+                    break
+                try:
+                    response = ("ok", self.handle(operation, *args))
+                except Exception as exc:
+                    response = ("error", _picklable_exception(exc))
+                try:
+                    send_message(
+                        conn, response, arena=arena, persistent_ref=self._reference_id
+                    )
+                except Exception as exc:
+                    error = RuntimeError(f"Unable to send response {response}: {exc}")
+                    send_message(conn, ("error", error))
+        finally:
+            shm_reader.close()
+            if arena is not None:
+                arena.close()
+
+    def handle(self, operation: str, *args) -> Any:
+        """ Handles a single request, returning the response value. """
+        if operation == "create":
+            function, args, kwargs = args
+            return self._register(function(*args, **kwargs))
+        if operation == "getattr":
+            obj_id, name = args
+            value = getattr(self._objects[obj_id], name)
+            if inspect.ismethod(value) or inspect.isbuiltin(value):
+                return MethodReference(obj_id, name)
+            return value
+        if operation == "type":
+            (obj_id,) = args
+            return type(self._objects[obj_id])
+        if operation == "setattr":
+            obj_id, name, value = args
+            setattr(self._objects[obj_id], name, value)
+            return None
+        if operation == "call":
+            obj_id, name, args, kwargs = args
+            return getattr(self._objects[obj_id], name)(*args, **kwargs)
+        raise ValueError(f"Unknown operation: {operation!r}")
+
+    def _reference_id(self, value: Any) -> Optional[int]:
+        """ Used when sending responses: Returns the id of the reference to `value`
+        if it should be sent by reference, else None.
+        """
+        if isinstance(value, Reference):
+            return None
+        if _is_sent_by_reference(value):
+            return self._register(value).obj_id
+        return None
+
+    def _register(self, value: Any) -> Reference:
+        key = id(value)
+        if key in self._ids and self._objects.get(self._ids[key]) is value:
+            return Reference(self._ids[key])
+        obj_id = next(self._counter)
+        self._objects[obj_id] = value
+        self._ids[key] = obj_id
+        return Reference(obj_id)
+
+    def _release(self, obj_id: int) -> None:
+        value = self._objects.pop(obj_id, None)
+        if value is not None and self._ids.get(id(value)) == obj_id:
+            del self._ids[id(value)]
+
+
+def _picklable_exception(exc: Exception) -> Exception:
+    try:
+        pickle.loads(pickle.dumps(exc))
+        return exc
+    except Exception:
+        return RuntimeError(
+            f"{type(exc).__name__}: {exc}\n"
+            + "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+        )
+
+
+def _make_listener(authkey: bytes, host: str = None, port: int = 0) -> Listener:
+    if host is None and hasattr(socket, "AF_UNIX"):
+        path = os.path.join(tempfile.mkdtemp(prefix="sequoia_"), "server.sock")
+        return Listener(path, family="AF_UNIX", authkey=authkey)
+    return Listener((host or "localhost", port), family="AF_INET", authkey=authkey)
+
+
+def _run_local_server(
+    address_conn: Connection, authkey: bytes, shared_memory: bool
+) -> None:
+    listener = _make_listener(authkey)
+    address_conn.send(listener.address)
+    address_conn.close()
+    with listener:
+        EnvironmentServer(shared_memory=shared_memory).serve(listener)
+
+
+def start_local_server(
+    shared_memory: bool = False,
+) -> Tuple[mp.Process, Address, bytes]:
+    """ Starts an `EnvironmentServer` in a new process on this machine.
+
+    Returns the process, the address to connect to, and the authentication key.
+    """
+    authkey = secrets.token_bytes(32)
+    context = mp.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_local_server,
+        args=(child_conn, authkey, shared_memory),
+        name="sequoia_env_server",
+        daemon=True,
+    )
+    process.start()
+    child_conn.close()
+    address = parent_conn.recv()
+    parent_conn.close()
+    logger.debug(f"Started a local environment server at address {address}")
+    return process, address, authkey
+
+
+def server(host: str, port: int, authkey: bytes, shared_memory: bool = False):
+    """ Serves Settings and environments at the given address, until interrupted. """
+    with _make_listener(authkey, host=host, port=port) as listener:
+        logger.info(f"Serving at address {listener.address}")
+        EnvironmentServer(shared_memory=shared_memory).serve(listener, forever=True)
@@ -1,4 +1,6 @@
+import inspect
 import itertools
+import multiprocessing as mp
 import time
 import warnings
 from abc import ABC, abstractmethod
@@ -32,6 +34,8 @@ from sequoia.settings.assumptions.incremental import (
 from sequoia.settings.base import SettingABC
 
 from .env_proxy import EnvironmentProxy
+from .remote import RemoteClient
+from .server import Address, start_local_server
 
 logger = getLogger(__file__)
 
@@ -52,8 +56,9 @@ SettingType = TypeVar("SettingType", bound=Setting)
 class SettingProxy(SettingABC, Generic[SettingType]):
     """ Proxy for a Setting.
 
-    TODO: Creating the Setting locally for now, but we'd spin-up or contact a gRPC
-    service" that would have at least the following endpoints:
+    By default, the Setting is created in this process. When `local_server` is True,
+    or when a `server_address` is given, the Setting (and its environments) instead
+    live in the process of an `EnvironmentServer`, and are accessed through:
 
     - get_attribute(name: str) -> Any:
         returns the attribute from the setting, if that attribute can be read.
@@ -70,22 +75,71 @@ class SettingProxy(SettingABC, Generic[SettingType]):
     # attribute on the SettingProxy.
     # TODO: I don't think this has any effect, because we subclass SettingABC which
     # doesn't use __slots__.
-    __slots__ = ["__setting", "_setting_type", "_train_env", "_val_env", "_test_env"]
+    __slots__ = [
+        "__setting",
+        "_setting_type",
+        "_train_env",
+        "_val_env",
+        "_test_env",
+        "_client",
+        "_server_process",
+    ]
 
     def __init__(
         self,
         setting_type: Type[SettingType],
         setting_config_path: Path = None,
+        local_server: bool = False,
+        server_address: Optional[Address] = None,
+        authkey: bytes = None,
+        shared_memory: bool = False,
         **setting_kwargs,
     ):
+        """ Creates the proxy, as well as the Setting.
+
+        Parameters
+        ----------
+        setting_type : Type[SettingType]
+            Type of Setting to create.
+        setting_config_path : Path, optional
+            Path to a yaml file used to create the Setting, by default None.
+        local_server : bool, optional
+            Wether to start an `EnvironmentServer` in a separate process, and to
+            create the Setting in that process. By default False.
+        server_address : Address, optional
+            Address of an already running `EnvironmentServer` to use, by default None.
+        authkey : bytes, optional
+            Authentication key of the server at `server_address`, by default None.
+        shared_memory : bool, optional
+            Wether to use shared memory to transfer large buffers (observations,
+            actions, etc.) to and from the server. Only makes sense when the server
+            is on the same machine. By default False.
+        """
         self._setting_type = setting_type
         self.__setting: SettingType
-        if setting_config_path:
-            self.__setting = setting_type.load_benchmark(setting_config_path)
-            if setting_kwargs:
-                raise RuntimeError(
-                    f"Can't use keyword arguments when passing a path to a yaml file!"
+        self._client: Optional[RemoteClient] = None
+        self._server_process: Optional[mp.Process] = None
+        if setting_config_path and setting_kwargs:
+            raise RuntimeError(
+                f"Can't use keyword arguments when passing a path to a yaml file!"
+            )
+
+        if local_server:
+            self._server_process, server_address, authkey = start_local_server(
+                shared_memory=shared_memory
+            )
+        if server_address is not None:
+            self._client = RemoteClient(
+                server_address, authkey=authkey, shared_memory=shared_memory
+            )
+            if setting_config_path:
+                self.__setting = self._client.create(
+                    setting_type.load_benchmark, setting_config_path
                 )
+            else:
+                self.__setting = self._client.create(setting_type, **setting_kwargs)
+        elif setting_config_path:
+            self.__setting = setting_type.load_benchmark(setting_config_path)
         else:
             self.__setting = setting_type(**setting_kwargs)
         self.__setting.monitor_training_performance = True
@@ -225,6 +279,17 @@ class SettingProxy(SettingABC, Generic[SettingType]):
         method.receive_results(self, results=results)
         return results
 
+    def close(self) -> None:
+        """ Closes the connection to the server, and stops it if it was started here.
+        """
+        if self._client is not None:
+            self._client.close()
+        if self._server_process is not None:
+            self._server_process.join(timeout=10)
+            if self._server_process.is_alive():
+                self._server_process.terminate()
+            self._server_process = None
+
     def get_attribute(self, name: str) -> Any:
         value = getattr(self.__setting, name)
         if value is None:
@@ -453,7 +518,11 @@ class SettingProxy(SettingABC, Generic[SettingType]):
                 )
             )
         # TODO: Avoid duplicating the test loop here?
-        test_results = self.__setting.test_loop(method=method)
+        if self._client is not None:
+            # NOTE: The Method lives in this process, so the test loop has to run here.
+            test_results = self._setting_type.test_loop(self, method=method)
+        else:
+            test_results = self.__setting.test_loop(method=method)
 
         # was_training = method.training
         # method.set_testing()
@@ -532,6 +601,13 @@ class SettingProxy(SettingABC, Generic[SettingType]):
 
     def __getattr__(self, name: str):
         # NOTE: This only ever gets called if the attribute was not found on the
+        if self.__dict__.get("_client") is not None:
+            # NOTE: When the Setting lives in the server, its methods are run here, with
+            # this proxy as `self`, since they might need to interact with the Method.
+            # (e.g. `task_boundary_reached`, `log_results`, etc.)
+            class_attribute = getattr(self._setting_type, name, None)
+            if inspect.isfunction(class_attribute):
+                return class_attribute.__get__(self, type(self))
         if self._is_readable(name):
             print(f"Accessing missing attribute {name} from the 'remote' setting.")
             return self.get_attribute(name)
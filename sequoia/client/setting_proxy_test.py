@@ -193,3 +193,23 @@ def test_sl_track_setting_is_correct():
     assert setting.train_transforms == [Transforms.to_tensor, Transforms.three_channels]
     assert setting.val_transforms == [Transforms.to_tensor, Transforms.three_channels]
     assert setting.test_transforms == [Transforms.to_tensor, Transforms.three_channels]
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.parametrize("shared_memory", [False, True])
+def test_random_baseline_local_server(config, shared_memory: bool):
+    """ Same as `test_random_baseline`, but with the Setting and its environments
+    living in a separate process.
+    """
+    method = RandomBaselineMethod()
+    setting = SettingProxy(
+        DomainIncrementalSLSetting,
+        local_server=True,
+        shared_memory=shared_memory,
+        config=config,
+    )
+    try:
+        results = setting.apply(method, config=config)
+    finally:
+        setting.close()
+    assert 0.45 <= results.objective <= 0.55
@@ -0,0 +1,288 @@
+""" Binary message transport used between the `SettingProxy` and the env server.
+
+Messages are pickled, except for numpy arrays and torch tensors, which are taken out
+of the pickle stream and sent as raw, dtype-tagged binary buffers right after it
+(one frame per buffer). This avoids both the cost of pickling large arrays and the
+cost of encoding each value separately (e.g. as a `repeated float` in protobuf).
+
+When both ends are on the same machine, large buffers can instead be written into a
+`SharedMemoryArena`, in which case only their offset gets sent over the connection.
+
+Each message is sent as:
+1. A header frame: the number of buffers, the size of each buffer, followed by the
+   pickled "skeleton" of the message (with references in place of the buffers);
+2. One frame per buffer that isn't in shared memory.
+"""
+import io
+import pickle
+import struct
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # NOTE: `multiprocessing.shared_memory` is only available for python >= 3.8.
+    shared_memory = None
+
+# Buffers smaller than this are always sent through the connection, even when using
+# shared memory.
+SHARED_MEMORY_MIN_BYTES: int = 64 * 1024
+
+_COUNT = struct.Struct("!I")
+_SIZE = struct.Struct("!Q")
+
+
+def _is_raw_array(value: Any) -> bool:
+    return isinstance(value, np.ndarray) and not value.dtype.hasobject
+
+
+class SharedMemoryArena:
+    """ Block of shared memory, reused for each message sent by one end.
+
+    The protocol between the client and the server is strictly request/response, and
+    the receiver copies the buffers out of the arena before replying, therefore the
+    same block can be overwritten by each new message.
+    """
+
+    def __init__(self, size: int = 16 * 1024 * 1024):
+        if shared_memory is None:
+            raise RuntimeError(
+                "Shared memory transport requires python >= 3.8 "
+                "(multiprocessing.shared_memory)"
+            )
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._offset = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def size(self) -> int:
+        return self._shm.size
+
+    def reset(self, required_size: int) -> None:
+        """ Prepares the arena for a new message needing `required_size` bytes. """
+        self._offset = 0
+        if required_size > self.size:
+            # Grow the arena (by at least a factor of 2, to avoid doing it often).
+            new_size = max(required_size, 2 * self.size)
+            logger.debug(f"Growing shared memory arena to {new_size} bytes.")
+            self.close()
+            self._shm = shared_memory.SharedMemory(create=True, size=new_size)
+
+    def write(self, array: np.ndarray) -> int:
+        """ Copies `array` into the arena, returning the offset where it was written.
+        """
+        offset = self._offset
+        destination = np.ndarray(
+            array.shape, dtype=array.dtype, buffer=self._shm.buf, offset=offset
+        )
+        destination[...] = array
+        # Keep the offsets aligned to 64 bytes.
+        self._offset += (array.nbytes + 63) // 64 * 64
+        return offset
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+
+class _SharedMemoryReader:
+    """ Attaches (lazily) to the arena of the other end of a connection. """
+
+    def __init__(self):
+        self._shm: Optional["shared_memory.SharedMemory"] = None
+
+    def read(self, name: str, offset: int, dtype: np.dtype, shape: Tuple) -> np.ndarray:
+        if self._shm is None or self._shm.name != name:
+            self.close()
+            self._shm = shared_memory.SharedMemory(name=name)
+        view = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+        # Copy the array out, since the arena will be overwritten by the next message.
+        return view.copy()
+
+    def close(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(
+        self,
+        file: io.BytesIO,
+        arena: Optional[SharedMemoryArena],
+        persistent_ref: Optional[Callable[[Any], Optional[int]]],
+    ):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.buffers: List[np.ndarray] = []
+        self.shared: List[np.ndarray] = []
+        self.arena = arena
+        self.persistent_ref = persistent_ref
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple]:
+        if isinstance(obj, Tensor):
+            array = obj.detach().cpu().numpy()
+            if not _is_raw_array(array):
+                return None
+            return ("tensor", str(obj.device)) + self._add_buffer(array)
+        if _is_raw_array(obj):
+            return ("ndarray",) + self._add_buffer(obj)
+        if self.persistent_ref is not None:
+            ref = self.persistent_ref(obj)
+            if ref is not None:
+                return ("ref", ref)
+        return None
+
+    def _add_buffer(self, array: np.ndarray) -> Tuple:
+        array = np.ascontiguousarray(array)
+        if self.arena is not None and array.nbytes >= SHARED_MEMORY_MIN_BYTES:
+            # NOTE: The arrays are written into the arena in `send_message`, once we
+            # know how much space they require in total.
+            self.shared.append(array)
+            return ("shm", len(self.shared) - 1, array.dtype.str, array.shape)
+        self.buffers.append(array)
+        return ("buffer", len(self.buffers) - 1, array.dtype.str, array.shape)
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(
+        self,
+        file: io.BytesIO,
+        buffers: List[bytearray],
+        shm_offsets: Dict[int, int],
+        shm_name: Optional[str],
+        shm_reader: Optional[_SharedMemoryReader],
+        load_ref: Optional[Callable[[int], Any]],
+    ):
+        super().__init__(file)
+        self.buffers = buffers
+        self.shm_offsets = shm_offsets
+        self.shm_name = shm_name
+        self.shm_reader = shm_reader
+        self.load_ref = load_ref
+
+    def persistent_load(self, pid: Tuple) -> Any:
+        kind = pid[0]
+        if kind == "ref":
+            return self.load_ref(pid[1])
+        if kind == "tensor":
+            device = pid[1]
+            array = self._load_array(*pid[2:])
+            tensor = torch.from_numpy(array)
+            if device.startswith("cuda") and torch.cuda.is_available():
+                tensor = tensor.to(device)
+            return tensor
+        if kind == "ndarray":
+            return self._load_array(*pid[1:])
+        raise pickle.UnpicklingError(f"Unknown persistent id: {pid}")
+
+    def _load_array(self, location: str, index: int, dtype: str, shape: Tuple):
+        dtype = np.dtype(dtype)
+        if location == "shm":
+            offset = self.shm_offsets[index]
+            return self.shm_reader.read(self.shm_name, offset, dtype, shape)
+        return np.frombuffer(self.buffers[index], dtype=dtype).reshape(shape)
+
+
+def send_message(
+    conn: Connection,
+    message: Any,
+    arena: Optional[SharedMemoryArena] = None,
+    persistent_ref: Callable[[Any], Optional[int]] = None,
+) -> None:
+    """ Sends `message` through the connection, with arrays as raw binary buffers.
+
+    Parameters
+    ----------
+    conn : Connection
+        Connection to send the message through.
+    message : Any
+        Object to send. Needs to be picklable, except for the arrays/tensors it
+        contains, and the objects for which `persistent_ref` returns an id.
+    arena : SharedMemoryArena, optional
+        Shared memory arena used to transfer the large buffers, by default None.
+    persistent_ref : Callable[[Any], Optional[int]], optional
+        Function that returns an id for the objects that should be sent by
+        reference rather than by value (or None for the other objects).
+    """
+    file = io.BytesIO()
+    pickler = _Pickler(file, arena=arena, persistent_ref=persistent_ref)
+    pickler.dump(message)
+
+    shm_offsets: Dict[int, int] = {}
+    shm_name: Optional[str] = None
+    if pickler.shared:
+        # Alignment of each buffer can add up to 64 bytes.
+        arena.reset(sum(array.nbytes + 64 for array in pickler.shared))
+        shm_offsets = {i: arena.write(array) for i, array in enumerate(pickler.shared)}
+        shm_name = arena.name
+    skeleton = pickle.dumps(
+        (file.getvalue(), shm_name, shm_offsets), protocol=pickle.HIGHEST_PROTOCOL
+    )
+    header = _COUNT.pack(len(pickler.buffers)) + b"".join(
+        _SIZE.pack(array.nbytes) for array in pickler.buffers
+    )
+    conn.send_bytes(header + skeleton)
+    for array in pickler.buffers:
+        # NOTE: Sends the memory of the array directly, without copying it to bytes.
+        conn.send_bytes(array.reshape(-1).view(np.uint8))
+
+
+def recv_message(
+    conn: Connection,
+    shm_reader: Optional[_SharedMemoryReader] = None,
+    load_ref: Callable[[int], Any] = None,
+) -> Any:
+    """ Receives a message sent with `send_message`.
+
+    Parameters
+    ----------
+    conn : Connection
+        Connection to receive the message from.
+    shm_reader : _SharedMemoryReader, optional
+        Used to read the buffers from the shared memory arena of the sender, if it
+        uses one.
+    load_ref : Callable[[int], Any], optional
+        Function used to retrieve the objects that were sent by reference.
+    """
+    frame = conn.recv_bytes()
+    (n_buffers,) = _COUNT.unpack_from(frame)
+    offset = _COUNT.size
+    sizes = []
+    for _ in range(n_buffers):
+        sizes.append(_SIZE.unpack_from(frame, offset)[0])
+        offset += _SIZE.size
+    pickled, shm_name, shm_offsets = pickle.loads(frame[offset:])
+
+    buffers: List[bytearray] = []
+    for size in sizes:
+        # NOTE: Receiving into a bytearray gives writeable arrays, without a copy.
+        buffer = bytearray(size)
+        if size:
+            conn.recv_bytes_into(buffer)
+        else:
+            conn.recv_bytes()
+        buffers.append(buffer)
+
+    if shm_name is not None and shm_reader is None:
+        shm_reader = _SharedMemoryReader()
+    unpickler = _Unpickler(
+        io.BytesIO(pickled),
+        buffers=buffers,
+        shm_offsets=shm_offsets,
+        shm_name=shm_name,
+        shm_reader=shm_reader,
+        load_ref=load_ref,
+    )
+    return unpickler.load()
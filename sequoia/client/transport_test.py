@@ -0,0 +1,92 @@
+import multiprocessing as mp
+import sys
+
+import numpy as np
+import pytest
+import torch
+
+from sequoia.settings.sl import ClassIncrementalSetting
+
+from .transport import (
+    SHARED_MEMORY_MIN_BYTES,
+    SharedMemoryArena,
+    _SharedMemoryReader,
+    recv_message,
+    send_message,
+)
+
+requires_shared_memory = pytest.mark.skipif(
+    sys.version_info < (3, 8), reason="Shared memory requires python >= 3.8"
+)
+
+
+def roundtrip(message, arena: SharedMemoryArena = None):
+    sender, receiver = mp.Pipe()
+    reader = _SharedMemoryReader()
+    try:
+        send_message(sender, message, arena=arena)
+        return recv_message(receiver, shm_reader=reader)
+    finally:
+        reader.close()
+        sender.close()
+        receiver.close()
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        np.arange(10, dtype=np.uint8),
+        np.zeros((0, 3), dtype=np.float32),
+        np.array(1.5),
+        np.ones((2, 3), dtype=bool),
+        np.arange(12, dtype=np.int64).reshape(3, 4).T,
+    ],
+)
+def test_arrays_roundtrip(value: np.ndarray):
+    result = roundtrip(value)
+    assert result.dtype == value.dtype
+    assert result.shape == value.shape
+    np.testing.assert_array_equal(result, value)
+    # The received arrays should be writeable.
+    assert result.flags.writeable
+
+
+def test_nested_structure_roundtrip():
+    message = {
+        "x": torch.rand(4, 3, 8, 8),
+        "y": (np.arange(4), [1, "a", None]),
+        "z": np.array([None, 1], dtype=object),
+    }
+    result = roundtrip(message)
+    assert isinstance(result["x"], torch.Tensor)
+    assert torch.equal(result["x"], message["x"])
+    np.testing.assert_array_equal(result["y"][0], message["y"][0])
+    assert result["y"][1] == [1, "a", None]
+    assert result["z"].tolist() == [None, 1]
+
+
+def test_batch_objects_roundtrip():
+    observations = ClassIncrementalSetting.Observations(
+        x=torch.rand(2, 3, 28, 28), task_labels=torch.as_tensor([0, 1]),
+    )
+    result = roundtrip(observations)
+    assert isinstance(result, ClassIncrementalSetting.Observations)
+    assert torch.equal(result.x, observations.x)
+    assert torch.equal(result.task_labels, observations.task_labels)
+
+
+@requires_shared_memory
+def test_shared_memory_roundtrip():
+    arena = SharedMemoryArena(size=1024)
+    try:
+        big = np.random.rand(SHARED_MEMORY_MIN_BYTES // 4).astype(np.float32)
+        small = np.arange(3)
+        message = (big, small, torch.as_tensor(big))
+        result = roundtrip(message, arena=arena)
+        # The arena grows when needed.
+        assert arena.size >= 2 * big.nbytes
+        np.testing.assert_array_equal(result[0], big)
+        np.testing.assert_array_equal(result[1], small)
+        np.testing.assert_array_equal(result[2].numpy(), big)
+    finally:
+        arena.close()
@@ -34,6 +34,30 @@ def hasmethod(obj: Any, method_name: str) -> bool:
     return hasattr(obj, method_name) and callable(getattr(obj, method_name))
 
 
+class _cached_property:
+    """ Property whose value is computed once per instance, and then stored in the
+    `__dict__` of the instance.
+
+    This works with frozen dataclasses, since the value is written directly in the
+    `__dict__`, rather than through `__setattr__`. This is only used for properties
+    that depend on the (immutable) fields of a `Batch`, like its `device`.
+
+    NOTE: Using this rather than `functools.cached_property`, which requires
+    python >= 3.8.
+    """
+
+    def __init__(self, func: Callable[[Any], V]):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance: Any, owner: Type = None) -> V:
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+
 @dataclass(frozen=True, eq=False)
 class Batch(ABC, Mapping[str, T]):
     """ Abstract base class for typed, immutable objects holding tensors.
@@ -137,6 +161,8 @@ class Batch(ABC, Mapping[str, T]):
     # TODO: Remove these:
     field_names: ClassVar[List[str]]
     _namedtuple: ClassVar[Type[NamedTuple]]
+    # Names of the properties cached in the `__dict__` of the instances.
+    _cached_properties: ClassVar[Tuple[str, ...]] = ("device", "dtype", "batch_size")
 
     def __init_subclass__(cls, *args, **kwargs):
         # IDEA: By not marking 'Batch' a dataclass, we would let the subclass
@@ -153,10 +179,18 @@ class Batch(ABC, Mapping[str, T]):
         # before the dataclasses package sets the 'fields' attribute, it seems.
         cls = type(self)
         if "field_names" not in cls.__dict__:
-            type(self).field_names = [f.name for f in dataclasses.fields(self)]
+            cls.field_names = [f.name for f in dataclasses.fields(self)]
         # Create a NamedTuple type for this new subclass.
-        if "_named_tuple" not in cls.__dict__:
-            type(self)._namedtuple = namedtuple(type(self).__name__ + "Tuple", self.field_names)
+        if "_namedtuple" not in cls.__dict__:
+            cls._namedtuple = namedtuple(cls.__name__ + "Tuple", cls.field_names)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Don't pickle the cached properties (e.g. the device might be different
+        # when unpickling).
+        state = self.__dict__.copy()
+        for name in self._cached_properties:
+            state.pop(name, None)
+        return state
 
     def __iter__(self) -> Iterator[str]:
         """ Yield the 'keys' of this object, i.e. the names of the fields. """
@@ -185,14 +219,24 @@ class Batch(ABC, Mapping[str, T]):
         )
         
         
-    @singledispatchmethod
     def __getitem__(self, index: Any) -> T:
         """ Select a subset of the fields of this object. Can also be indexed
         with tuples, boolean numpy arrays or tensors, as well as None. 
         """
+        # Fast path for the most common cases (indexing with a field name or a
+        # field index), which doesn't go through the `singledispatchmethod`.
+        index_type = type(index)
+        if index_type is str:
+            return getattr(self, index)
+        if index_type is int:
+            return getattr(self, self.field_names[index])
+        return self._getitem_dispatch(index)
+
+    @singledispatchmethod
+    def _getitem_dispatch(self, index: Any) -> T:
         raise KeyError(index)
-    
-    @__getitem__.register(type(None))
+
+    @_getitem_dispatch.register(type(None))
     def _getitem_none(self, index: None) -> "Batch":
         """ Indexing with 'None' gives back a copy with all the items having an
         extra batch dimension.
@@ -200,15 +244,15 @@ class Batch(ABC, Mapping[str, T]):
         return self.with_batch_dimension()
         return getattr(self, index)
 
-    @__getitem__.register
+    @_getitem_dispatch.register
     def _getitem_by_name(self, index: str) -> Union[Tensor, Any]:
         return getattr(self, index)
 
-    @__getitem__.register
+    @_getitem_dispatch.register
     def _getitem_by_index(self, index: int) -> Union[Tensor, Any]:
         return getattr(self, self.field_names[index])
 
-    @__getitem__.register(slice)
+    @_getitem_dispatch.register(slice)
     def _getitem_with_slice(self, index: slice) -> "Batch":
         # NOTE: I don't think it would be a good idea to support slice indexing,
         # as it could be confusing and give the user the impression that it
@@ -220,12 +264,12 @@ class Batch(ABC, Mapping[str, T]):
         if index == slice(None, None, None) or index == slice(0, len(self), 1):
             return self
 
-    @__getitem__.register(type(Ellipsis))
+    @_getitem_dispatch.register(type(Ellipsis))
     def _(self: B, index) -> B:
         return self
 
-    @__getitem__.register(np.ndarray)
-    @__getitem__.register(Tensor)
+    @_getitem_dispatch.register(np.ndarray)
+    @_getitem_dispatch.register(Tensor)
     def _getitem_with_array(self, index: np.ndarray) -> B:
         """
         NOTE: Indexing with just an array uses the array as a 'mask' on all
@@ -234,7 +278,7 @@ class Batch(ABC, Mapping[str, T]):
         assert len(index) == self.batch_size
         return self[:, index]
     
-    @__getitem__.register(tuple)
+    @_getitem_dispatch.register(tuple)
     def _getitem_with_tuple(self, index: Tuple[Union[slice, Tensor, np.ndarray, int], ...]):
         """ When slicing with a tuple, if the first item is an integer, we get
         the attribute at that index and slice it with the rest.
@@ -319,8 +363,7 @@ class Batch(ABC, Mapping[str, T]):
         return self.as_namedtuple()
 
     def items(self) -> Iterable[Tuple[str, T]]:
-        for name in self.field_names:
-            yield name, getattr(self, name)
+        return [(name, getattr(self, name)) for name in self.field_names]
 
     @property
     def devices(self) -> Dict[str, Union[Optional[torch.device], Dict]]:
@@ -333,7 +376,7 @@ class Batch(ABC, Mapping[str, T]):
             for k, v in self.items()
         }
 
-    @property
+    @_cached_property
     def device(self) -> Optional[torch.device]:
         """Returns the device common to all items, or `None`.
 
@@ -373,7 +416,7 @@ class Batch(ABC, Mapping[str, T]):
             for k, v in self.items()
         }
 
-    @property
+    @_cached_property
     def dtype(self) -> Tuple[Optional[torch.dtype]]:
         """Returns the dtype common to all tensors, or None.
 
@@ -395,9 +438,7 @@ class Batch(ABC, Mapping[str, T]):
         return dtype
 
     def as_namedtuple(self) -> Tuple[T, ...]:
-        return self._namedtuple(**{
-            k: v for k, v in self.items()
-        })
+        return self._namedtuple._make([getattr(self, name) for name in self.field_names])
     
     def as_list_of_tuples(self) -> Iterable[Tuple[T, ...]]:
         """Returns an iterable of the items in the 'batch', each item as a
@@ -431,10 +472,16 @@ class Batch(ABC, Mapping[str, T]):
     #     }
 
     def to(self, *args, **kwargs):
-        def _to(item, *args_, **kwargs_):
-            if hasattr(item, "to") and callable(item.to):
-                return item.to(*args_, **kwargs_)
-            return item
+        """ Moves and/or casts all the items, returning a new object of the same
+        type. Returns `self` when no item is changed (e.g. if all the tensors are
+        already on the given device).
+        """
+        if len(args) <= 1 and kwargs.keys() <= {"device", "non_blocking"}:
+            # Fast path: Only moving between devices, and already on that device.
+            device = args[0] if args else kwargs.get("device")
+            if isinstance(device, (str, torch.device)):
+                if self.device == torch.device(device):
+                    return self
         return self._map(_to, *args, **kwargs, recursive=True)
 
     def float(self, dtype=torch.float):
@@ -516,7 +563,7 @@ class Batch(ABC, Mapping[str, T]):
             for k, v in self.items()
         }
 
-    @property
+    @_cached_property
     def batch_size(self) -> Optional[int]:
         """ Returns the length of the first dimension if it is common to all
         tensors in this object, else None.
@@ -622,16 +669,23 @@ class Batch(ABC, Mapping[str, T]):
         objects if `recursive` is True). 
         """
         new_items = {}
+        changed = False
         for key, value in self.items():
             if isinstance(value, Batch):
                 if not recursive:
                     # don't apply the function to nested Batch objects unless
                     # `recursive` is True.
-                    new_items[key] = value
+                    new_value = value
                 else:
-                    new_items[key] = value._map(func, *args, recursive=recursive, **kwargs)
+                    new_value = value._map(func, *args, recursive=recursive, **kwargs)
             else:
-                new_items[key] = func(value, *args, **kwargs)  # type: ignore
+                new_value = func(value, *args, **kwargs)  # type: ignore
+            new_items[key] = new_value
+            changed = changed or new_value is not value
+        if not changed:
+            # Since Batch objects are immutable, there's no need to create a new one
+            # when none of the items changed (e.g. moving to the same device).
+            return self
         return type(self)(**new_items)
 
     def _apply(self: B,
@@ -651,6 +705,12 @@ class Batch(ABC, Mapping[str, T]):
             func(value, *args, **kwargs)  # type: ignore
 
 
+def _to(item: Any, *args, **kwargs) -> Any:
+    if hasattr(item, "to") and callable(item.to):
+        return item.to(*args, **kwargs)
+    return item
+
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -2,6 +2,7 @@
 """
 
 
+import pickle
 from dataclasses import dataclass
 from typing import Dict, Type, Any, Tuple
 import pytest
@@ -480,4 +481,25 @@ def test_slicing_with_one_item():
         task_labels=torch.arange(2, dtype=int),
     )
     indices = torch.as_tensor([0])
-    assert observations.slice(indices).shapes == {"x": torch.Size([1, 5]), "task_labels": torch.Size([1])}
\ No newline at end of file
+    assert observations.slice(indices).shapes == {"x": torch.Size([1, 5]), "task_labels": torch.Size([1])}
+
+
+def test_to_same_device_returns_same_object():
+    observations = Observations(
+        x=torch.arange(10).reshape([2, 5]),
+        task_labels=torch.arange(2, dtype=int),
+    )
+    assert observations.to("cpu") is observations
+    assert observations.to(device=torch.device("cpu"), non_blocking=True) is observations
+    assert observations.to(dtype=torch.int64) is observations
+    float_observations = observations.to(dtype=torch.float)
+    assert float_observations is not observations
+    assert float_observations.dtype == torch.float
+
+
+def test_cached_properties_are_not_pickled():
+    observations = Observations(x=torch.zeros([2, 5]), task_labels=torch.arange(2))
+    assert observations.device == torch.device("cpu")
+    assert observations.batch_size == 2
+    state = pickle.loads(pickle.dumps(observations)).__dict__
+    assert "device" not in state and "batch_size" not in state
@@ -8,18 +8,14 @@ NOTE: Currently unused.
 
 import itertools
 import math
-from dataclasses import InitVar, asdict, dataclass
-from typing import Iterable, List, Optional, Tuple, Union
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
 
-import numpy as np
 import torch
 from pytorch_lightning import (Callback, LightningDataModule, LightningModule,
                                Trainer)
-from sklearn.metrics import log_loss
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.preprocessing import StandardScaler
-from torch import Tensor
-from torch.nn.functional import one_hot
+from torch import Tensor, nn
+from torch.nn import functional as F
 from torch.utils.data import DataLoader, Dataset
 from simple_parsing import field, mutable_field
 
@@ -28,23 +24,99 @@ from sequoia.common.loss import Loss
 from sequoia.settings import Setting
 from sequoia.settings.sl import ClassIncrementalSetting
 from sequoia.utils.logging_utils import get_logger, pbar
-from sequoia.utils.utils import roundrobin, take
+from sequoia.utils.utils import take
 
 logger = get_logger(__file__)
 
+# A fixed subset of the batches of a dataloader.
+Batches = List[Tuple[Tensor, Tensor]]
+
+
 @dataclass
 class KnnClassifierOptions:
     """ Set of options for configuring the KnnClassifier. """
     n_neighbors: int = field(default=5, alias="n_neighbours") # Number of neighbours.
+    # Distance metric, one of "cosine", "euclidean", "manhattan" or "minkowski".
     metric: str = "cosine"
-    algorithm: str = "auto" # See the sklearn docs
-    leaf_size: int = 30  # See the sklearn docs
-    p: int = 2  # see the sklean docs
-    n_jobs: Optional[int] = -1  # see the sklearn docs.
+    p: int = 2  # Power of the minkowski metric.
+    # Number of samples for which the distances to the training samples are
+    # computed at once.
+    block_size: int = 1024
+
+
+class KnnClassifier:
+    """ K-Nearest-Neighbours classifier, implemented with pytorch.
+
+    The inputs are standardized using the statistics of the training samples
+    (like sklearn's `StandardScaler`), and the distances are computed in blocks
+    of `options.block_size` samples, on the device of the inputs. The predicted
+    probabilities are the fraction of the neighbours with each label.
+    """
+    def __init__(self, options: KnnClassifierOptions = None):
+        self.options = options or KnnClassifierOptions()
+        self.mean: Optional[Tensor] = None
+        self.std: Optional[Tensor] = None
+        self.x: Optional[Tensor] = None
+        self.y: Optional[Tensor] = None
+
+    def fit(self, x: Tensor, y: Tensor) -> "KnnClassifier":
+        x = x.reshape(x.shape[0], -1).float()
+        self.mean = x.mean(0)
+        std = x.std(0, unbiased=False)
+        # Same as the StandardScaler: don't scale the constant features.
+        self.std = torch.where(std == 0, torch.ones_like(std), std)
+        self.x = self._transform(x)
+        self.y = y.to(x.device).long()
+        return self
+
+    def _transform(self, x: Tensor) -> Tensor:
+        x = (x.reshape(x.shape[0], -1).float() - self.mean) / self.std
+        if self.options.metric == "cosine":
+            x = F.normalize(x, dim=-1)
+        return x
+
+    def _distances(self, x: Tensor) -> Tensor:
+        metric = self.options.metric
+        if metric == "cosine":
+            # NOTE: Both `x` and `self.x` are normalized.
+            return 1 - x @ self.x.t()
+        if metric == "euclidean":
+            return torch.cdist(x, self.x)
+        if metric == "manhattan":
+            return torch.cdist(x, self.x, p=1)
+        if metric == "minkowski":
+            return torch.cdist(x, self.x, p=self.options.p)
+        raise NotImplementedError(f"Unsupported metric: {metric}")
+
+    def kneighbors(self, x: Tensor) -> Tensor:
+        """ Returns the indices of the nearest training samples of each sample. """
+        x = self._transform(x.to(self.x.device))
+        k = min(self.options.n_neighbors, self.x.shape[0])
+        return torch.cat([
+            self._distances(block).topk(k, dim=-1, largest=False).indices
+            for block in x.split(self.options.block_size)
+        ])
+
+    @torch.no_grad()
+    def predict_proba(self, x: Tensor, num_classes: int = None) -> Tensor:
+        """ Returns the fraction of the neighbours of each sample with each label.
+
+        The returned tensor has shape [n_samples, num_classes] (the number of
+        classes defaults to the largest training label + 1).
+        """
+        num_classes = max(num_classes or 0, int(self.y.max()) + 1)
+        neighbour_labels = self.y[self.kneighbors(x)]
+        return F.one_hot(neighbour_labels, num_classes).float().mean(1)
+
 
 @dataclass
 class KnnCallback(Callback): 
     """ Addon that adds the option of evaluating representations with a KNN.
+
+    The KNN is fitted on the hidden codes of a fixed subset of the training
+    samples of every task, and evaluated on fixed subsets of the validation and
+    test samples. The hidden codes are cached, and are only re-computed when
+    the parameters of the model have changed since the last evaluation.
     
     TODO: Perform the KNN evaluations in different processes using multiprocessing.
     TODO: We could even evaluate the representations of a DIFFERENT dataset with
@@ -66,6 +138,11 @@ class KnnCallback(Callback):
 
         self.model: LightningModule
         self.trainer: Trainer
+        # Fixed subsets of the batches of each dataloader, for each mode.
+        self._subsets: Dict[str, Tuple[Hashable, List[Batches]]] = {}
+        # Cached hidden codes and labels of the subsets of each mode, along with
+        # the 'fingerprint' of the model's parameters when they were computed.
+        self._hidden_codes: Dict[str, Tuple[Hashable, List[Tuple[Tensor, Tensor]]]] = {}
 
     def on_train_start(self, trainer, pl_module):
         """Called when the train begins."""
@@ -121,6 +198,50 @@ class KnnCallback(Callback):
         assert isinstance(loaders, list)
         return loaders
 
+    def get_subsets(self, model: LightningModule, mode: str) -> List[Batches]:
+        """ Returns the fixed subset of the batches of each dataloader of `mode`.
+
+        The first `max_num_batches` batches of each dataloader are only taken
+        once, so the same samples are used for the evaluations of every epoch.
+        """
+        setting = model.datamodule
+        key = (id(setting), self.max_num_batches)
+        if mode in self._subsets and self._subsets[mode][0] == key:
+            return self._subsets[mode][1]
+        subsets: List[Batches] = []
+        for dataloader in self.get_dataloaders(model, mode=mode):
+            batches = take(dataloader, n=self.max_num_batches or None)
+            subsets.append([(x.detach().cpu(), y.detach().cpu()) for x, y in batches])
+        self._subsets[mode] = (key, subsets)
+        # The hidden codes of the previous subsets are now invalid.
+        self._hidden_codes.pop(mode, None)
+        return subsets
+
+    def get_hidden_codes(self,
+                         model: LightningModule,
+                         mode: str,
+                         task_labels: bool = False) -> List[Tuple[Tensor, Tensor]]:
+        """ Returns the hidden codes and labels of the subset of each task.
+
+        The hidden codes are re-used from the previous call when the parameters
+        and buffers of the model haven't changed since.
+        """
+        subsets = self.get_subsets(model, mode)
+        key = (parameters_fingerprint(model), task_labels)
+        if mode in self._hidden_codes and self._hidden_codes[mode][0] == key:
+            logger.debug(f"Re-using the cached hidden codes for mode {mode}.")
+            return self._hidden_codes[mode][1]
+
+        hidden_codes: List[Tuple[Tensor, Tensor]] = []
+        for task_id, batches in enumerate(subsets):
+            if task_labels:
+                model.on_task_switch(task_id, training=False)
+            hidden_codes.append(
+                get_hidden_codes(model, batches, description=f"KNN ({mode}[{task_id}])")
+            )
+        self._hidden_codes[mode] = (key, hidden_codes)
+        return hidden_codes
+
     def evaluate_knn(self, model: LightningModule) -> Tuple[Loss, Loss]:
         """ Evaluate the representations with a KNN in the context of CL.
 
@@ -151,237 +272,124 @@ class KnnCallback(Callback):
         logger.info(f"Number of KNN samples: {self.knn_samples}")
         logger.debug(f"Taking a maximum of {self.max_num_batches} batches from each dataloader.")
 
+        # Save the current task ID so we can reset it after testing.
+        starting_task_id = model.setting.current_task_id
 
-        train_loaders: List[DataLoader] = self.get_dataloaders(model, mode="train")
-        valid_loaders: List[DataLoader] = self.get_dataloaders(model, mode="val")
-        test_loaders:  List[DataLoader] = self.get_dataloaders(model, mode="test")
-
-        # Only take the first `knn_samples` samples from each dataloader.
-        def shorten(dataloader: DataLoader):
-            return take(dataloader, n=self.max_num_batches)
-        
-        if self.max_num_batches:
-            train_loaders = list(map(shorten, train_loaders))
-            valid_loaders = list(map(shorten, valid_loaders))
-            test_loaders = list(map(shorten, test_loaders))
+        train_codes = self.get_hidden_codes(model, "train")
+        valid_codes = self.get_hidden_codes(model, "val", task_labels=task_labels_at_test_time)
+        test_codes = self.get_hidden_codes(model, "test", task_labels=task_labels_at_test_time)
 
-        # Create an iterator that alternates between each of the train dataloaders.
-        # NOTE: we shortened each of the dataloaders just to be sure that we get at least
-        train_loader = roundrobin(*train_loaders)
+        if task_labels_at_test_time:
+            model.on_task_switch(starting_task_id, training=False)
 
-        h_x, y = get_hidden_codes_array(
-            model=model,
-            dataloader=train_loader,
-            description="KNN (Train)"
-        )
-        train_loss, scaler, knn_classifier = fit_knn(
-            x=h_x,
-            y=y,
-            options=self.knn_options,
-            num_classes=num_classes,
-            loss_name="knn/train"
+        h_x = torch.cat([h_x for h_x, _ in train_codes])
+        y = torch.cat([y for _, y in train_codes])
+        knn_classifier = KnnClassifier(self.knn_options).fit(h_x, y)
+        train_loss, _ = get_knn_performance(
+            knn_classifier, [(h_x, y)], num_classes=num_classes, loss_name="knn/train",
         )
         logger.info(f"KNN Train Acc: {train_loss.accuracy:.2%}")
         self.log(train_loss)
-        total_valid_loss = Loss("knn/valid")
-        
-        # Save the current task ID so we can reset it after testing.
-        starting_task_id = model.setting.current_task_id
 
-        for i, dataloader in enumerate(valid_loaders):
-            if task_labels_at_test_time:
-                model.on_task_switch(i, training=False)
-            loss_i = evaluate(
-                model=model,
-                dataloader=dataloader,
-                loss_name=f"[{i}]",
-                scaler=scaler,
-                knn_classifier=knn_classifier,
-                num_classes=setting.num_classes_in_task(i)
-            )
-            # We use `.absorb(loss_i)` here so that the metrics get merged.
-            # That way, if we access `total_valid_loss.accuracy`, this gives the
-            # accuracy over all the validation tasks.
-            # If we instead used `+= loss_i`, then loss_i would become a subloss
-            # of `total_valid_loss`, since they have different names.
-            # TODO: Explain this in more detail somewhere else.
-            total_valid_loss.absorb(loss_i)
-            logger.info(f"KNN Valid[{i}] Acc: {loss_i.accuracy:.2%}")
+        total_valid_loss, valid_task_losses = get_knn_performance(
+            knn_classifier, valid_codes, num_classes=num_classes, loss_name="knn/valid",
+        )
+        for loss_i in valid_task_losses:
             self.log(loss_i)
-
-
         logger.info(f"KNN Average Valid Acc: {total_valid_loss.accuracy:.2%}")
         self.log(total_valid_loss)
 
-        total_test_loss = Loss("knn/test")
-        for i, dataloader in enumerate(test_loaders):
-            if task_labels_at_test_time:
-                model.on_task_switch(i, training=False)
-            
-            # TODO Should we set the number of classes to be the number of
-            # classes in the current task?
-
-            loss_i = evaluate(
-                model=model,
-                dataloader=dataloader,
-                loss_name=f"[{i}]",
-                scaler=scaler,
-                knn_classifier=knn_classifier,
-                num_classes=num_classes,
-            )
-            total_test_loss.absorb(loss_i)
-            logger.info(f"KNN Test[{i}] Acc: {loss_i.accuracy:.2%}")
+        total_test_loss, test_task_losses = get_knn_performance(
+            knn_classifier, test_codes, num_classes=num_classes, loss_name="knn/test",
+        )
+        for loss_i in test_task_losses:
             self.log(loss_i)
-
-        if task_labels_at_test_time:
-            model.on_task_switch(starting_task_id, training=False)
-
         logger.info(f"KNN Average Test Acc: {total_test_loss.accuracy:.2%}")
         self.log(total_test_loss)
         return total_valid_loss, total_test_loss 
 
 
-def evaluate(model: LightningModule,
-             dataloader: DataLoader,
-             loss_name: str,
-             scaler: StandardScaler,
-             knn_classifier: KNeighborsClassifier,
-             num_classes: int) -> Loss:
-    """Evaluates the 'quality of representations' using a KNN.
-
-    Assumes that the knn classifier was fitted on the same classes as
-    the ones present in the dataloader.
-
-    Args:
-        model (Classifier): a Classifier model to use to encode samples.
-        dataloader (DataLoader): a dataloader.
-        loss_name (str): name to give to the resulting loss.
-        scaler (StandardScaler): the scaler used during fitting.
-        knn_classifier (KNeighborsClassifier): The KNN classifier.
-
-    Returns:
-        Loss: The loss object containing metrics and a 'total loss'
-        which isn't a tensor in this case (since passing through the KNN
-        isn't a differentiable operation).
+def parameters_fingerprint(module: nn.Module) -> Tuple[Tuple[int, int], ...]:
+    """ Returns a cheap 'fingerprint' of the parameters and buffers of a module.
+
+    The fingerprint changes whenever a parameter or buffer is modified in-place
+    (e.g. by an optimizer step, or when the running statistics of a batchnorm
+    layer are updated) or replaced.
     """
-    h_x_test, y_test = get_hidden_codes_array(
-        model,
-        dataloader,
-        description=f"KNN ({loss_name})",
-    )
-    train_classes = set(knn_classifier.classes_)
-    test_classes = set(y_test)
-    # Check that the same classes were used.
-    assert test_classes.issubset(train_classes), (
-        f"y and y_test should contain the same classes: "
-        f"(train classes: {train_classes}, "
-        f"test classes: {test_classes})."
+    return tuple(
+        (id(tensor), tensor._version)
+        for tensor in itertools.chain(module.parameters(), module.buffers())
     )
-    test_loss = get_knn_performance(
-        x_t=h_x_test, y_t=y_test,
-        loss_name=loss_name,
-        scaler=scaler,
-        knn_classifier=knn_classifier,
-        num_classes=num_classes,
-    )
-    test_loss.loss = torch.as_tensor(test_loss.loss)
-    logger.info(f"{loss_name} Acc: {test_loss.accuracy:.2%}")
-    return test_loss
-
 
-def get_hidden_codes_array(model: LightningModule, dataloader: DataLoader, description: str="KNN") -> Tuple[np.ndarray, np.ndarray]:
-    """ Gets the hidden vectors and corresponding labels. """
-    h_x_list: List[np.ndarray] = []
-    y_list: List[np.ndarray] = []
 
-    for batch in pbar(dataloader, description, leave=False):
-        # TODO: Debug this, make sure this callback still works.
-        x, y = batch
-        assert isinstance(x, Tensor), type(x)
+@torch.no_grad()
+def get_hidden_codes(model: LightningModule,
+                     batches: Sequence[Tuple[Tensor, Tensor]],
+                     description: str = "KNN") -> Tuple[Tensor, Tensor]:
+    """ Gets the (flattened) hidden vectors and corresponding labels.
 
-        # We only do KNN with examples that have a label.
-        assert y is not None, f"Should have a 'y' for now! {x}, {y}"
-        if y is not None:
+    The model is put in evaluation mode while encoding (and then restored to its
+    previous mode), so that the running statistics of its batchnorm layers aren't
+    updated by the KNN evaluation. The hidden vectors are kept on the device of the
+    model.
+    """
+    h_x_list: List[Tensor] = []
+    y_list: List[Tensor] = []
+
+    was_training = model.training
+    model.eval()
+    try:
+        for x, y in pbar(batches, description, leave=False):
+            assert isinstance(x, Tensor), type(x)
+            # We only do KNN with examples that have a label.
+            assert y is not None, f"Should have a 'y' for now! {x}, {y}"
             # TODO: There will probably be some issues with trying to use
             # the model's encoder to encode stuff when using DataParallel or
             # DistributedDataParallel, as PL might be interfering somehow.
             h_x = model.encode(x.to(model.device))
-            h_x_list.append(h_x.detach().cpu().numpy())
-            y_list.append(y.detach().cpu().numpy())
-    codes = np.concatenate(h_x_list)
-    labels = np.concatenate(y_list)
-    return codes.reshape(codes.shape[0], -1), labels
-
-
-def fit_knn(x: np.ndarray,
-            y: np.ndarray,
-            num_classes: int,
-            options: KnnClassifierOptions=None,
-            loss_name: str="knn") -> Tuple[Loss, StandardScaler, KNeighborsClassifier]:
-    # print(x.shape, y.shape, x_t.shape, y_t.shape)
-    options = options or KnnClassifierOptions()
-   
-    scaler = StandardScaler()
-    x_s = scaler.fit_transform(x)
-    # Create and train the Knn Classifier using the options as the kwargs
-    knn_classifier = KNeighborsClassifier(**asdict(options)).fit(x_s, y)
-    train_loss = get_knn_performance(
-        x_t=x,
-        y_t=y,
-        scaler=scaler,
-        knn_classifier=knn_classifier,
-        num_classes=num_classes,
-    )
-    return train_loss, scaler, knn_classifier
+            h_x_list.append(h_x.reshape(h_x.shape[0], -1))
+            y_list.append(y.to(h_x.device))
+    finally:
+        model.train(was_training)
+    return torch.cat(h_x_list), torch.cat(y_list)
 
 
-def get_knn_performance(x_t: np.ndarray,
-                        y_t: np.ndarray,
-                        scaler: StandardScaler,
-                        knn_classifier: KNeighborsClassifier,
+def get_knn_performance(knn_classifier: KnnClassifier,
+                        hidden_codes: List[Tuple[Tensor, Tensor]],
                         num_classes: int,
-                        loss_name: str="KNN",) -> Loss:
-    # Flatten the inputs to two dimensions only.
-    x_t = x_t.reshape(x_t.shape[0], -1)
-    assert len(x_t.shape) == 2
-    x_t = scaler.transform(x_t)
-    y_t_prob = knn_classifier.predict_proba(x_t)
-
-    classes = knn_classifier.classes_
-    # make sure the classes are sorted:
-    assert np.array_equal(sorted(classes), classes)
-
-    if y_t_prob.shape[-1] == num_classes:
-        y_t_logits = y_t_prob
-    else:
-        # Not all classes were encountered, so we need to 'expand' the predicted
-        # logits to the right shape.
-        logger.info(f"{y_t_prob.shape} {num_classes}")
-        num_classes = max(num_classes, y_t_prob.shape[-1])
-
-        y_t_logits = np.zeros([y_t_prob.shape[0], num_classes], dtype=y_t_prob.dtype)
-        
-        for i, logits in enumerate(y_t_prob):
-            for label, logit in zip(classes, logits):
-                y_t_logits[i][label-1] = logit
-    
-    ## We were constructing this to reorder the classes in case the ordering was
-    ## not the same between the KNN's internal `classes_` attribute and the task
-    ## classes, However I'm not sure if this is necessary anymore.
+                        loss_name: str = "KNN") -> Tuple[Loss, List[Loss]]:
+    """ Evaluates the KNN on the hidden codes and labels of all tasks at once.
 
-    # y_t_logits = np.zeros((y_t.size, y_t.max() + 1))
-    # for i, label in enumerate(classes):
-    #     y_t_logits[:, label] = y_t_prob[:, i]
-    
-    # We get the Negative Cross Entropy using the scikit-learn function, but we
-    # could instead get it using pytorch's function (maybe even inside the
-    # Loss object!
-    nce_t = log_loss(y_true=y_t, y_pred=y_t_prob, labels=classes)
-    # BUG: There is sometimes a case where some classes aren't present in
-    # `classes_`, and as such the ClassificationMetrics object created in the
-    # Loss constructor has an error. 
-    test_loss = Loss(loss_name, loss=nce_t, y_pred=y_t_logits, y=y_t)
-    return test_loss
+    Returns a Loss with the metrics over all tasks, as well as the Loss of each
+    task.
+    """
+    h_x = torch.cat([h_x for h_x, _ in hidden_codes])
+    y = torch.cat([y for _, y in hidden_codes]).long()
+    y_prob = knn_classifier.predict_proba(h_x, num_classes=num_classes)
+    # Negative log-likelihood of the labels, clipped like sklearn's `log_loss`.
+    nll = -y_prob.gather(1, y.unsqueeze(1)).squeeze(1).clamp_min(1e-15).log()
+
+    total_loss = Loss(loss_name)
+    task_losses: List[Loss] = []
+    task_sizes = [len(task_y) for _, task_y in hidden_codes]
+    for task_id, (task_nll, task_y_prob, task_y) in enumerate(
+        zip(nll.split(task_sizes), y_prob.split(task_sizes), y.split(task_sizes))
+    ):
+        task_loss = Loss(
+            f"[{task_id}]",
+            loss=task_nll.mean().cpu(),
+            y_pred=task_y_prob.cpu(),
+            y=task_y.cpu(),
+        )
+        logger.info(f"{loss_name} [{task_id}] Acc: {task_loss.accuracy:.2%}")
+        # We use `.absorb(task_loss)` here so that the metrics get merged.
+        # That way, if we access `total_loss.accuracy`, this gives the
+        # accuracy over all the tasks.
+        # If we instead used `+= task_loss`, then task_loss would become a
+        # subloss of `total_loss`, since they have different names.
+        total_loss.absorb(task_loss)
+        task_losses.append(task_loss)
+    return total_loss, task_losses
 
 
 from simple_parsing.helpers.serialization import register_decoding_fn
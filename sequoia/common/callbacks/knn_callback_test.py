@@ -0,0 +1,95 @@
+import pytest
+import torch
+from torch import nn
+
+from .knn_callback import (KnnCallback, KnnClassifier, KnnClassifierOptions,
+                           get_knn_performance, parameters_fingerprint)
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean", "manhattan"])
+def test_knn_classifier_matches_brute_force(metric: str):
+    torch.manual_seed(123)
+    x = torch.randn(50, 8) * torch.arange(1, 9)
+    y = torch.randint(3, (50,))
+    x_test = torch.randn(20, 8) * torch.arange(1, 9)
+    # Use a small block size so the distances are computed in multiple blocks.
+    options = KnnClassifierOptions(n_neighbors=5, metric=metric, block_size=7)
+    knn = KnnClassifier(options).fit(x, y)
+
+    # Brute-force version, on the standardized inputs.
+    mean, std = x.mean(0), x.std(0, unbiased=False)
+    x_s, x_test_s = (x - mean) / std, (x_test - mean) / std
+    if metric == "cosine":
+        similarity = nn.functional.normalize(x_test_s, dim=-1) @ nn.functional.normalize(x_s, dim=-1).t()
+        distances = 1 - similarity
+    else:
+        distances = torch.cdist(x_test_s, x_s, p=2 if metric == "euclidean" else 1)
+    expected_neighbours = distances.argsort(dim=-1)[:, :5]
+    neighbours = knn.kneighbors(x_test)
+    assert torch.equal(neighbours.sort(-1).values, expected_neighbours.sort(-1).values)
+
+    y_prob = knn.predict_proba(x_test, num_classes=4)
+    assert y_prob.shape == (20, 4)
+    assert torch.allclose(y_prob.sum(-1), torch.ones(20))
+    assert (y_prob[:, 3] == 0).all()
+    for i in range(20):
+        counts = torch.bincount(y[expected_neighbours[i]], minlength=4).float()
+        assert torch.allclose(y_prob[i], counts / 5)
+
+
+def test_knn_performance_per_task():
+    x = torch.arange(6, dtype=torch.float).reshape(6, 1)
+    y = torch.as_tensor([0, 0, 0, 1, 1, 1])
+    knn = KnnClassifier(KnnClassifierOptions(n_neighbors=1, metric="euclidean")).fit(x, y)
+    # The first task is classified correctly, the second one only half of the time.
+    hidden_codes = [
+        (torch.as_tensor([[0.1], [1.9]]), torch.as_tensor([0, 0])),
+        (torch.as_tensor([[5.2], [0.2]]), torch.as_tensor([1, 1])),
+    ]
+    total_loss, task_losses = get_knn_performance(knn, hidden_codes, num_classes=2)
+    assert [loss.accuracy for loss in task_losses] == [1.0, 0.5]
+    assert total_loss.accuracy == 0.75
+
+
+def test_parameters_fingerprint_changes_after_update():
+    model = nn.Sequential(nn.Linear(3, 4), nn.BatchNorm1d(4))
+    fingerprint = parameters_fingerprint(model)
+    model.eval()
+    model(torch.randn(2, 3))
+    assert parameters_fingerprint(model) == fingerprint
+
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    model(torch.randn(2, 3)).sum().backward()
+    optimizer.step()
+    assert parameters_fingerprint(model) != fingerprint
+
+
+class DummyEncoderModel(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.encoder = nn.Sequential(nn.Linear(3, 4), nn.BatchNorm1d(4))
+        self.device = torch.device("cpu")
+        self.n_encode_calls = 0
+
+    def encode(self, x):
+        self.n_encode_calls += 1
+        return self.encoder(x)
+
+
+def test_hidden_codes_are_cached_in_train_mode():
+    model = DummyEncoderModel()
+    model.train()
+    callback = KnnCallback()
+    batches = [(torch.randn(5, 3), torch.randint(2, (5,))) for _ in range(2)]
+    callback.get_subsets = lambda model, mode: [batches]
+
+    first_codes = callback.get_hidden_codes(model, "train")
+    assert model.n_encode_calls == 2
+    # The model is encoded in evaluation mode, and then put back in training mode.
+    assert model.training
+    assert model.encoder[1].num_batches_tracked == 0
+
+    # The parameters didn't change, so the second call re-uses the hidden codes.
+    second_codes = callback.get_hidden_codes(model, "train")
+    assert model.n_encode_calls == 2
+    assert second_codes is first_codes
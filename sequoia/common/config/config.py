@@ -54,6 +54,21 @@ class Config(Serializable, Parseable):
     # Which device to use. Defaults to 'cuda' if available.
     device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+    # When to check that the actions (and observations) are in their spaces during the
+    # main loop: at every step ("always"), once every `validate_spaces_every` steps
+    # ("sample"), or only during the first `validate_spaces_first` steps ("first").
+    validate_spaces: str = choice("always", "sample", "first", default="always")
+    # Interval (in steps) between two checks when `validate_spaces` is "sample".
+    validate_spaces_every: int = 100
+    # Number of steps during which to check when `validate_spaces` is "first".
+    validate_spaces_first: int = 100
+
+    # Only create the metrics of the losses (and move the values of the losses to the
+    # CPU) when they are logged, rather than at every step.
+    lazy_metrics: bool = False
+    # Interval (in training steps) between two logs of the training losses / metrics.
+    log_losses_every: int = 1
+
     def __post_init__(self):
         self.seed_everything()
         self._display: Optional[Display] = None
@@ -50,6 +50,12 @@ class TrainerConfig(HyperParameters):
     # How much of test dataset to check (floats = percent, int = num_batches)
     limit_test_batches: Union[int, float] = 1.0
 
+    # Re-use the same Trainer for all the calls to `fit` (e.g. for all tasks), rather
+    # than creating a new one each time. The epoch counter and the early-stopping
+    # state are reset before each call to `fit`, while the loggers and callbacks are
+    # kept for the whole run.
+    reuse_trainer: bool = False
+
     def make_trainer(
         self,
         config: Config,
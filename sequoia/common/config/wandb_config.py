@@ -123,6 +123,14 @@ class WandbConfig(Serializable):
     # Save checkpoints in wandb dir to upload on W&B servers.
     log_model: bool = False
 
+    # Number of steps over which the online performance metrics are aggregated
+    # before being logged. The metrics are logged from a background thread, so
+    # logging doesn't slow down the training loop.
+    log_window_steps: int = 1
+    # Maximum number of seconds over which the online performance metrics are
+    # aggregated before being logged. When 0, only `log_window_steps` is used.
+    log_window_seconds: float = 0.0
+
     # Class variables used to check wether wandb.login has already been called or not. 
     logged_in: ClassVar[bool] = False
     key_configured: ClassVar[bool] = False
@@ -1,5 +1,7 @@
-from functools import singledispatch, wraps
-from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar, Union
+from collections.abc import Mapping
+from functools import partial, singledispatch, wraps
+from typing import (Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar,
+                    Union)
 
 import gym
 import numpy as np
@@ -10,7 +12,8 @@ from torch import Tensor
 from sequoia.common.spaces.image import Image, ImageTensorSpace
 from sequoia.common.spaces.named_tuple import NamedTupleSpace
 from sequoia.common.spaces.typed_dict import TypedDictSpace
-from sequoia.utils.generic_functions import from_tensor, move, to_tensor
+from sequoia.common.spaces.validation import should_validate
+from sequoia.utils.generic_functions import NamedTuple, from_tensor, move, to_tensor
 from sequoia.utils.logging_utils import get_logger
 from .utils import IterableWrapper, StepResult
 
@@ -36,6 +39,10 @@ class ConvertToFromTensors(IterableWrapper):
     Tensors as an input.
 
     If `device` is given, created Tensors are moved to the provided device.
+
+    The conversion functions for the observations, rewards and actions are compiled
+    once from the spaces (see `compile_to_tensor` and `compile_from_tensor`), so that
+    no type dispatch happens at each step.
     """
 
     def __init__(self, env: gym.Env, device: Union[torch.device, str] = None):
@@ -60,22 +67,29 @@ class ConvertToFromTensors(IterableWrapper):
             )
         self.reward_space = add_tensor_support(self.reward_space, device=device)
 
+        self._observation_to_tensor = compile_to_tensor(
+            self.observation_space, device=device
+        )
+        self._reward_to_tensor = compile_to_tensor(self.reward_space, device=device)
+        self._action_from_tensor = compile_from_tensor(self.action_space)
+
     def reset(self, *args, **kwargs):
         obs = self.env.reset(*args, **kwargs)
         return self.observation(obs)
 
     def observation(self, observation):
-        return to_tensor(self.observation_space, observation, device=self.device)
+        return self._observation_to_tensor(observation)
 
     def action(self, action):
-        return from_tensor(self.action_space, action)
+        return self._action_from_tensor(action)
 
     def reward(self, reward):
-        return to_tensor(self.reward_space, reward, device=self.device)
+        return self._reward_to_tensor(reward)
 
     def step(self, action: Tensor) -> StepResult:
         action = self.action(action)
-        assert action in self.env.action_space, (action, self.env.action_space)
+        if should_validate("ConvertToFromTensors.step"):
+            assert action in self.env.action_space, (action, self.env.action_space)
 
         result = self.env.step(action)
         observation, reward, done, info = result
@@ -205,3 +219,246 @@ def _add_tensor_support(space: spaces.Box, device: torch.device = None) -> space
     )
     _mark_supports_tensors(space)
     return space
+
+
+@singledispatch
+def compile_to_tensor(
+    space: Space, device: torch.device = None
+) -> Callable[[Any], Any]:
+    """ Returns a function that converts the samples of `space` into Tensors.
+
+    This is equivalent to `partial(to_tensor, space, device=device)`, but the dispatch
+    on the types of the space and of its sub-spaces is only done once, here. For
+    Dict/Tuple/TypedDict spaces, the returned function applies the converter of each
+    leaf space and rebuilds the container.
+
+    When `device` is a cuda device, the arrays of fixed-shape Box spaces are copied
+    to the device through a pinned (page-locked) staging buffer, using non-blocking
+    copies.
+
+    Spaces without a registered handler (e.g. `Sparse`) use `to_tensor` directly.
+    """
+    return partial(to_tensor, space, device=device)
+
+
+@compile_to_tensor.register(spaces.Box)
+@compile_to_tensor.register(spaces.Discrete)
+@compile_to_tensor.register(spaces.MultiDiscrete)
+def _compile_leaf_to_tensor(
+    space: Space, device: torch.device = None
+) -> Callable[[Any], Any]:
+    device = torch.device(device) if device else None
+    if device is not None and device.type == "cuda" and space.shape:
+        return _PinnedCopyToTensor(space, device=device)
+    return partial(_leaf_to_tensor, device=device, dtype=None)
+
+
+@compile_to_tensor.register
+def _compile_multibinary_to_tensor(
+    space: spaces.MultiBinary, device: torch.device = None
+) -> Callable[[Any], Any]:
+    device = torch.device(device) if device else None
+    return partial(_leaf_to_tensor, device=device, dtype=torch.bool)
+
+
+@compile_to_tensor.register
+def _compile_dict_to_tensor(
+    space: spaces.Dict, device: torch.device = None
+) -> Callable[[Any], Any]:
+    converters = [
+        (key, compile_to_tensor(subspace, device=device))
+        for key, subspace in space.spaces.items()
+    ]
+
+    def _dict_to_tensor(sample: Mapping) -> Dict[str, Any]:
+        return {key: convert(sample[key]) for key, convert in converters}
+
+    return _dict_to_tensor
+
+
+@compile_to_tensor.register
+def _compile_typed_dict_to_tensor(
+    space: TypedDictSpace, device: torch.device = None
+) -> Callable[[Any], Any]:
+    converters = [
+        (key, compile_to_tensor(subspace, device=device))
+        for key, subspace in space.items()
+    ]
+    dtype = space.dtype
+
+    def _typed_dict_to_tensor(sample: Mapping) -> Any:
+        return dtype(**{key: convert(sample[key]) for key, convert in converters})
+
+    return _typed_dict_to_tensor
+
+
+@compile_to_tensor.register
+def _compile_tuple_to_tensor(
+    space: spaces.Tuple, device: torch.device = None
+) -> Callable[[Any], Any]:
+    converters = [
+        compile_to_tensor(subspace, device=device) for subspace in space.spaces
+    ]
+
+    def _tuple_to_tensor(sample: Tuple) -> Tuple:
+        return tuple(convert(value) for convert, value in zip(converters, sample))
+
+    return _tuple_to_tensor
+
+
+@compile_to_tensor.register
+def _compile_named_tuple_to_tensor(
+    space: NamedTupleSpace, device: torch.device = None
+) -> Callable[[Any], Any]:
+    converters = [
+        (key, compile_to_tensor(subspace, device=device))
+        for key, subspace in space._spaces.items()
+    ]
+    dtype = space.dtype
+
+    def _named_tuple_to_tensor(sample: NamedTuple) -> Any:
+        return dtype(
+            **{
+                key: convert(sample[i])
+                for i, (key, convert) in enumerate(converters)
+            }
+        )
+
+    return _named_tuple_to_tensor
+
+
+def _leaf_to_tensor(
+    sample: Any, device: Optional[torch.device], dtype: Optional[torch.dtype]
+) -> Tensor:
+    if type(sample) is np.ndarray:
+        try:
+            tensor = torch.from_numpy(sample)
+        except (TypeError, ValueError):
+            # e.g. arrays with negative strides or with an unsupported dtype.
+            return torch.as_tensor(sample, device=device, dtype=dtype)
+        if dtype is not None or device is not None:
+            tensor = tensor.to(device=device, dtype=dtype, non_blocking=True)
+        return tensor
+    return torch.as_tensor(sample, device=device, dtype=dtype)
+
+
+class _PinnedCopyToTensor:
+    """ Converts the arrays of a fixed-shape space into Tensors on a cuda device,
+    copying them through a pinned staging buffer.
+
+    Before overwriting the staging buffer, we wait for the previous copy to be done,
+    since it is asynchronous.
+    """
+
+    def __init__(self, space: Space, device: torch.device):
+        self.device = device
+        self.shape = tuple(space.shape)
+        self.numpy_dtype = np.dtype(space.dtype)
+        self.buffer: Optional[Tensor] = None
+        self.copy_done: Optional[torch.cuda.Event] = None
+        try:
+            empty = np.empty(self.shape, dtype=self.numpy_dtype)
+            self.buffer = torch.from_numpy(empty).pin_memory()
+        except (TypeError, RuntimeError) as e:
+            logger.debug(f"Not using a pinned buffer for space {space}: {e}")
+
+    def __call__(self, sample: Any) -> Tensor:
+        if (
+            self.buffer is None
+            or type(sample) is not np.ndarray
+            or sample.shape != self.shape
+            or sample.dtype != self.numpy_dtype
+        ):
+            return _leaf_to_tensor(sample, device=self.device, dtype=None)
+        if self.copy_done is not None:
+            self.copy_done.synchronize()
+        self.buffer.copy_(torch.from_numpy(sample))
+        tensor = self.buffer.to(self.device, non_blocking=True)
+        self.copy_done = torch.cuda.Event()
+        self.copy_done.record(torch.cuda.current_stream(self.device))
+        return tensor
+
+
+@singledispatch
+def compile_from_tensor(space: Space) -> Callable[[Any], Any]:
+    """ Returns a function that converts Tensors into samples of `space`.
+
+    This is equivalent to `partial(from_tensor, space)`, but the dispatch on the
+    types of the space and of its sub-spaces is only done once, here.
+    """
+    return partial(from_tensor, space)
+
+
+@compile_from_tensor.register(spaces.Box)
+@compile_from_tensor.register(spaces.MultiDiscrete)
+@compile_from_tensor.register(spaces.MultiBinary)
+def _compile_leaf_from_tensor(space: Space) -> Callable[[Any], Any]:
+    return _leaf_from_tensor
+
+
+@compile_from_tensor.register
+def _compile_discrete_from_tensor(space: spaces.Discrete) -> Callable[[Any], Any]:
+    return _discrete_from_tensor
+
+
+@compile_from_tensor.register
+def _compile_dict_from_tensor(space: spaces.Dict) -> Callable[[Any], Any]:
+    converters = [
+        (key, compile_from_tensor(subspace)) for key, subspace in space.spaces.items()
+    ]
+
+    def _dict_from_tensor(sample: Mapping) -> Dict[str, Any]:
+        return {key: convert(sample[key]) for key, convert in converters}
+
+    return _dict_from_tensor
+
+
+@compile_from_tensor.register
+def _compile_typed_dict_from_tensor(space: TypedDictSpace) -> Callable[[Any], Any]:
+    converters = [
+        (key, compile_from_tensor(subspace)) for key, subspace in space.items()
+    ]
+    dtype = space.dtype
+
+    def _typed_dict_from_tensor(sample: Mapping) -> Any:
+        return dtype(**{key: convert(sample[key]) for key, convert in converters})
+
+    return _typed_dict_from_tensor
+
+
+@compile_from_tensor.register
+def _compile_tuple_from_tensor(space: spaces.Tuple) -> Callable[[Any], Any]:
+    converters = [compile_from_tensor(subspace) for subspace in space.spaces]
+
+    def _tuple_from_tensor(sample: Tuple) -> Tuple:
+        if not isinstance(sample, tuple):
+            # Same as in `from_tensor`: the sample might be an array.
+            sample = tuple(sample)
+        values = (convert(value) for convert, value in zip(converters, sample))
+        if isinstance(sample, NamedTuple):
+            return type(sample)(values)
+        return tuple(values)
+
+    return _tuple_from_tensor
+
+
+@compile_from_tensor.register(NamedTupleSpace)
+def _compile_named_tuple_from_tensor(space: NamedTupleSpace) -> Callable[[Any], Any]:
+    # NOTE: The samples given to `from_tensor` for these spaces can take many forms
+    # (namedtuples, mappings, sequences), so we just use `from_tensor` here.
+    return partial(from_tensor, space)
+
+
+def _leaf_from_tensor(sample: Any) -> Any:
+    if isinstance(sample, Tensor):
+        return sample.cpu().numpy()
+    return sample
+
+
+def _discrete_from_tensor(sample: Any) -> Any:
+    if isinstance(sample, Tensor):
+        return sample.item()
+    elif isinstance(sample, np.ndarray):
+        assert sample.size == 1, sample
+        return int(sample)
+    return sample
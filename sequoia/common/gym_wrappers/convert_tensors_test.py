@@ -1,6 +1,8 @@
 from .convert_tensors import (
     ConvertToFromTensors,
     add_tensor_support,
+    compile_from_tensor,
+    compile_to_tensor,
     to_tensor,
     from_tensor,
 )
@@ -89,4 +91,34 @@ def test_preserves_dtype_of_typeddict_space():
         dtype=Foo,
     )
     output_space = add_tensor_support(input_space)
-    assert output_space.dtype is input_space.dtype
\ No newline at end of file
+    assert output_space.dtype is input_space.dtype
+
+
+@pytest.mark.parametrize(
+    "space",
+    [
+        spaces.Box(0, 1, [4, 3, 8, 8], dtype=np.float32),
+        spaces.Discrete(3),
+        spaces.MultiDiscrete([2, 3, 4]),
+        spaces.MultiBinary(3),
+        spaces.Tuple([spaces.Box(0, 1, [2]), spaces.Discrete(2)]),
+        NamedTupleSpace(x=spaces.Box(0, 1, [2]), task_labels=spaces.Discrete(3)),
+        TypedDictSpace(
+            x=spaces.Box(0, 1, [4, 2]),
+            task_labels=spaces.MultiDiscrete([5 for _ in range(4)]),
+            dtype=Foo,
+        ),
+    ],
+)
+def test_compiled_conversions_match_generic_functions(space: gym.Space):
+    space = add_tensor_support(space)
+    sample = from_tensor(space, space.sample())
+
+    expected = to_tensor(space, sample, device="cpu")
+    converted = compile_to_tensor(space, device="cpu")(sample)
+    assert type(converted) is type(expected)
+    assert str(converted) == str(expected)
+
+    expected_sample = from_tensor(space, expected)
+    converted_sample = compile_from_tensor(space)(expected)
+    assert str(converted_sample) == str(expected_sample)
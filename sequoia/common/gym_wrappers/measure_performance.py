@@ -9,6 +9,8 @@ from sequoia.common.metrics import MetricsType
 from sequoia.settings.base import Environment
 from typing import Generic, Dict, List, Optional
 
+from sequoia.utils.wandb_log_queue import wandb_log_queue
+
 
 class MeasurePerformanceWrapper(
     IterableWrapper[EnvType], Generic[EnvType, MetricsType], ABC
@@ -40,3 +42,8 @@ class MeasurePerformanceWrapper(
             return None
         return sum(self._metrics.values())
 
+    def close(self) -> None:
+        # Make sure that all the metrics of this env are logged to wandb.
+        wandb_log_queue.flush()
+        return super().close()
+
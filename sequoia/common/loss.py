@@ -44,9 +44,22 @@ Or, consider a regression problem:
 RegressionMetrics(n_samples=4, mse=tensor(1.), l1_error=tensor(0.5000))
 
 See the `Loss` constructor for more info on which tensors are accepted.
+
+When lazy metrics are enabled (see `sequoia.common.metrics.lazy`), the Loss only keeps
+the tensors used to create its metrics, and the metrics (as well as the values of the
+losses) are only computed when the Loss is logged, or when calling `materialize`:
+
+>>> from sequoia.common.metrics import lazy_metrics
+>>> logits = torch.as_tensor([[.8, .2], [.1, .9], [.6, .4], [.3, .7]])
+>>> with lazy_metrics():
+...     loss = Loss("test", loss=torch.as_tensor(1.5), y_pred=logits, y=[0, 1, 1, 1])
+>>> loss.metrics
+{'test': LazyMetrics(get_metrics, batches=1)}
+>>> loss.to_log_dict()
+{'test/loss': 1.5, 'test/accuracy': 0.75}
 """
 from dataclasses import InitVar, dataclass
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import torch
 from torch import Tensor
@@ -57,8 +70,9 @@ from sequoia.utils.serialization import Serializable, detach, move
 from sequoia.utils.logging_utils import cleanup, get_logger
 from sequoia.utils.utils import add_dicts, add_prefix
 
-from .metrics import (ClassificationMetrics, Metrics, RegressionMetrics,
-                      get_metrics)
+from .metrics import (ClassificationMetrics, LazyMetrics, Metrics,
+                      RegressionMetrics, batched_to_cpu, get_metrics,
+                      make_metrics)
 
 logger = get_logger(__file__)
 
@@ -84,7 +98,7 @@ class Loss(Serializable):
     # pytorch-lightning during training? Is there a case where that would be
     # useful?
     tensors: Dict[str, Tensor] = dict_field(repr=False, to_dict=False)
-    metrics: Dict[str, Union[Metrics, Tensor]] = dict_field()
+    metrics: Dict[str, Union[Metrics, LazyMetrics, Tensor]] = dict_field()
     # When multiplying the Loss by a value, this keep track of the coefficients
     # used, so that if we wanted to we could recover the 'unscaled' loss.
     _coefficient: Union[float, Tensor] = field(1.0, repr=False)
@@ -102,10 +116,15 @@ class Loss(Serializable):
         assert self.name, "Loss objects should be given a name!"
         if self.name not in self.metrics:
             # Create a Metrics object if given the necessary tensors.
-            metrics = get_metrics(x=x, h_x=h_x, y_pred=y_pred, y=y)
+            if y_pred is not None and y is not None:
+                metrics = make_metrics(get_metrics, x=x, h_x=h_x, y_pred=y_pred, y=y)
+            else:
+                metrics = get_metrics(x=x, h_x=h_x, y_pred=y_pred, y=y)
             if metrics:
                 self.metrics[self.name] = metrics
         self._device: torch.device = None
+        # The loss tensor and its value, set in `materialize`.
+        self._loss_value: Tuple[Optional[Tensor], float] = (None, 0.0)
         for name in list(self.tensors.keys()):
             tensor = self.tensors[name]
             if not isinstance(tensor, Tensor):
@@ -164,7 +183,10 @@ class Loss(Serializable):
         Returns:
             Optional[Metrics]: The main metrics associated with this Loss.
         """
-        return self.metrics.get(self.name)
+        metric = self.metrics.get(self.name)
+        if isinstance(metric, LazyMetrics):
+            metric = self.metrics[self.name] = metric.materialize()
+        return metric
 
     @metric.setter
     def metric(self, value: Metrics) -> None:
@@ -331,8 +353,9 @@ class Loss(Serializable):
             Dict: A dict containing the things to be logged.
         """
         # TODO: Could also produce some wandb plots and stuff here when verbose?
+        self.materialize()
         log_dict: Dict[str, Union[str, float, Dict, Tensor]] = {}
-        log_dict["loss"] = round(float(self.loss), 6)
+        log_dict["loss"] = round(self.loss_value, 6)
 
         for name, metric in self.metrics.items():
             if isinstance(metric, Serializable):
@@ -367,8 +390,9 @@ class Loss(Serializable):
         """ Smaller, less-detailed version of `to_log_dict()` for progress bars.
         """
         # NOTE: PL actually doesn't seem to accept strings as values 
+        self.materialize()
         message: Dict[str, Union[str, float]] = {}
-        message["Loss"] = float(self.loss)
+        message["Loss"] = self.loss_value
 
         for name, metric in self.metrics.items():
             if isinstance(metric, Metrics):
@@ -383,7 +407,63 @@ class Loss(Serializable):
 
         return cleanup(message, sep=" ")
 
+    @property
+    def loss_value(self) -> float:
+        """ The value of `self.loss`, as a float. """
+        loss_tensor, value = self._loss_value
+        if loss_tensor is not self.loss:
+            value = float(self.loss)
+        return value
+
+    def materialize(self) -> "Loss":
+        """ Creates the pending (lazy) metrics and gets the value of the losses, for
+        this Loss and its sub-losses.
 
+        All the tensors required are moved to the CPU at once, rather than one at a
+        time (e.g. with a call to `.item()` for each loss).
+
+        Returns
+        -------
+        Loss
+            `self`, with all the metrics created.
+        """
+        nodes: List[Loss] = []
+        pending: List[Loss] = [self]
+        while pending:
+            node = pending.pop()
+            if any(node is other for other in nodes):
+                continue
+            nodes.append(node)
+            pending.extend(v for v in node.losses.values() if isinstance(v, Loss))
+
+        # NOTE: The same metrics might be shared between different losses.
+        pending_metrics: Dict[int, LazyMetrics] = {}
+        for node in nodes:
+            for metric in node.metrics.values():
+                if isinstance(metric, LazyMetrics):
+                    pending_metrics.setdefault(id(metric), metric)
+        pending_losses = [
+            node for node in nodes
+            if isinstance(node.loss, Tensor) and node._loss_value[0] is not node.loss
+        ]
+        if not pending_metrics and not pending_losses:
+            return self
+
+        tensors = [node.loss.detach() for node in pending_losses]
+        for metric in pending_metrics.values():
+            tensors.extend(metric.tensors())
+        cpu_tensors = iter(batched_to_cpu(tensors))
+        for node in pending_losses:
+            node._loss_value = (node.loss, float(next(cpu_tensors)))
+        materialized_metrics = {
+            key: metric.materialize(cpu_tensors)
+            for key, metric in pending_metrics.items()
+        }
+        for node in nodes:
+            for name, metric in node.metrics.items():
+                if isinstance(metric, LazyMetrics):
+                    node.metrics[name] = materialized_metrics[id(metric)]
+        return self
 
     def clear_tensors(self) -> None:
         """ Clears the `tensors` attribute of `self` and of sublosses.
@@ -420,6 +500,7 @@ class Loss(Serializable):
     def all_metrics(self) -> Dict[str, Metrics]:
         """ Returns a 'cleaned up' dictionary of all the Metrics objects. """
         assert self.name
+        self.materialize()
         result: Dict[str, Metrics] = {}
         result.update(self.metrics)
 
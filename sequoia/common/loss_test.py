@@ -1,7 +1,10 @@
 """
 TODO: Write some tests that also help illustrate how the Loss class works.
 """
+import torch
+
 from .loss import Loss
+from .metrics import ClassificationMetrics, LazyMetrics, lazy_metrics
 
 
 def test_demo():
@@ -46,4 +49,35 @@ def test_to_log_dict_order():
         'total/task_a/accuracy': 0.95,
         'total/task_b/loss': 2.1,
         'total/task_c/loss': 3.0
-    }
\ No newline at end of file
+    }
+
+
+def test_lazy_metrics_give_same_log_dict():
+    """ The log dict of a Loss is the same when using lazy metrics. """
+    torch.manual_seed(123)
+
+    def make_loss() -> Loss:
+        total = Loss("total")
+        for _ in range(3):
+            logits = torch.rand(8, 4)
+            y = torch.randint(0, 4, (8,))
+            total += Loss("task_a", loss=logits.mean(), y_pred=logits, y=y)
+            total += Loss("task_b", loss=torch.rand([]))
+        return total
+
+    state = torch.get_rng_state()
+    eager_loss = make_loss()
+    torch.set_rng_state(state)
+    with lazy_metrics():
+        lazy_loss = make_loss()
+
+    task_a_metrics = lazy_loss.losses["task_a"].metrics["task_a"]
+    assert isinstance(task_a_metrics, LazyMetrics)
+    # The inputs of the different steps are merged, without creating the metrics.
+    assert len(task_a_metrics.inputs) == 3
+
+    assert lazy_loss.to_log_dict() == eager_loss.to_log_dict()
+    assert lazy_loss.to_pbar_message() == eager_loss.to_pbar_message()
+    metric = lazy_loss.losses["task_a"].metric
+    assert isinstance(metric, ClassificationMetrics)
+    assert metric.n_samples == 24
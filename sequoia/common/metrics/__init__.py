@@ -1,5 +1,6 @@
 from .classification import ClassificationMetrics
 from .get_metrics import get_metrics
+from .lazy import LazyMetrics, batched_to_cpu, lazy_metrics, make_metrics
 from .metrics import Metrics, MetricsType
 from .metrics_utils import (accuracy, class_accuracy, get_class_accuracy,
                             get_confusion_matrix)
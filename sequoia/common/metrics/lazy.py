@@ -0,0 +1,163 @@
+""" 'Lazy' metrics, which are only computed when they are needed (e.g. logged).
+
+Creating a `Metrics` object from the tensors of a batch (e.g. `ClassificationMetrics`,
+which computes a confusion matrix) moves these tensors to the CPU, which forces a
+device synchronization, and can take a significant fraction of a training step.
+
+When lazy metrics are enabled (see `lazy_metrics`), `make_metrics` instead returns a
+`LazyMetrics` object, which only holds the (detached) input tensors. Adding two
+`LazyMetrics` of the same type only concatenates their inputs. The actual `Metrics`
+are created when calling `materialize`, which moves all the tensors to the CPU at
+once (see `batched_to_cpu`).
+
+For example:
+>>> import torch
+>>> from sequoia.common.metrics import ClassificationMetrics
+>>> y_pred = torch.as_tensor([[.8, .1, .1], [.0, .9, .1], [.0, .1, .9]])
+>>> y = torch.as_tensor([0, 1, 1])
+>>> with lazy_metrics():
+...     metrics = make_metrics(ClassificationMetrics, y_pred=y_pred, y=y)
+>>> metrics
+LazyMetrics(ClassificationMetrics, batches=1)
+>>> (metrics + metrics).materialize()
+ClassificationMetrics(n_samples=6, accuracy=0.666667)
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
+
+import torch
+from torch import Tensor
+
+from .metrics import Metrics
+
+_lazy_metrics: bool = False
+
+
+@contextmanager
+def lazy_metrics(enabled: bool = True) -> Iterator[None]:
+    """ Makes `make_metrics` create `LazyMetrics` (when `enabled`) in this context. """
+    global _lazy_metrics
+    previous = _lazy_metrics
+    _lazy_metrics = enabled
+    try:
+        yield
+    finally:
+        _lazy_metrics = previous
+
+
+def make_metrics(
+    metrics_type: Callable[..., Metrics], **tensors: Any
+) -> Union[Metrics, "LazyMetrics"]:
+    """ Creates metrics of type `metrics_type` from the given tensors, or a
+    `LazyMetrics` when lazy metrics are enabled.
+
+    `metrics_type` can also be a function which creates the metrics (e.g.
+    `get_metrics`).
+    """
+    if _lazy_metrics:
+        return LazyMetrics(metrics_type, **tensors)
+    return metrics_type(**tensors)
+
+
+class LazyMetrics:
+    """ Inputs of one or more batches, from which to create `Metrics` when needed.
+
+    Parameters
+    ----------
+    metrics_type : Callable[..., Metrics]
+        The type of metrics to create, e.g. `ClassificationMetrics`, or a function
+        that creates them (e.g. `get_metrics`).
+    **tensors :
+        The inputs to the constructor of `metrics_type` (e.g. `y_pred` and `y`).
+    """
+
+    def __init__(self, metrics_type: Callable[..., Metrics], **tensors: Any):
+        self.metrics_type = metrics_type
+        # The inputs for each batch. NOTE: The tensors are only detached, not copied.
+        self.inputs: List[Dict[str, Any]] = []
+        if tensors:
+            self.inputs.append(
+                {
+                    name: value.detach() if isinstance(value, Tensor) else value
+                    for name, value in tensors.items()
+                }
+            )
+
+    def tensors(self) -> List[Tensor]:
+        """ Returns all the input tensors, in the order used by `materialize`. """
+        return [
+            value
+            for inputs in self.inputs
+            for value in inputs.values()
+            if isinstance(value, Tensor)
+        ]
+
+    def materialize(self, cpu_tensors: Iterator[Tensor] = None) -> Metrics:
+        """ Creates the `Metrics` from the inputs of all the batches.
+
+        `cpu_tensors`, when given, yields CPU versions of the tensors returned by
+        `self.tensors()` (e.g. when moving the tensors of multiple objects at once).
+        Otherwise, the tensors of this object are moved to the CPU all at once.
+        """
+        if cpu_tensors is None:
+            cpu_tensors = iter(batched_to_cpu(self.tensors()))
+        result: Metrics = Metrics()
+        for inputs in self.inputs:
+            inputs = {
+                name: next(cpu_tensors) if isinstance(value, Tensor) else value
+                for name, value in inputs.items()
+            }
+            result = result + self.metrics_type(**inputs)
+        return result
+
+    def __add__(self, other: Any) -> Union["LazyMetrics", Metrics]:
+        if isinstance(other, LazyMetrics) and other.metrics_type is self.metrics_type:
+            result = LazyMetrics(self.metrics_type)
+            result.inputs = self.inputs + other.inputs
+            return result
+        if isinstance(other, (LazyMetrics, Metrics)):
+            return self.materialize() + other
+        if isinstance(other, (int, float)) and other == 0:
+            return self
+        return NotImplemented
+
+    def __radd__(self, other: Any) -> Union["LazyMetrics", Metrics]:
+        if isinstance(other, Metrics):
+            return other + self.materialize()
+        if isinstance(other, (int, float)) and other == 0:
+            return self
+        return NotImplemented
+
+    def __mul__(self, factor: Any) -> "LazyMetrics":
+        # Like `Metrics`, multiplying doesn't change anything.
+        return self
+
+    __rmul__ = __mul__
+    __truediv__ = __mul__
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}({self.metrics_type.__name__}, "
+            f"batches={len(self.inputs)})"
+        )
+
+
+def batched_to_cpu(tensors: Iterable[Tensor]) -> List[Tensor]:
+    """ Moves the given tensors to the CPU, using a single transfer for all the
+    tensors with the same device and dtype.
+    """
+    tensors = list(tensors)
+    results: List[Tensor] = list(tensors)
+    groups: Dict[Any, List[int]] = {}
+    for i, tensor in enumerate(tensors):
+        if tensor.device.type != "cpu":
+            groups.setdefault((tensor.device, tensor.dtype), []).append(i)
+    for indices in groups.values():
+        if len(indices) == 1:
+            results[indices[0]] = tensors[indices[0]].cpu()
+            continue
+        flat = torch.cat([tensors[i].reshape(-1) for i in indices]).cpu()
+        sizes = [tensors[i].numel() for i in indices]
+        for i, chunk in zip(indices, torch.split(flat, sizes)):
+            results[i] = chunk.view(tensors[i].shape)
+    return results
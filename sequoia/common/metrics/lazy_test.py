@@ -0,0 +1,39 @@
+import pytest
+import torch
+
+from .classification import ClassificationMetrics
+from .lazy import LazyMetrics, batched_to_cpu, lazy_metrics, make_metrics
+
+
+def test_make_metrics_is_lazy_only_in_context():
+    y_pred = torch.as_tensor([[0.9, 0.1], [0.2, 0.8], [0.6, 0.4]])
+    y = torch.as_tensor([0, 1, 1])
+    with lazy_metrics():
+        lazy = make_metrics(ClassificationMetrics, y_pred=y_pred, y=y)
+    eager = make_metrics(ClassificationMetrics, y_pred=y_pred, y=y)
+    assert isinstance(lazy, LazyMetrics)
+    assert isinstance(eager, ClassificationMetrics)
+
+    assert lazy.materialize() == eager
+    assert (lazy + lazy).materialize() == eager + eager
+    # Adding lazy metrics with 'real' metrics creates them.
+    assert lazy + eager == eager + eager
+    assert eager + lazy == eager + eager
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="Cuda is required.")
+def test_batched_to_cpu():
+    tensors = [
+        torch.rand(3, 4, device="cuda"),
+        torch.arange(5, device="cuda"),
+        torch.rand([], device="cuda"),
+        torch.rand(2),
+        torch.arange(3, device="cuda"),
+    ]
+    results = batched_to_cpu(tensors)
+    assert len(results) == len(tensors)
+    for tensor, result in zip(tensors, results):
+        assert result.device.type == "cpu"
+        assert result.dtype == tensor.dtype
+        assert result.shape == tensor.shape
+        assert result.tolist() == tensor.tolist()
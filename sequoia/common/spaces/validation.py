@@ -0,0 +1,94 @@
+""" Policy used to decide when to check that samples are in their space.
+
+Checking that the actions (or observations) are in their space (e.g.
+`assert action in action_space`) can be expensive, since `contains` walks through all
+the nested spaces and the values of the arrays. At test time, this is done at every
+step of the test loop.
+
+The checks in the `get_actions` methods and in the environment wrappers are done only
+when `should_validate` returns True. The policy used is configured by the Setting from
+its `Config`, while it runs its main loop:
+
+```python
+if should_validate("get_actions"):
+    assert action in action_space, (action, action_space)
+```
+
+When no policy is active, the samples are always validated.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, Optional
+
+if TYPE_CHECKING:
+    from sequoia.common.config import Config
+
+_active_policy: Optional["ValidationPolicy"] = None
+
+
+@dataclass
+class ValidationPolicy:
+    """ When to check that samples are in their space.
+
+    The steps are counted separately for each place where the check is made (e.g.
+    "get_actions", "GymDataLoader.send").
+    """
+
+    # When to validate: "always", once every `every` steps ("sample"), or only during
+    # the first `first` steps ("first").
+    mode: str = "always"
+    # Interval (in steps) between two validations, when `mode` is "sample".
+    every: int = 100
+    # Number of steps during which to validate, when `mode` is "first".
+    first: int = 100
+    # Number of calls to `should_validate` so far, for each key.
+    counts: Counter = field(default_factory=Counter, repr=False)
+
+    def __post_init__(self):
+        if self.mode not in {"always", "sample", "first"}:
+            raise ValueError(f"Invalid validation mode: {self.mode!r}")
+        if self.every < 1:
+            raise ValueError(f"`every` should be at least 1, got {self.every}")
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "ValidationPolicy":
+        return cls(
+            mode=config.validate_spaces,
+            every=config.validate_spaces_every,
+            first=config.validate_spaces_first,
+        )
+
+    def should_validate(self, key: str) -> bool:
+        """ Returns wether the sample at the current step should be validated. """
+        step = self.counts[key]
+        self.counts[key] = step + 1
+        if self.mode == "sample":
+            return step % self.every == 0
+        if self.mode == "first":
+            return step < self.first
+        return True
+
+    @contextmanager
+    def activate(self) -> Iterator["ValidationPolicy"]:
+        """ Makes this the active policy, which `should_validate` uses. """
+        global _active_policy
+        previous_policy = _active_policy
+        _active_policy = self
+        try:
+            yield self
+        finally:
+            _active_policy = previous_policy
+
+
+def get_active_policy() -> Optional[ValidationPolicy]:
+    return _active_policy
+
+
+def should_validate(key: str) -> bool:
+    """ Returns wether the sample at the current step should be checked to be in its
+    space, according to the active policy (always True when there is none).
+    """
+    if _active_policy is None:
+        return True
+    return _active_policy.should_validate(key)
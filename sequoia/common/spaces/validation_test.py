@@ -0,0 +1,31 @@
+import pytest
+
+from .validation import ValidationPolicy, get_active_policy, should_validate
+
+
+def test_always_validates_without_active_policy():
+    assert get_active_policy() is None
+    assert all(should_validate("get_actions") for _ in range(10))
+
+
+@pytest.mark.parametrize(
+    "policy, expected_steps",
+    [
+        (ValidationPolicy(mode="always"), list(range(10))),
+        (ValidationPolicy(mode="sample", every=4), [0, 4, 8]),
+        (ValidationPolicy(mode="first", first=3), [0, 1, 2]),
+        (ValidationPolicy(mode="first", first=0), []),
+    ],
+)
+def test_validation_policy(policy: ValidationPolicy, expected_steps: list):
+    with policy.activate():
+        validated_steps = [step for step in range(10) if should_validate("env.step")]
+        # The steps are counted separately for each key.
+        assert should_validate("get_actions") == (0 in expected_steps)
+    assert validated_steps == expected_steps
+    assert get_active_policy() is None
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        ValidationPolicy(mode="sometimes")
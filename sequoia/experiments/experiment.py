@@ -32,7 +32,9 @@ from sequoia.settings import (
 )
 from sequoia.settings.sl.incremental import IncrementalSLResults
 from sequoia.settings.presets import setting_presets
+from sequoia.settings.sl.dataset_cache import dataset_cache, prepare_datasets
 from sequoia.utils import Parseable, Serializable, get_logger
+from sequoia.utils.parallel import run_in_processes
 from sequoia.utils.logging_utils import get_logger
 
 logger = get_logger(__file__)
@@ -91,6 +93,11 @@ class Experiment(Parseable, Serializable):
 
     wandb: Optional[WandbConfig] = None
 
+    # Number of runs to launch in parallel (each in its own process) when either the
+    # setting or the method isn't set. The decoded datasets are then cached in
+    # `<config.data_dir>/cache`, and shared between the runs.
+    parallel_runs: int = 1
+
     def __post_init__(self):
         if not (self.setting or self.method):
             raise RuntimeError("One of `setting` or `method` must be set!")
@@ -411,7 +418,6 @@ def launch_batch_of_runs(
         run_configs.append(run_config)
 
     arguments_of_each_run: List[Dict] = []
-    results_of_each_run: List[Result] = []
     # Create one 'job' per setting-method combination:
     for setting_type, method_type, run_config in zip(
         setting_types, method_types, run_configs
@@ -428,12 +434,27 @@ def launch_batch_of_runs(
             )
         )
 
-    # TODO: Use submitit or somethign like it, to run each of these in parallel:
+    # TODO: Use submitit or somethign like it, to run each of these on a cluster:
     # See https://github.com/lebrice/Sequoia/issues/87 for more info.
-    for run_arguments in arguments_of_each_run:
-        result = Experiment.run_experiment(**run_arguments)
+    dataset_cache_dir: Optional[Path] = None
+    if experiment.parallel_runs > 1:
+        dataset_cache_dir = config.data_dir / "cache"
+        # Download and decode each dataset once, before launching the runs.
+        # NOTE: `argv` also contains the arguments of the Method, like for the runs.
+        settings = [
+            setting_type.from_args(argv, strict=False)
+            for setting_type in dict.fromkeys(setting_types)
+        ]
+        prepare_datasets(settings, cache_dir=dataset_cache_dir)
+    jobs = [
+        dict(run_arguments=run_arguments, dataset_cache_dir=dataset_cache_dir)
+        for run_arguments in arguments_of_each_run
+    ]
+    results_of_each_run = run_in_processes(
+        _run_experiment, jobs, n_workers=experiment.parallel_runs
+    )
+    for run_arguments, result in zip(arguments_of_each_run, results_of_each_run):
         logger.info(f"Results for arguments {run_arguments}: {result}")
-        results_of_each_run.append(result)
 
     all_results = list(zip(arguments_of_each_run, results_of_each_run))
     logger.info(f"All results: ")
@@ -443,6 +464,16 @@ def launch_batch_of_runs(
     return all_results
 
 
+def _run_experiment(
+    run_arguments: Dict[str, Any], dataset_cache_dir: Optional[Path] = None
+) -> Results:
+    """ Runs one of the experiments of `launch_batch_of_runs`, possibly in another
+    process.
+    """
+    with dataset_cache(dataset_cache_dir):
+        return Experiment.run_experiment(**run_arguments)
+
+
 def parse_setting_and_method_instances(
     setting: Union[Setting, Type[Setting]],
     method: Union[Method, Type[Method]],
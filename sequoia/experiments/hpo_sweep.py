@@ -30,6 +30,19 @@ class HPOSweep(Experiment):
     # Maximum number of runs to perform.
     max_runs: Optional[int] = 10
 
+    # Number of local worker processes that run trials in parallel, using the same
+    # database. Each worker uses its own seed and log directory.
+    n_workers: int = 1
+
+    # When set, trials are stopped early (successive-halving): after each task, only
+    # the trials in the top `1 / reduction_factor` of the trials which reached that
+    # task are allowed to continue.
+    reduction_factor: Optional[int] = None
+
+    # Wether to share the state after the first task between the trials which only
+    # differ in hyper-parameters that have no effect on the first task.
+    warm_start: bool = False
+
     def __post_init__(self):
         super().__post_init__()
         self.search_space: Dict = {}
@@ -67,15 +80,15 @@ class HPOSweep(Experiment):
         assert isinstance(self.method, Method)
         self.setting.wandb = self.wandb
 
-        # TODO: IDEA: It could actually be really cool if we created a list of
-        # Experiment objects here, and just call their 'launch' methods in parallel,
-        # rather than do the sweep logic in the Method class!
         best_params, best_objective = self.method.hparam_sweep(
             self.setting,
             search_space=self.search_space,
             database_path=self.database_path,
             experiment_id=self.experiment_id,
             max_runs=self.max_runs,
+            n_workers=self.n_workers,
+            reduction_factor=self.reduction_factor,
+            warm_start=self.warm_start,
         )
         print(
             "Best params:\n"
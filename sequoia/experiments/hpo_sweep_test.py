@@ -90,3 +90,25 @@ def test_launch_sweep_with_constructor(
     best_hparams, best_performance = experiment.launch(["--debug"])
     assert best_hparams
     assert best_performance
+
+
+@pytest.mark.timeout(120)
+def test_parallel_sweep_with_workers(monkeypatch, tmp_path: Path):
+    """ Runs a (mocked) sweep with two worker processes sharing the same database. """
+    pytest.importorskip("orion")
+    from sequoia.methods.baseline_method import BaselineMethod
+    from sequoia.settings.sl import TaskIncrementalSLSetting
+
+    monkeypatch.setattr(TaskIncrementalSLSetting, "apply", mock_apply)
+    method = BaselineMethod(config=Config(debug=False, log_dir=tmp_path / "results"))
+    setting = TaskIncrementalSLSetting(dataset="mnist")
+    best_hparams, best_objective = method.hparam_sweep(
+        setting,
+        database_path=tmp_path / "orion_db.pkl",
+        max_runs=4,
+        n_workers=2,
+    )
+    assert best_hparams
+    assert 0 <= -best_objective <= 1
+    # Each worker logs to its own directory.
+    assert len(list((tmp_path / "results").glob("*_worker_*"))) == 2
@@ -8,16 +8,18 @@ package, (which I don't think we need to have as a submodule).
 """
 
 from collections import deque
-from copy import deepcopy
 from dataclasses import dataclass
-from typing import Type, Optional, Deque, List
+from functools import lru_cache, partial
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Type
 from contextlib import contextmanager
 
+import torch
 from gym.spaces.utils import flatdim
+from nngeometry.layercollection import LayerCollection
 from nngeometry.metrics import FIM
-from nngeometry.object.pspace import PMatAbstract, PMatDiag, PMatKFAC, PVector
+from nngeometry.object.pspace import PMatAbstract, PMatDiag, PMatKFAC
 from simple_parsing import choice
-from torch import Tensor
+from torch import Tensor, nn
 from torch.utils.data import DataLoader
 
 from sequoia.common.loss import Loss
@@ -27,11 +29,325 @@ from sequoia.methods.models.forward_pass import ForwardPass
 from sequoia.methods.models.output_heads import ClassificationHead, RegressionHead
 from sequoia.settings.base.objects import Observations
 from sequoia.utils.logging_utils import get_logger
-from sequoia.utils.utils import dict_intersection
 
 logger = get_logger(__file__)
 
 
+@lru_cache()
+def _foreach_supports_autograd() -> bool:
+    """ Returns wether the (private) `torch._foreach_*` ops can be backpropagated
+    through in this version of pytorch.
+    """
+    if not hasattr(torch, "_foreach_mul"):
+        return False
+    x = torch.ones(1, requires_grad=True)
+    try:
+        (y,) = torch._foreach_mul([x], [x])
+    except RuntimeError:
+        return False
+    return y.requires_grad
+
+
+def get_layers(
+    module: nn.Module, layer_collection: LayerCollection = None
+) -> Dict[str, nn.Module]:
+    """ Returns the layers of `module` that are supported by nngeometry, in the order
+    of their `LayerCollection` (which is also the order of the flattened weights).
+    """
+    layer_collection = layer_collection or LayerCollection.from_model(module)
+    layers_by_id, _ = layer_collection.get_layerid_module_maps(module)
+    return layers_by_id
+
+
+def layer_parameters(layer: nn.Module) -> List[Tensor]:
+    """ Returns the weight and the bias (if any) of a layer. """
+    if getattr(layer, "bias", None) is None:
+        return [layer.weight]
+    return [layer.weight, layer.bias]
+
+
+class FlatFisher:
+    """ Fisher information matrix of the weights of a list of layers, stored as plain
+    tensors aligned with the parameters of these layers.
+
+    This is used to compute the EWC penalty with a few fused tensor ops, rather than
+    through nngeometry's `PVector` / `PMatAbstract` objects, which need to create the
+    (flattened) vector of all the weights at each step.
+
+    Parameters
+    ----------
+    diagonals : List[Tensor], optional
+        For a diagonal FIM: One tensor per parameter, with the same shape as the
+        parameter (weight, then bias, for each layer).
+    kfac_factors : List[Optional[Tuple[Tensor, Tensor]]], optional
+        For a block-diagonal (KFAC) FIM: The (A, G) factors of each layer, or None
+        for the layers without a block.
+    """
+
+    def __init__(
+        self,
+        diagonals: List[Tensor] = None,
+        kfac_factors: List[Optional[Tuple[Tensor, Tensor]]] = None,
+    ):
+        if (diagonals is None) == (kfac_factors is None):
+            raise ValueError("Need exactly one of `diagonals` or `kfac_factors`.")
+        self.diagonals = diagonals
+        self.kfac_factors = kfac_factors
+
+    @classmethod
+    def from_pmat(cls, fim: PMatAbstract, model: nn.Module) -> "FlatFisher":
+        """ Converts a FIM from nngeometry, given the model it was computed on. """
+        layer_collection = fim.generator.layer_collection
+        layers = get_layers(model, layer_collection)
+        if isinstance(fim, PMatDiag):
+            # The flat diagonal contains the weight and then the bias of each layer,
+            # in the order of the layer collection.
+            diagonals: List[Tensor] = []
+            offset = 0
+            for layer_id in layer_collection.layers:
+                for parameter in layer_parameters(layers[layer_id]):
+                    numel = parameter.numel()
+                    diagonal = fim.data[offset : offset + numel]
+                    diagonals.append(diagonal.detach().view_as(parameter).clone())
+                    offset += numel
+            return cls(diagonals=diagonals)
+        if isinstance(fim, PMatKFAC):
+            return cls(
+                kfac_factors=[
+                    tuple(factor.detach().clone() for factor in fim.data[layer_id])
+                    if layer_id in fim.data
+                    else None
+                    for layer_id in layer_collection.layers
+                ]
+            )
+        raise NotImplementedError(f"Unsupported FIM representation: {type(fim)}")
+
+    def consolidate(self, new_fisher: "FlatFisher", task: int) -> None:
+        """ Consolidates a new FIM into this one (in place), giving a weight of
+        `task / (task + 1)` to the current values.
+        """
+        if self.diagonals is not None:
+            for diagonal, new_diagonal in zip(self.diagonals, new_fisher.diagonals):
+                diagonal.mul_(task).add_(new_diagonal).div_(task + 1)
+            return
+        for i, (factors, new_factors) in enumerate(
+            zip(self.kfac_factors, new_fisher.kfac_factors)
+        ):
+            if factors is None:
+                self.kfac_factors[i] = new_factors
+            elif new_factors is not None:
+                for factor, new_factor in zip(factors, new_factors):
+                    factor.mul_(task).add_(new_factor).div_(task + 1)
+
+    def penalty(
+        self, layers: Sequence[nn.Module], anchor_weights: Sequence[Tensor]
+    ) -> Tensor:
+        """ Returns the quadratic form `(w - w*)^T F (w - w*)`, where `w` are the
+        current weights of the given layers, and `w*` are the `anchor_weights` (one
+        tensor per parameter, in the same order as in `diagonals`).
+        """
+        if self.diagonals is not None:
+            parameters = [p for layer in layers for p in layer_parameters(layer)]
+            return _diagonal_penalty(parameters, anchor_weights, self.diagonals)
+
+        penalty = 0.0
+        anchors = iter(anchor_weights)
+        for layer, factors in zip(layers, self.kfac_factors):
+            parameters = layer_parameters(layer)
+            layer_anchors = [next(anchors) for _ in parameters]
+            if factors is None:
+                continue
+            diffs = [p - anchor for p, anchor in zip(parameters, layer_anchors)]
+            # Same as nngeometry: the (flattened) weight diff, with the bias as an
+            # extra column.
+            v = diffs[0].view(diffs[0].shape[0], -1)
+            if len(diffs) == 2:
+                v = torch.cat([v, diffs[1].unsqueeze(1)], dim=1)
+            a, g = factors
+            penalty = penalty + (torch.mm(torch.mm(g, v), a) * v).sum()
+        return penalty
+
+    def to(self, device: torch.device) -> "FlatFisher":
+        if self.diagonals is not None:
+            return type(self)(diagonals=[d.to(device) for d in self.diagonals])
+        return type(self)(
+            kfac_factors=[
+                None if factors is None else tuple(f.to(device) for f in factors)
+                for factors in self.kfac_factors
+            ]
+        )
+
+
+def _diagonal_penalty(
+    parameters: Sequence[Tensor],
+    anchor_weights: Sequence[Tensor],
+    diagonals: Sequence[Tensor],
+) -> Tensor:
+    if _foreach_supports_autograd():
+        diffs = torch._foreach_sub(list(parameters), list(anchor_weights))
+        weighted_diffs = torch._foreach_mul(diffs, list(diagonals))
+        terms = [
+            torch.dot(weighted.view(-1), diff.view(-1))
+            for weighted, diff in zip(weighted_diffs, diffs)
+        ]
+    else:
+        terms = [
+            (diagonal * (parameter - anchor).pow(2)).sum()
+            for parameter, anchor, diagonal in zip(
+                parameters, anchor_weights, diagonals
+            )
+        ]
+    return torch.stack(terms).sum()
+
+
+class OnlineFisherEstimator:
+    """ Estimates the (empirical) FIM of the weights of some layers during training.
+
+    The statistics are accumulated from the forward and backward passes of the
+    training steps (using hooks on the layers), instead of storing observations and
+    doing an extra pass over them at the end of each task. For the `nn.Linear` and
+    `nn.Conv2d` layers, the per-sample gradients of the weights are obtained from the
+    inputs of the layer and the gradients of its outputs. Other layers aren't
+    regularized (their FIM is zero).
+
+    NOTE: This assumes that the training loss is averaged over the batch.
+
+    Parameters
+    ----------
+    layers : List[nn.Module]
+        The layers whose weights are regularized.
+    kfac : bool, optional
+        Wether to estimate the KFAC factors of each layer, rather than the diagonal
+        of the FIM. By default False.
+    should_accumulate : Callable[[], bool], optional
+        Called during the forward passes through the layers, to check if the
+        statistics of that pass should be accumulated (e.g. only during the main
+        forward pass of the model, not those of the auxiliary tasks). By default, the
+        statistics of all the training passes are accumulated.
+    """
+
+    def __init__(
+        self,
+        layers: List[nn.Module],
+        kfac: bool = False,
+        should_accumulate: Callable[[], bool] = None,
+    ):
+        self.layers = layers
+        self.kfac = kfac
+        self.should_accumulate = should_accumulate
+        # Sums of the statistics of each layer (diagonals of the weight/bias, or (A, G)
+        # factors), and the number of samples they were computed on.
+        self.sums: List[Optional[List[Tensor]]] = [None for _ in layers]
+        self.counts: List[int] = [0 for _ in layers]
+        self._handles = [
+            layer.register_forward_hook(partial(self._forward_hook, index))
+            for index, layer in enumerate(layers)
+            if self._is_supported(layer)
+        ]
+
+    @staticmethod
+    def _is_supported(layer: nn.Module) -> bool:
+        if isinstance(layer, nn.Linear):
+            return True
+        return (
+            isinstance(layer, nn.Conv2d)
+            and layer.groups == 1
+            and layer.padding_mode == "zeros"
+        )
+
+    def _forward_hook(self, index: int, layer: nn.Module, inputs, output: Tensor):
+        if not (layer.training and torch.is_grad_enabled() and output.requires_grad):
+            return
+        if self.should_accumulate is not None and not self.should_accumulate():
+            return
+        x = inputs[0].detach()
+        output.register_hook(partial(self._accumulate, index, layer, x))
+
+    @torch.no_grad()
+    def _accumulate(self, index: int, layer: nn.Module, x: Tensor, grad: Tensor):
+        batch_size = x.shape[0]
+        # Gradients of the per-sample losses w.r.t. the outputs of the layer.
+        grad = grad.detach() * batch_size
+        has_bias = layer.bias is not None
+        if isinstance(layer, nn.Linear):
+            x = x.reshape(-1, x.shape[-1])
+            grad = grad.reshape(-1, grad.shape[-1])
+            if self.kfac:
+                if has_bias:
+                    x = torch.cat([x, x.new_ones(x.shape[0], 1)], dim=1)
+                stats = [x.t() @ x, grad.t() @ grad]
+            else:
+                stats = [grad.pow(2).t() @ x.pow(2)]
+                if has_bias:
+                    stats.append(grad.pow(2).sum(0))
+        else:
+            # (N, C * kh * kw, L) and (N, out_channels, L)
+            x = torch.nn.functional.unfold(
+                x,
+                layer.kernel_size,
+                dilation=layer.dilation,
+                padding=layer.padding,
+                stride=layer.stride,
+            )
+            grad = grad.reshape(batch_size, grad.shape[1], -1)
+            if self.kfac:
+                n_positions = x.shape[-1]
+                if has_bias:
+                    x = torch.cat([x, x.new_ones(batch_size, 1, n_positions)], dim=1)
+                x = x.transpose(1, 2).reshape(-1, x.shape[1])
+                g = grad.transpose(1, 2).reshape(-1, grad.shape[1])
+                stats = [x.t() @ x / n_positions, g.t() @ g / n_positions]
+            else:
+                per_sample_grads = torch.einsum("nol,nkl->nok", grad, x)
+                stats = [per_sample_grads.pow(2).sum(0).view_as(layer.weight)]
+                if has_bias:
+                    stats.append(grad.sum(2).pow(2).sum(0))
+        if self.sums[index] is None:
+            self.sums[index] = stats
+        else:
+            for total, stat in zip(self.sums[index], stats):
+                total.add_(stat)
+        self.counts[index] += batch_size
+
+    def fisher(self) -> FlatFisher:
+        """ Returns the FIM estimated from the samples seen since the last `reset`. """
+        if self.kfac:
+            return FlatFisher(
+                kfac_factors=[
+                    None if sums is None else tuple(total / count for total in sums)
+                    for sums, count in zip(self.sums, self.counts)
+                ]
+            )
+        diagonals: List[Tensor] = []
+        for layer, sums, count in zip(self.layers, self.sums, self.counts):
+            parameters = layer_parameters(layer)
+            if sums is None:
+                diagonals.extend(torch.zeros_like(p).detach() for p in parameters)
+            else:
+                diagonals.extend(total / count for total in sums)
+        return FlatFisher(diagonals=diagonals)
+
+    def reset(self) -> None:
+        self.sums = [None for _ in self.layers]
+        self.counts = [0 for _ in self.layers]
+
+    def remove_hooks(self) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles.clear()
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"sums": self.sums, "counts": self.counts}
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        device = self.layers[0].weight.device if self.layers else None
+        self.sums = [
+            None if sums is None else [total.to(device) for total in sums]
+            for sums in state["sums"]
+        ]
+        self.counts = list(state["counts"])
+
+
 class EWCTask(AuxiliaryTask):
     """ Elastic Weight Consolidation, implemented as a 'self-supervision-style'
     Auxiliary Task.
@@ -71,6 +387,10 @@ class EWCTask(AuxiliaryTask):
         fim_representation: Type[PMatAbstract] = choice(
             {"diagonal": PMatDiag, "block_diagonal": PMatKFAC}, default=PMatDiag,
         )
+        # Wether to estimate the FIM online, from the forward/backward passes of the
+        # training steps, rather than by storing `sample_size_fim` observations and
+        # doing an extra pass over them at the end of each task.
+        online_fim: bool = False
 
     def __init__(
         self, *args, name: str = None, options: "EWCTask.Options" = None, **kwargs
@@ -85,11 +405,17 @@ class EWCTask(AuxiliaryTask):
         # The ids of all the tasks trained on so far, not including the current task.
         self.previous_training_tasks: List[Optional[int]] = []
 
-        self.previous_model_weights: Optional[PVector] = None
+        # The layers of the shared modules which are regularized, and the 'anchor'
+        # value of each of their parameters (weight, then bias, for each layer).
+        self.regularized_layers: List[nn.Module] = []
+        self.anchor_weights: Optional[List[Tensor]] = None
         self.observation_collector: Deque[Observations] = deque(
             maxlen=self.options.sample_size_fim
         )
-        self.fisher_information_matrices: List[PMatAbstract] = []
+        # The (consolidated) FIM of the previous tasks.
+        self.fisher_information: Optional[FlatFisher] = None
+        # Used to estimate the FIM of the current task when `online_fim` is True.
+        self.fisher_estimator: Optional[OnlineFisherEstimator] = None
         # When True, ignore task boundaries (no EWC update).
         # This is used mainly because of the need for executing forward passes when
         # calculating the new FIMs, and the MultiheadModel class might then call
@@ -112,19 +438,20 @@ class EWCTask(AuxiliaryTask):
         """ Gets the EWC loss.
         """
         if self.training:
-            self.observation_collector.append(forward_pass.observations)
-
-        if not self.enabled or self.previous_model_weights is None:
+            if not self.options.online_fim:
+                self.observation_collector.append(forward_pass.observations)
+            elif self.enabled:
+                # NOTE: When created here, the estimator starts accumulating from the
+                # next training step.
+                self._get_fisher_estimator()
+
+        if not self.enabled or self.anchor_weights is None:
             # We're in the first task: do nothing.
             return Loss(name=self.name)
 
-        loss = 0.0
-        v_current = self.get_current_model_weights()
-
-        for fim in self.fisher_information_matrices:
-            diff = v_current - self.previous_model_weights
-            loss += fim.vTMv(diff)
-
+        loss = self.fisher_information.penalty(
+            self.regularized_layers, self.anchor_weights
+        )
         ewc_loss = Loss(name=self.name, loss=loss)
         return ewc_loss
 
@@ -142,6 +469,9 @@ class EWCTask(AuxiliaryTask):
         if not self.training:
             logger.debug("Task boundary at test time, no EWC update.")
             return
+        if self.options.online_fim:
+            # Start estimating the FIM from the first training step.
+            self._get_fisher_estimator()
         # Two cases:
         # - Setting without task IDs --> still calculate the FIMs at each task boundary.
         # - Setting with IDs --> calculate the FIMs before training on new tasks.
@@ -188,8 +518,48 @@ class EWCTask(AuxiliaryTask):
             f"Updating the EWC 'anchor' weights before starting training on "
             f"task {new_task_id}"
         )
-        self.previous_model_weights = self.get_current_model_weights().clone().detach()
+        if self.options.online_fim:
+            fisher_estimator = self._get_fisher_estimator()
+            if not any(fisher_estimator.counts):
+                logger.warning(
+                    "No training steps were performed since the last task boundary, "
+                    "the FIM of the previous task will be zero."
+                )
+            new_fisher = fisher_estimator.fisher()
+            fisher_estimator.reset()
+            self.regularized_layers = fisher_estimator.layers
+        else:
+            shared_modules = self.model.shared_modules()
+            new_fim = self._compute_fim()
+            new_fisher = FlatFisher.from_pmat(new_fim, shared_modules)
+            self.regularized_layers = list(
+                get_layers(shared_modules, new_fim.generator.layer_collection).values()
+            )
+            self.observation_collector.clear()
+
+        self.anchor_weights = [
+            parameter.detach().clone()
+            for layer in self.regularized_layers
+            for parameter in layer_parameters(layer)
+        ]
+        self.consolidate(new_fisher, task=new_task_id)
+
+    def _get_fisher_estimator(self) -> OnlineFisherEstimator:
+        if self.fisher_estimator is None:
+            layers = list(get_layers(self.model.shared_modules()).values())
+            self.fisher_estimator = OnlineFisherEstimator(
+                layers,
+                kfac=issubclass(self.options.fim_representation, PMatKFAC),
+                # NOTE: The other auxiliary tasks also use the shared modules (e.g. on
+                # augmented views of the observations).
+                should_accumulate=lambda: getattr(
+                    self.model, "in_main_forward_pass", True
+                ),
+            )
+        return self.fisher_estimator
 
+    def _compute_fim(self) -> PMatAbstract:
+        """ Computes the FIM of the shared modules using the stored observations. """
         # Create a Dataloader from the stored observations.
         obs_type: Type[Observations] = type(self.observation_collector[0])
         dataset = [obs.as_namedtuple() for obs in self.observation_collector]
@@ -252,12 +622,43 @@ class EWCTask(AuxiliaryTask):
                 device=self._model.device,
                 layer_collection=None,
             )
-
         # TODO: There was maybe an idea to use another fisher information matrix for
         # the critic in A2C, but not doing that atm.
-        new_fims = [new_fim]
-        self.consolidate(new_fims, task=new_task_id)
+        return new_fim
+
+    def task_state_dict(self) -> Dict[str, Any]:
+        """ Returns the state of this task which isn't in its `state_dict`, i.e. the
+        task ids and the observations collected for the next FIM calculation.
+        """
+        return {
+            "current_training_task": self.current_training_task,
+            "previous_training_task": self.previous_training_task,
+            "previous_training_tasks": list(self.previous_training_tasks),
+            "anchor_weights": self.anchor_weights,
+            "fisher_information": self.fisher_information,
+            "observation_collector": list(self.observation_collector),
+            "fisher_estimator": (
+                self.fisher_estimator.state_dict() if self.fisher_estimator else None
+            ),
+        }
+
+    def load_task_state_dict(self, state: Dict[str, Any]) -> None:
+        """ Restores the state returned by `task_state_dict`. """
+        self.current_training_task = state["current_training_task"]
+        self.previous_training_task = state["previous_training_task"]
+        self.previous_training_tasks = list(state["previous_training_tasks"])
+        self.anchor_weights = state["anchor_weights"]
+        self.fisher_information = state["fisher_information"]
+        if self.anchor_weights is not None:
+            self.regularized_layers = list(
+                get_layers(self.model.shared_modules()).values()
+            )
+            self.anchor_weights = [w.to(self._model.device) for w in self.anchor_weights]
+            self.fisher_information = self.fisher_information.to(self._model.device)
         self.observation_collector.clear()
+        self.observation_collector.extend(state["observation_collector"])
+        if state.get("fisher_estimator") is not None:
+            self._get_fisher_estimator().load_state_dict(state["fisher_estimator"])
 
     @contextmanager
     def _ignoring_task_boundaries(self):
@@ -267,48 +668,21 @@ class EWCTask(AuxiliaryTask):
         yield
         self._ignore_task_boundaries = False
 
-    def consolidate(self, new_fims: List[PMatAbstract], task: Optional[int]) -> None:
+    def consolidate(self, new_fisher: FlatFisher, task: Optional[int]) -> None:
         """ Consolidates the new and current fisher information matrices.
 
         Parameters
         ----------
-        new_fims : List[PMatAbstract]
-            The list of new fisher information matrices.
+        new_fisher : FlatFisher
+            The new fisher information matrix.
         task : Optional[int]
             The id of the previous task, when task labels are available, or the number
             of task switches encountered so far when task labels are not available.
         """
-        if not self.fisher_information_matrices:
-            self.fisher_information_matrices = new_fims
+        if self.fisher_information is None:
+            self.fisher_information = new_fisher
             return
 
         assert task is not None, "Should have been given an int task id (even if fake)."
-
-        for i, (fim_previous, fim_new) in enumerate(
-            zip(self.fisher_information_matrices, new_fims)
-        ):
-            # consolidate the FIMs
-            if fim_previous is None:
-                self.fisher_information_matrices[i] = fim_new
-            else:
-                # consolidate the fim_new into fim_previous in place
-                if isinstance(fim_new, PMatDiag):
-                    # TODO: This is some kind of weird online-EWC related magic:
-                    fim_previous.data = (
-                        deepcopy(fim_new.data) + fim_previous.data * (task)
-                    ) / (task + 1)
-
-                elif isinstance(fim_new.data, dict):
-                    # TODO: This is some kind of weird online-EWC related magic:
-                    for _, (prev_param, new_param) in dict_intersection(
-                        fim_previous.data, fim_new.data
-                    ):
-                        for prev_item, new_item in zip(prev_param, new_param):
-                            prev_item.data = (
-                                prev_item.data * task + deepcopy(new_item.data)
-                            ) / (task + 1)
-
-                self.fisher_information_matrices[i] = fim_previous
-
-    def get_current_model_weights(self) -> PVector:
-        return PVector.from_model(self.model.shared_modules())
+        # TODO: This is some kind of weird online-EWC related magic:
+        self.fisher_information.consolidate(new_fisher, task=task)
@@ -0,0 +1,175 @@
+from typing import Type
+
+import pytest
+import torch
+from nngeometry.metrics import FIM
+from nngeometry.object.pspace import PMatAbstract, PMatDiag, PMatKFAC, PVector
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+
+from .ewc import FlatFisher, OnlineFisherEstimator, get_layers, layer_parameters
+
+
+def make_model() -> nn.Module:
+    return nn.Sequential(
+        nn.Conv2d(1, 3, kernel_size=3),
+        nn.ReLU(),
+        nn.Flatten(),
+        nn.Linear(3 * 4 * 4, 5, bias=False),
+        nn.ReLU(),
+        nn.Linear(5, 4),
+    )
+
+
+@pytest.mark.parametrize("representation", [PMatDiag, PMatKFAC])
+def test_penalty_matches_nngeometry(representation: Type[PMatAbstract]):
+    torch.manual_seed(123)
+    model = make_model()
+    x = torch.randn(16, 1, 6, 6)
+    loader = DataLoader(TensorDataset(x), batch_size=8)
+    fim = FIM(
+        model=model,
+        loader=loader,
+        representation=representation,
+        n_output=4,
+        variant="classif_logits",
+        device="cpu",
+    )
+    anchor = PVector.from_model(model).clone().detach()
+    layers = list(get_layers(model).values())
+    anchor_weights = [
+        p.detach().clone() for layer in layers for p in layer_parameters(layer)
+    ]
+    flat_fisher = FlatFisher.from_pmat(fim, model)
+
+    # Move the weights away from the anchor.
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.add_(0.1 * torch.randn_like(parameter))
+
+    expected = fim.vTMv(PVector.from_model(model) - anchor)
+    penalty = flat_fisher.penalty(layers, anchor_weights)
+    assert torch.allclose(penalty, expected, rtol=1e-4)
+
+    # The penalty can be backpropagated to the weights.
+    penalty.backward()
+    assert all(p.grad is not None for p in model.parameters())
+
+
+def test_consolidate_diagonal():
+    fisher = FlatFisher(diagonals=[torch.ones(2, 3), torch.ones(2)])
+    new_fisher = FlatFisher(diagonals=[torch.full((2, 3), 4.0), torch.zeros(2)])
+    fisher.consolidate(new_fisher, task=1)
+    assert torch.allclose(fisher.diagonals[0], torch.full((2, 3), 2.5))
+    assert torch.allclose(fisher.diagonals[1], torch.full((2,), 0.5))
+
+
+def test_online_diagonal_matches_per_sample_gradients():
+    torch.manual_seed(123)
+    model = make_model()
+    layers = list(get_layers(model).values())
+    estimator = OnlineFisherEstimator(layers)
+    x = torch.randn(8, 1, 6, 6)
+    y = torch.randint(4, (8,))
+    loss_fn = nn.CrossEntropyLoss()
+
+    for x_batch, y_batch in zip(x.split(4), y.split(4)):
+        model.zero_grad()
+        loss_fn(model(x_batch), y_batch).backward()
+
+    expected = [torch.zeros_like(p) for p in model.parameters()]
+    for i in range(len(x)):
+        model.zero_grad()
+        loss_fn(model(x[i : i + 1]), y[i : i + 1]).backward()
+        for total, parameter in zip(expected, model.parameters()):
+            total.add_(parameter.grad.pow(2) / len(x))
+
+    fisher = estimator.fisher()
+    assert len(fisher.diagonals) == len(expected)
+    for diagonal, expected_diagonal in zip(fisher.diagonals, expected):
+        assert torch.allclose(diagonal, expected_diagonal, atol=1e-6)
+
+    # Nothing is accumulated at test time.
+    counts = list(estimator.counts)
+    sums = [
+        None if stats is None else [stat.clone() for stat in stats]
+        for stats in estimator.sums
+    ]
+    model.eval()
+    loss_fn(model(x), y).backward()
+    assert estimator.counts == counts
+    for stats, expected_stats in zip(estimator.sums, sums):
+        if expected_stats is None:
+            assert stats is None
+        else:
+            assert all(torch.equal(a, b) for a, b in zip(stats, expected_stats))
+
+    # `reset` clears the statistics.
+    estimator.reset()
+    assert estimator.counts == [0 for _ in layers]
+    estimator.remove_hooks()
+
+
+def test_online_fisher_ignores_auxiliary_passes():
+    """ When an auxiliary task also passes (augmented) inputs through the layers, only
+    the main forward pass should contribute to the FIM estimate.
+    """
+    torch.manual_seed(123)
+    model = make_model()
+    layers = list(get_layers(model).values())
+    x = torch.randn(8, 1, 6, 6)
+    y = torch.randint(4, (8,))
+    loss_fn = nn.CrossEntropyLoss()
+
+    # Estimate from the main forward passes only.
+    estimator = OnlineFisherEstimator(layers)
+    for x_batch, y_batch in zip(x.split(4), y.split(4)):
+        model.zero_grad()
+        loss_fn(model(x_batch), y_batch).backward()
+    expected = estimator.fisher()
+    estimator.remove_hooks()
+
+    in_main_forward_pass = False
+    estimator = OnlineFisherEstimator(
+        layers, should_accumulate=lambda: in_main_forward_pass
+    )
+    for x_batch, y_batch in zip(x.split(4), y.split(4)):
+        model.zero_grad()
+        in_main_forward_pass = True
+        logits = model(x_batch)
+        in_main_forward_pass = False
+        # Auxiliary task, e.g. a consistency loss between two augmented views.
+        aux_loss = (model(x_batch.flip(-1)) - model(x_batch + 0.1)).pow(2).mean()
+        (loss_fn(logits, y_batch) + aux_loss).backward()
+    fisher = estimator.fisher()
+    estimator.remove_hooks()
+
+    assert estimator.counts == [len(x) for _ in layers]
+    for diagonal, expected_diagonal in zip(fisher.diagonals, expected.diagonals):
+        assert torch.allclose(diagonal, expected_diagonal, atol=1e-6)
+
+
+def test_online_kfac_factors():
+    torch.manual_seed(123)
+    model = make_model()
+    layers = list(get_layers(model).values())
+    estimator = OnlineFisherEstimator(layers, kfac=True)
+    x = torch.randn(8, 1, 6, 6)
+    nn.CrossEntropyLoss()(model(x), torch.randint(4, (8,))).backward()
+
+    fisher = estimator.fisher()
+    shapes = [(a.shape, g.shape) for a, g in fisher.kfac_factors]
+    assert shapes == [
+        ((1 * 3 * 3 + 1, 1 * 3 * 3 + 1), (3, 3)),
+        ((3 * 4 * 4, 3 * 4 * 4), (5, 5)),
+        ((5 + 1, 5 + 1), (4, 4)),
+    ]
+    anchor_weights = [
+        p.detach().clone() for layer in layers for p in layer_parameters(layer)
+    ]
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.add_(0.1 * torch.randn_like(parameter))
+    penalty = fisher.penalty(layers, anchor_weights)
+    assert penalty > 0
+    estimator.remove_hooks()
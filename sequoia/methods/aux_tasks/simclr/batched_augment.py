@@ -0,0 +1,275 @@
+""" Batched implementation of the SimCLR data augmentation pipeline.
+
+This applies the same transformations as the `SimCLRAugment` of the falr submodule
+(random resized crop, horizontal flip, colour jitter and random grayscale), but on
+batches of image tensors, directly on their device, rather than one PIL image at a
+time. The random parameters of the transformations are sampled independently for
+each image.
+"""
+import math
+from typing import Callable, List, Optional, Tuple
+
+import torch
+from torch import Tensor, nn
+from torch.nn import functional as F
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+
+
+class BatchedSimCLRAugment(nn.Module):
+    """ Creates randomly augmented 'views' of a batch of images.
+
+    The images are expected to be float tensors of shape [B, C, H, W] with values in
+    [0, 1], with either 1 or 3 channels. The colour transformations that only make
+    sense for RGB images (saturation, hue, grayscale) are skipped for images with a
+    single channel, like PIL does for grayscale images.
+
+    Parameters
+    ----------
+    image_size : int
+        Height and width of the augmented images.
+    colour_distortion : float, optional
+        Strength of the colour jitter, by default 0.5.
+    scale : Tuple[float, float], optional
+        Range of the area of the crops, relative to the area of the image, by default
+        (0.08, 1.0).
+    ratio : Tuple[float, float], optional
+        Range of the aspect ratio of the crops, by default (3/4, 4/3).
+    jitter_p : float, optional
+        Probability of applying the colour jitter to an image, by default 0.8.
+    grayscale_p : float, optional
+        Probability of converting an image to grayscale, by default 0.2.
+    generator : torch.Generator, optional
+        (CPU) Random number generator used to sample the parameters of the
+        transformations. When None (default), the global torch RNG is used.
+    """
+
+    def __init__(
+        self,
+        image_size: int,
+        colour_distortion: float = 0.5,
+        scale: Tuple[float, float] = (0.08, 1.0),
+        ratio: Tuple[float, float] = (3 / 4, 4 / 3),
+        jitter_p: float = 0.8,
+        grayscale_p: float = 0.2,
+        generator: torch.Generator = None,
+    ):
+        super().__init__()
+        self.image_size = image_size
+        self.scale = scale
+        self.ratio = ratio
+        s = colour_distortion
+        self.brightness = 0.8 * s
+        self.contrast = 0.8 * s
+        self.saturation = 0.8 * s
+        self.hue = min(0.2 * s, 0.5)
+        self.jitter_p = jitter_p
+        self.grayscale_p = grayscale_p
+        self.generator = generator
+
+    @classmethod
+    def from_hparams(
+        cls, hparams, generator: torch.Generator = None
+    ) -> "BatchedSimCLRAugment":
+        """ Creates the augmentation from the `HParams` of the falr submodule. """
+        return cls(
+            image_size=hparams.image_size,
+            colour_distortion=hparams.colour_distortion,
+            generator=generator,
+        )
+
+    def forward(self, x: Tensor, count: int = 2) -> Tensor:
+        """ Returns `count` augmented views of each image in `x`.
+
+        The views of an image are adjacent in the output, which has shape
+        [B * count, C, image_size, image_size].
+        """
+        x = x.float().repeat_interleave(count, dim=0)
+        x = self.resized_crop_and_flip(x)
+        x = self.colour_jitter(x)
+        x = self.random_grayscale(x)
+        return x
+
+    def _rand(self, *shape: int, device: torch.device) -> Tensor:
+        # NOTE: The parameters are always sampled on the CPU (they are small), so that
+        # the same generator can be used no matter the device of the images.
+        return torch.rand(*shape, generator=self.generator).to(device)
+
+    def crop_boxes(
+        self, n: int, height: int, width: int, device: torch.device
+    ) -> Tensor:
+        """ Samples the crop boxes of `n` images, like `RandomResizedCrop.get_params`.
+
+        Returns a tensor of shape [n, 4] with the (top, left, height, width) of each
+        crop, in pixels.
+        """
+        n_attempts = 10
+        area = height * width
+        log_ratio = (math.log(self.ratio[0]), math.log(self.ratio[1]))
+        scale = self.scale[0] + (self.scale[1] - self.scale[0]) * self._rand(
+            n, n_attempts, device=device
+        )
+        target_area = area * scale
+        aspect_ratio = torch.exp(
+            log_ratio[0]
+            + (log_ratio[1] - log_ratio[0]) * self._rand(n, n_attempts, device=device)
+        )
+        w = torch.sqrt(target_area * aspect_ratio).round()
+        h = torch.sqrt(target_area / aspect_ratio).round()
+        valid = (w > 0) & (w <= width) & (h > 0) & (h <= height)
+        # Use the first valid attempt of each image.
+        first_valid = valid.float().argmax(dim=1, keepdim=True)
+        w = w.gather(1, first_valid).squeeze(1)
+        h = h.gather(1, first_valid).squeeze(1)
+        has_valid = valid.any(dim=1)
+
+        # Fallback to a central crop when none of the attempts are valid.
+        in_ratio = width / height
+        if in_ratio < min(self.ratio):
+            fallback_w, fallback_h = width, round(width / min(self.ratio))
+        elif in_ratio > max(self.ratio):
+            fallback_w, fallback_h = round(height * max(self.ratio)), height
+        else:
+            fallback_w, fallback_h = width, height
+        w = torch.where(has_valid, w, torch.full_like(w, fallback_w))
+        h = torch.where(has_valid, h, torch.full_like(h, fallback_h))
+
+        top = torch.floor(self._rand(n, device=device) * (height - h + 1))
+        left = torch.floor(self._rand(n, device=device) * (width - w + 1))
+        top = torch.where(has_valid, top, (height - h).div(2).floor())
+        left = torch.where(has_valid, left, (width - w).div(2).floor())
+        return torch.stack([top, left, h, w], dim=1)
+
+    def resized_crop_and_flip(self, x: Tensor) -> Tensor:
+        """ Crops and resizes each image, and flips half of them horizontally.
+
+        Both are done with a single (bilinear) resampling of the images.
+        """
+        n, c, height, width = x.shape
+        top, left, h, w = self.crop_boxes(n, height, width, device=x.device).unbind(1)
+        flip = torch.where(self._rand(n, device=x.device) < 0.5, -1.0, 1.0)
+        # Affine transformation from the normalized coordinates of the output to those
+        # of the crop in the input (with `align_corners=False`).
+        theta = torch.zeros(n, 2, 3, device=x.device, dtype=x.dtype)
+        theta[:, 0, 0] = flip * w / width
+        theta[:, 0, 2] = (2 * left + w) / width - 1
+        theta[:, 1, 1] = h / height
+        theta[:, 1, 2] = (2 * top + h) / height - 1
+        size = (n, c, self.image_size, self.image_size)
+        grid = F.affine_grid(theta, size, align_corners=False)
+        return F.grid_sample(
+            x, grid, mode="bilinear", padding_mode="border", align_corners=False
+        )
+
+    def colour_jitter(self, x: Tensor) -> Tensor:
+        """ Applies the colour jitter to a fraction `jitter_p` of the images.
+
+        Like `ColorJitter`, the brightness, contrast, saturation and hue are adjusted
+        in a random order, with random factors, which are sampled for each image.
+        """
+        n = x.shape[0]
+        device = x.device
+
+        def factors(strength: float) -> Tensor:
+            # NOTE: Like `ColorJitter`, the lower bound is clipped at 0.
+            low, high = max(0.0, 1.0 - strength), 1.0 + strength
+            return low + (high - low) * self._rand(n, device=device)
+
+        def hue_factors(strength: float) -> Tensor:
+            return -strength + 2 * strength * self._rand(n, device=device)
+
+        adjustments: List[Tuple[Callable[[Tensor, Tensor], Tensor], Tensor]] = [
+            (adjust_brightness, factors(self.brightness)),
+            (adjust_contrast, factors(self.contrast)),
+        ]
+        if x.shape[1] == 3:
+            adjustments.append((adjust_saturation, factors(self.saturation)))
+            adjustments.append((adjust_hue, hue_factors(self.hue)))
+        # Random order of the adjustments, for each image.
+        order = self._rand(n, len(adjustments), device=device).argsort(dim=1)
+        apply = self._rand(n, device=device) < self.jitter_p
+
+        x = x.clone()
+        for step in range(len(adjustments)):
+            for index, (adjust, factor) in enumerate(adjustments):
+                mask = apply & (order[:, step] == index)
+                if mask.any():
+                    x[mask] = adjust(x[mask], factor[mask])
+        return x
+
+    def random_grayscale(self, x: Tensor) -> Tensor:
+        """ Converts a fraction `grayscale_p` of the (RGB) images to grayscale. """
+        if x.shape[1] != 3:
+            return x
+        mask = self._rand(x.shape[0], device=x.device) < self.grayscale_p
+        gray = rgb_to_grayscale(x).expand_as(x)
+        return torch.where(mask.view(-1, 1, 1, 1), gray, x)
+
+
+def rgb_to_grayscale(x: Tensor) -> Tensor:
+    """ Returns the luminance of the images in `x` (same weights as torchvision). """
+    if x.shape[-3] == 1:
+        return x
+    r, g, b = x.unbind(dim=-3)
+    return (0.2989 * r + 0.587 * g + 0.114 * b).unsqueeze(-3)
+
+
+def _blend(x: Tensor, other: Tensor, factor: Tensor) -> Tensor:
+    factor = factor.view(-1, 1, 1, 1)
+    return (factor * x + (1 - factor) * other).clamp(0, 1)
+
+
+def adjust_brightness(x: Tensor, factor: Tensor) -> Tensor:
+    return _blend(x, torch.zeros_like(x), factor)
+
+
+def adjust_contrast(x: Tensor, factor: Tensor) -> Tensor:
+    mean = rgb_to_grayscale(x).mean(dim=(-3, -2, -1), keepdim=True)
+    return _blend(x, mean, factor)
+
+
+def adjust_saturation(x: Tensor, factor: Tensor) -> Tensor:
+    return _blend(x, rgb_to_grayscale(x), factor)
+
+
+def adjust_hue(x: Tensor, factor: Tensor) -> Tensor:
+    h, s, v = _rgb_to_hsv(x).unbind(dim=-3)
+    h = torch.remainder(h + factor.view(-1, 1, 1), 1.0)
+    return _hsv_to_rgb(torch.stack([h, s, v], dim=-3))
+
+
+def _rgb_to_hsv(x: Tensor) -> Tensor:
+    r, g, b = x.unbind(dim=-3)
+    maxc = x.max(dim=-3).values
+    minc = x.min(dim=-3).values
+    eqc = maxc == minc
+    cr = maxc - minc
+    ones = torch.ones_like(maxc)
+    s = cr / torch.where(eqc, ones, maxc)
+    cr_divisor = torch.where(eqc, ones, cr)
+    rc = (maxc - r) / cr_divisor
+    gc = (maxc - g) / cr_divisor
+    bc = (maxc - b) / cr_divisor
+    hr = (maxc == r) * (bc - gc)
+    hg = ((maxc == g) & (maxc != r)) * (2.0 + rc - bc)
+    hb = ((maxc != g) & (maxc != r)) * (4.0 + gc - rc)
+    h = torch.fmod((hr + hg + hb) / 6.0 + 1.0, 1.0)
+    return torch.stack([h, s, maxc], dim=-3)
+
+
+def _hsv_to_rgb(x: Tensor) -> Tensor:
+    h, s, v = x.unbind(dim=-3)
+    i = torch.floor(h * 6.0)
+    f = h * 6.0 - i
+    i = i.to(torch.int64) % 6
+    p = (v * (1.0 - s)).clamp(0.0, 1.0)
+    q = (v * (1.0 - s * f)).clamp(0.0, 1.0)
+    t = (v * (1.0 - s * (1.0 - f))).clamp(0.0, 1.0)
+    mask = i.unsqueeze(dim=-3) == torch.arange(6, device=i.device).view(-1, 1, 1)
+    a1 = torch.stack([v, q, p, p, t, v], dim=-3)
+    a2 = torch.stack([t, v, v, q, p, p], dim=-3)
+    a3 = torch.stack([p, p, t, v, v, q], dim=-3)
+    a4 = torch.stack([a1, a2, a3], dim=-4)
+    return torch.einsum("...ijk, ...xijk -> ...xjk", mask.to(x.dtype), a4)
@@ -0,0 +1,77 @@
+import pytest
+import torch
+import torchvision.transforms.functional as TF
+
+from . import batched_augment
+from .batched_augment import (BatchedSimCLRAugment, adjust_brightness,
+                              adjust_contrast, adjust_hue, adjust_saturation)
+
+
+@pytest.mark.parametrize(
+    "adjust, tv_adjust, factors",
+    [
+        (adjust_brightness, TF.adjust_brightness, [0.6, 1.4]),
+        (adjust_contrast, TF.adjust_contrast, [0.6, 1.4]),
+        (adjust_saturation, TF.adjust_saturation, [0.6, 1.4]),
+        (adjust_hue, TF.adjust_hue, [-0.1, 0.1]),
+    ],
+)
+def test_colour_adjustments_match_torchvision(adjust, tv_adjust, factors):
+    torch.manual_seed(123)
+    x = torch.rand(2, 3, 8, 8)
+    result = adjust(x, torch.as_tensor(factors))
+    for image, factor, result_image in zip(x, factors, result):
+        expected = tv_adjust(image, factor)
+        assert torch.allclose(result_image, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("channels", [1, 3])
+def test_output_shape_and_range(channels: int):
+    augment = BatchedSimCLRAugment(image_size=16)
+    x = torch.rand(5, channels, 28, 28)
+    views = augment(x, count=2)
+    assert views.shape == (10, channels, 16, 16)
+    assert views.min() >= 0 and views.max() <= 1
+    # The two views of an image are different.
+    assert not torch.allclose(views[0], views[1])
+
+
+def test_seeded_generator_is_reproducible():
+    x = torch.rand(4, 3, 32, 32)
+    views = [
+        BatchedSimCLRAugment(32, generator=torch.Generator().manual_seed(123))(x)
+        for _ in range(2)
+    ]
+    assert torch.equal(views[0], views[1])
+
+
+def test_full_crop_without_jitter_is_identity_or_flip():
+    augment = BatchedSimCLRAugment(
+        image_size=8, scale=(1.0, 1.0), ratio=(1.0, 1.0), jitter_p=0, grayscale_p=0
+    )
+    x = torch.rand(6, 3, 8, 8)
+    views = augment(x, count=1)
+    for image, view in zip(x, views):
+        assert torch.allclose(view, image, atol=1e-5) or torch.allclose(
+            view, image.flip(-1), atol=1e-5
+        )
+
+
+def test_strong_jitter_factors_are_not_negative(monkeypatch):
+    sampled_factors = []
+
+    def recording(adjust):
+        def _adjust(x, factor):
+            sampled_factors.append(factor)
+            return adjust(x, factor)
+        return _adjust
+
+    for name in ["adjust_brightness", "adjust_contrast", "adjust_saturation"]:
+        adjust = getattr(batched_augment, name)
+        monkeypatch.setattr(batched_augment, name, recording(adjust))
+    augment = BatchedSimCLRAugment(image_size=8, colour_distortion=2.0, jitter_p=1.0)
+    augment.colour_jitter(torch.rand(64, 3, 8, 8))
+    factors = torch.cat(sampled_factors)
+    # Like `ColorJitter`, the factors are sampled from [max(0, 1 - 0.8 s), 1 + 0.8 s].
+    assert factors.min() >= 0
+    assert factors.max() <= 1 + 0.8 * 2.0
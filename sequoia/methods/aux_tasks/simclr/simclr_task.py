@@ -5,20 +5,19 @@ submodule.
 TODO: #5 Refactor the SimCLR Auxiliary Task to use pl_bolts's implementation
 """
 from dataclasses import dataclass, field
-from typing import ClassVar, Dict
+from typing import ClassVar, Dict, Optional
 
 import torch
 from torch import Tensor
-from torchvision.transforms import Compose, Lambda, ToPILImage
 from simple_parsing import mutable_field
 from simple_parsing.helpers import Serializable
 
 from sequoia.common.loss import Loss
 from ..auxiliary_task import AuxiliaryTask
+from .batched_augment import BatchedSimCLRAugment
 
 try:
     from .falr.config import HParams, ExperimentType
-    from .falr.data import SimCLRAugment
     from .falr.losses import SimCLRLoss
     from .falr.models import Projector
 except ImportError as e:
@@ -38,6 +37,9 @@ class SimCLRTask(AuxiliaryTask):
         """ Options for the SimCLR aux task. """
         # Hyperparameters from the falr submodule.
         simclr_options: SimclrHParams = mutable_field(SimclrHParams)
+        # Seed of the random number generator used for the data augmentations. When
+        # None, the global torch random number generator is used.
+        augmentation_seed: Optional[int] = None
 
     def __init__(self, name: str="simclr", options: "SimCLRTask.Options"=None, **kwargs):
         super().__init__(name=name, options=options, **kwargs)
@@ -49,22 +51,19 @@ class SimCLRTask(AuxiliaryTask):
         self.hparams.double_augmentation = True
         self.hparams.repr_dim = AuxiliaryTask.hidden_size
 
-        self.augment = Compose([
-            ToPILImage(),
-            SimCLRAugment(self.hparams),
-            Lambda(lambda tup: torch.stack([tup[0], tup[1]]))
-        ])
+        generator: Optional[torch.Generator] = None
+        if self.options.augmentation_seed is not None:
+            generator = torch.Generator().manual_seed(self.options.augmentation_seed)
+        self.augment = BatchedSimCLRAugment.from_hparams(self.hparams, generator=generator)
         self.projector = Projector(self.hparams)
         self.i = 0
         self.loss = SimCLRLoss(self.hparams.proj_dim)
 
     def get_loss(self, forward_pass: Dict[str, Tensor], y: Tensor = None) -> Loss:
         x = forward_pass["x"]
-        # TODO: is there a more efficient way to do this than with a list
-        # comprehension? (torch multiprocessing-ish?)
-        # concat all the x's into a single list.
-        x_t = torch.cat([self.augment(x_i) for x_i in x.cpu()], dim=0)   # [2*B, C, H, W]
-        h_t = self.encode(x_t.to(self.device)).flatten(start_dim=1)  # [2*B, repr_dim]
+        # Two augmented views of each image, adjacent to each other.
+        x_t = self.augment(x.to(self.device), count=2)  # [2*B, C, H, W]
+        h_t = self.encode(x_t).flatten(start_dim=1)  # [2*B, repr_dim]
         z = self.projector(h_t)  # [2*B, proj_dim]
         loss = self.loss(z, self.hparams.xent_temp)
         loss_object = Loss(name=self.name, loss=loss)
@@ -7,7 +7,16 @@ from torchvision import transforms as T
 from torchvision.transforms import functional as TF
 
 from ..auxiliary_task import AuxiliaryTask
-from .bases import RegressTransformationTask, wrap_pil_transform
+from .bases import RegressTransformationTask
+
+
+def adjust_brightness(x: Tensor, brightness_factor: float) -> Tensor:
+    """ Adjusts the brightness of a batch of images with values in [0, 1].
+
+    Equivalent to `TF.adjust_brightness` on each (PIL) image, but done on the whole
+    batch at once.
+    """
+    return (x * brightness_factor).clamp(0, 1)
 
 
 class AdjustBrightnessTask(RegressTransformationTask):
@@ -24,7 +33,7 @@ class AdjustBrightnessTask(RegressTransformationTask):
                  name: str="adjust_brightness",
                  options: RegressTransformationTask.Options=None):
         super().__init__(
-            function=wrap_pil_transform(TF.adjust_brightness),
+            function=adjust_brightness,
             function_args=brightness_values,
             function_arg_range=(min_brightness, max_brightness),
             n_calls=n_calls,
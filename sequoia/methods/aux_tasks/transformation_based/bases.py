@@ -1,7 +1,7 @@
 from abc import abstractmethod
 from dataclasses import dataclass
 from functools import wraps
-from typing import Any, Callable, List, Tuple, Union
+from typing import Any, Callable, Dict, List, Tuple, Union
 
 import torch
 from torch import Tensor, nn
@@ -101,9 +101,26 @@ class TransformationBasedTask(AuxiliaryTask):
         assert self.alphas is not None, "set the `self.alphas` attribute in the base class."
         assert self.function_args is not None, "set the `self.function_args` attribute in the base class."
 
+        # TODO: Transform before or after the `preprocess_inputs` function?
+        x = fix_channels(x)
+        # Transform X using the function, with each of the arguments.
+        x_ts = [self.function(x, fn_arg) for fn_arg in self.function_args]
+        # Get the codes for all the transformed x's, in as few forward passes as
+        # possible.
+        h_x_ts = self.encode_transformed(x_ts)
+
+        aux_layer_input = torch.cat(h_x_ts)
+        if self.options.compare_with_original:
+            h_x_repeated = torch.cat([h_x] * len(h_x_ts))
+            aux_layer_input = torch.cat([h_x_repeated, aux_layer_input], dim=-1)
+        # Get the predicted argument of each transformation.
+        alpha_ts = self.auxiliary_layer(aux_layer_input).split(batch_size)
+
         # Get the loss for each transformation argument.
-        for fn_arg, alpha in zip(self.function_args, self.alphas):
-            loss_i = self.get_loss_for_arg(x=x, h_x=h_x, fn_arg=fn_arg, alpha=alpha)
+        for fn_arg, alpha, x_t, h_x_t, alpha_t in zip(self.function_args, self.alphas, x_ts, h_x_ts, alpha_ts):
+            loss_i = self.get_loss_for_arg(
+                x_t=x_t, h_x_t=h_x_t, alpha_t=alpha_t, fn_arg=fn_arg, alpha=alpha,
+            )
             loss_info += loss_i
             # print(f"{self.name}_{fn_arg}", loss_i.metrics)
 
@@ -116,22 +133,26 @@ class TransformationBasedTask(AuxiliaryTask):
         metrics[self.name] = total_metrics
         return loss_info
 
-    def get_loss_for_arg(self, x: Tensor, h_x: Tensor, fn_arg: Any, alpha: Tensor) -> Loss:
-        alpha = alpha.to(x.device)
-        # TODO: Transform before or after the `preprocess_inputs` function?
-        x = fix_channels(x)
-        # Transform X using the function.
-        x_t = self.function(x, fn_arg)
-        # Get the code for the transformed x.
-        h_x_t = self.encode(x_t)
+    def encode_transformed(self, x_ts: List[Tensor]) -> List[Tensor]:
+        """ Encodes each of the transformed batches in `x_ts`.
 
-        aux_layer_input = h_x_t
-        if self.options.compare_with_original:
-            aux_layer_input = torch.cat([h_x, h_x_t], dim=-1)
+        The batches with the same shape are concatenated and encoded in a single
+        forward pass. (For instance, all the rotations of square images.)
+        """
+        indices_per_shape: Dict[torch.Size, List[int]] = {}
+        for i, x_t in enumerate(x_ts):
+            indices_per_shape.setdefault(x_t.shape, []).append(i)
 
-        # Get the predicted argument of the transformation.
-        alpha_t = self.auxiliary_layer(aux_layer_input)
-        
+        h_x_ts: List[Tensor] = [None] * len(x_ts)  # type: ignore
+        for indices in indices_per_shape.values():
+            x_t = torch.cat([x_ts[i] for i in indices])
+            h_x_t = self.encode(x_t)
+            for i, h_x_t_i in zip(indices, h_x_t.split(len(x_ts[indices[0]]))):
+                h_x_ts[i] = h_x_t_i
+        return h_x_ts
+
+    def get_loss_for_arg(self, x_t: Tensor, h_x_t: Tensor, alpha_t: Tensor, fn_arg: Any, alpha: Tensor) -> Loss:
+        alpha = alpha.to(alpha_t.device)
         # get the metrics for this particular argument (accuracy, mse, etc.)
         if isinstance(fn_arg, int):
             name = f"{fn_arg}"
@@ -12,7 +12,7 @@ from sequoia.common.loss import Loss
 from sequoia.common.metrics import get_metrics
 from ..auxiliary_task import AuxiliaryTask
 
-from .bases import ClassifyTransformationTask, wrap_pil_transform
+from .bases import ClassifyTransformationTask
 
 
 def rotate(x: Tensor, angle: int) -> Tensor:
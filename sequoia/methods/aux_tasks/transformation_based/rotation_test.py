@@ -0,0 +1,51 @@
+import torch
+from torch import Tensor, nn
+
+from ..auxiliary_task import AuxiliaryTask
+from .rotation import RotationTask
+
+
+class CountingEncoder(nn.Module):
+    def __init__(self, hidden_size: int):
+        super().__init__()
+        # NOTE: Accepts images of any shape.
+        self.layer = nn.Sequential(
+            nn.AdaptiveAvgPool2d(2), nn.Flatten(), nn.Linear(4, hidden_size)
+        )
+        self.calls = 0
+
+    def forward(self, x: Tensor) -> Tensor:
+        self.calls += 1
+        return self.layer(x)
+
+
+def test_rotations_are_encoded_in_one_pass(monkeypatch):
+    encoder = CountingEncoder(hidden_size=10)
+    monkeypatch.setattr(AuxiliaryTask, "hidden_size", 10)
+    monkeypatch.setattr(AuxiliaryTask, "encoder", encoder, raising=False)
+    task = RotationTask()
+    x = torch.rand(4, 1, 6, 6)
+    h_x = encoder(x)
+    encoder.calls = 0
+
+    loss = task.get_loss(x=x, h_x=h_x)
+    assert encoder.calls == 1
+    assert loss.loss.requires_grad
+
+    # Same as encoding each rotated batch separately.
+    h_x_ts = task.encode_transformed([x.rot90(k, dims=(-2, -1)) for k in range(4)])
+    for k, h_x_t in enumerate(h_x_ts):
+        assert torch.allclose(h_x_t, encoder(x.rot90(k, dims=(-2, -1))), atol=1e-6)
+
+
+def test_non_square_images_are_grouped_by_shape(monkeypatch):
+    encoder = CountingEncoder(hidden_size=10)
+    monkeypatch.setattr(AuxiliaryTask, "hidden_size", 10)
+    monkeypatch.setattr(AuxiliaryTask, "encoder", encoder, raising=False)
+    task = RotationTask()
+    x = torch.rand(3, 1, 4, 6)
+    x_ts = [x, x.rot90(1, dims=(-2, -1)), x.rot90(2, dims=(-2, -1))]
+    h_x_ts = task.encode_transformed(x_ts)
+    assert encoder.calls == 2
+    assert [h.shape for h in h_x_ts] == [torch.Size([3, 10])] * 3
+    assert torch.allclose(h_x_ts[2], encoder.layer(x_ts[2]), atol=1e-6)
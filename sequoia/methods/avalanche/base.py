@@ -41,7 +41,7 @@ from sequoia.settings.sl.continual import ContinualSLTestEnvironment
 from sequoia.settings.sl import ContinualSLSetting
 from sequoia.utils import get_logger
 
-from .experience import SequoiaExperience
+from .experience import SequoiaExperience, TaskSetDataset
 from .patched_models import MTSimpleCNN, MTSimpleMLP, SimpleCNN, SimpleMLP
 logger = get_logger(__file__)
 
@@ -346,7 +346,14 @@ class AvalancheMethod(
 
         NOTE: You could instead train an online model here, in order to get better
         online performance!
+
+        When the environment simply iterates over a TaskSet from continuum, the
+        samples are instead indexed lazily from that TaskSet (see `TaskSetDataset`),
+        without iterating over the environment.
         """
+        if TaskSetDataset.from_env(env) is not None:
+            return SequoiaExperience(env=env, setting=setting)
+
         all_observations: List[Observations] = []
         all_rewards: List[Rewards] = []
 
@@ -1,9 +1,11 @@
 """ 'Wrapper' around a PassiveEnvironment from Sequoia, disguising it as an 'Experience'
 from Avalanche.
 """
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
+import gym
 import tqdm
+from continuum.tasks import TaskSet
 from sequoia.common.gym_wrappers.utils import IterableWrapper
 from sequoia.settings.sl import (
     IncrementalSLSetting,
@@ -12,7 +14,7 @@ from sequoia.settings.sl import (
 )
 from sequoia.settings.sl.incremental.objects import Observations, Rewards
 from torch import Tensor
-from torch.utils.data import TensorDataset
+from torch.utils.data import Dataset, TensorDataset
 
 from avalanche.benchmarks.scenarios import Experience
 from avalanche.benchmarks.utils.avalanche_dataset import (
@@ -21,6 +23,51 @@ from avalanche.benchmarks.utils.avalanche_dataset import (
 )
 
 
+class TaskSetDataset(Dataset):
+    """ Dataset that gives the (x, y) samples of a TaskSet from continuum, one at a time.
+
+    The samples are only loaded (and transformed) when they are indexed. The targets
+    and task labels are read from the TaskSet directly, without loading the samples.
+    """
+
+    def __init__(self, taskset: TaskSet, hide_task_labels: bool = False):
+        self.taskset = taskset
+        self.hide_task_labels = hide_task_labels
+
+    @classmethod
+    def from_env(cls, env: gym.Env) -> Optional["TaskSetDataset"]:
+        """ Returns a TaskSetDataset for the TaskSet of `env`, if possible.
+
+        This is only possible when the samples of the TaskSet are exactly what `env`
+        yields, i.e. when `env` is a PassiveEnvironment (without any wrappers, for
+        instance for additional transforms or to measure the online performance)
+        whose dataset is a TaskSet, and which gives back the rewards with the
+        observations. Returns None otherwise.
+        """
+        if not isinstance(env, PassiveEnvironment) or env.pretend_to_be_active:
+            return None
+        if not isinstance(env.dataset, TaskSet):
+            return None
+        return cls(env.dataset, hide_task_labels=getattr(env, "_hide_task_labels", False))
+
+    def __len__(self) -> int:
+        return len(self.taskset)
+
+    def __getitem__(self, index: int) -> Tuple[Any, Any]:
+        x, y, *_ = self.taskset[index]
+        return x, y
+
+    @property
+    def targets(self) -> List[int]:
+        return self.taskset._y.tolist()
+
+    @property
+    def task_labels(self) -> Optional[List[int]]:
+        if self.hide_task_labels:
+            return None
+        return self.taskset._t.tolist()
+
+
 class SequoiaExperience(IterableWrapper, Experience):
     def __init__(
         self,
@@ -52,6 +99,22 @@ class SequoiaExperience(IterableWrapper, Experience):
             self.transforms = setting.test_transforms
         self.name = f"{self.type}_{self.task_id}"
 
+        lazy_dataset: Optional[TaskSetDataset] = None
+        if x is None or y is None or task_labels is None:
+            lazy_dataset = TaskSetDataset.from_env(env)
+
+        if lazy_dataset is not None:
+            # Index the samples of the TaskSet lazily, rather than iterating over the
+            # whole environment and keeping all the samples in memory.
+            self._tensor_dataset = None
+            self._dataset = AvalancheDataset(
+                dataset=lazy_dataset,
+                task_labels=lazy_dataset.task_labels,
+                targets=lazy_dataset.targets,
+                dataset_type=AvalancheDatasetType.CLASSIFICATION,
+            )
+            return
+
         if x is None or y is None or task_labels is None:
             all_observations: List[Observations] = []
             all_rewards: List[Rewards] = []
@@ -153,6 +216,8 @@ class SequoiaExperience(IterableWrapper, Experience):
 
     @property
     def task_labels(self):
+        if self._tensor_dataset is None:
+            return self._dataset.targets_task_labels
         return self._tensor_dataset.tensors[-1]
 
     @property
@@ -0,0 +1,48 @@
+import numpy as np
+import torch
+from continuum.tasks import TaskSet
+from gym import spaces
+
+from sequoia.common.gym_wrappers import TransformObservation
+from sequoia.settings.sl import PassiveEnvironment
+
+from .experience import TaskSetDataset
+
+
+def make_taskset(n: int = 20) -> TaskSet:
+    x = np.random.randint(0, 255, size=(n, 4, 4, 1), dtype=np.uint8)
+    y = np.arange(n) % 4
+    t = np.arange(n) // 10
+    return TaskSet(x, y, t, trsf=None)
+
+
+def test_taskset_dataset_is_lazy():
+    taskset = make_taskset()
+    env = PassiveEnvironment(taskset, action_space=spaces.Discrete(4), batch_size=5)
+    dataset = TaskSetDataset.from_env(env)
+    assert dataset is not None
+    assert len(dataset) == 20
+    # The targets and task labels don't require loading the samples.
+    assert dataset.targets == taskset._y.tolist()
+    assert dataset.task_labels == taskset._t.tolist()
+
+    x, y = dataset[13]
+    expected_x, expected_y, _ = taskset[13]
+    assert torch.equal(torch.as_tensor(x), torch.as_tensor(expected_x))
+    assert y == expected_y
+
+
+def test_no_lazy_dataset_for_wrapped_env():
+    taskset = make_taskset()
+    env = PassiveEnvironment(taskset, action_space=spaces.Discrete(4), batch_size=5)
+    # NOTE: The wrapper could change the observations, so the TaskSet can't be used.
+    wrapped_env = TransformObservation(env, f=lambda obs: obs)
+    assert TaskSetDataset.from_env(wrapped_env) is None
+
+    active_env = PassiveEnvironment(
+        taskset,
+        action_space=spaces.Discrete(4),
+        batch_size=5,
+        pretend_to_be_active=True,
+    )
+    assert TaskSetDataset.from_env(active_env) is None
@@ -26,6 +26,7 @@ from wandb.wandb_run import Run
 
 from sequoia.common import Config, TrainerConfig
 from sequoia.common.spaces import Image
+from sequoia.common.spaces.validation import should_validate
 from sequoia.settings import RLSetting, SLSetting
 from sequoia.settings.rl.continual import ContinualRLSetting
 from sequoia.settings.assumptions.incremental import IncrementalAssumption
@@ -35,10 +36,13 @@ from sequoia.settings.base.objects import Actions, Observations, Rewards
 from sequoia.settings.base.results import Results
 from sequoia.settings.base.setting import Setting, SettingType
 from sequoia.utils import Parseable, Serializable, compute_identity, get_logger
+from sequoia.utils.parallel import run_in_processes
 from sequoia.methods import register_method
 from sequoia.settings.sl.continual import ContinualSLSetting
+from sequoia.settings.sl.dataset_cache import dataset_cache, prepare_datasets
 
-from .models import BaselineModel, ForwardPass
+from .models import BaselineModel, ForwardPass, OutputHead
+from .models.actor import inference_mode, make_actor
 
 logger = get_logger(__file__)
 
@@ -203,6 +207,9 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
 
         self.additional_train_wrappers: List[Callable] = []
         self.additional_valid_wrappers: List[Callable] = []
+        # The compiled actors used in `get_actions` when `hparams.compile_actor` is
+        # set, for each output head. Cleared whenever the model might have changed.
+        self._actors: Dict[OutputHead, torch.nn.Module] = {}
         
         self.setting: Setting
 
@@ -304,6 +311,7 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
                 self.trainer_options.limit_test_batches = setting.max_steps
 
         self.model = self.create_model(setting)
+        self._actors.clear()
         assert self.hparams is self.model.hp
 
         # The PolicyHead actually does its own backward pass, so we disable
@@ -332,20 +340,21 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
             "Setting should have been called method.configure(setting=self) "
             "before calling `fit`!"
         )
-        # TODO: Figure out if there is a smarter way to reset the state of the Trainer,
-        # rather than just creating a new one every time.
-        self.trainer = self.create_trainer(self.setting)
-        
-        # NOTE: It doesn't seem sufficient to just do this, since for instance the
-        # early-stopping callback would prevent training on future tasks, since they
-        # have higher validation loss:
-        # self.trainer.current_epoch = 0
+        trainer: Optional[Trainer] = getattr(self, "trainer", None)
+        if self.trainer_options.reuse_trainer and trainer is not None:
+            # NOTE: It isn't sufficient to just reset the epoch counter, since for
+            # instance the early-stopping callback would prevent training on future
+            # tasks, since they have higher validation loss.
+            self.reset_trainer(trainer)
+        else:
+            self.trainer = self.create_trainer(self.setting)
 
         success = self.trainer.fit(
             model=self.model, train_dataloader=train_env, val_dataloaders=valid_env,
         )
         # BUG: After `fit`, it seems like the output head of the model is on the CPU?
         self.model.to(self.config.device)
+        self._actors.clear()
 
         return success
 
@@ -365,13 +374,40 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
         always be `True`.
         """
         self.model.eval()
-        with torch.no_grad():
-            forward_pass = self.model.forward(observations)
-        actions: Actions = forward_pass.actions
+        output_head: Optional[OutputHead] = None
+        if self.hparams.compile_actor:
+            output_head = self.model.get_actor_output_head(observations)
+        if output_head is not None:
+            actions = self.get_actions_from_actor(observations, output_head)
+        else:
+            with torch.no_grad():
+                forward_pass = self.model.forward(observations)
+            actions: Actions = forward_pass.actions
         action_numpy = actions.actions_np
-        assert action_numpy in action_space, (action_numpy, action_space)
+        if should_validate("get_actions"):
+            assert action_numpy in action_space, (action_numpy, action_space)
         return actions
 
+    def get_actions_from_actor(
+        self, observations: Observations, output_head: OutputHead
+    ) -> Actions:
+        """ Gets the actions for these observations using the compiled actor for the
+        given output head (see `BaselineModel.create_actor`).
+
+        The actor is created and traced the first time it is used, and re-created after
+        the model is trained (`fit`) or when switching tasks (`on_task_switch`).
+        """
+        x = torch.as_tensor(
+            observations.x, device=self.model.encoder_device, dtype=self.model.dtype
+        )
+        actor = self._actors.get(output_head)
+        if actor is None:
+            actor = make_actor(self.model.create_actor(output_head), example_x=x)
+            self._actors[output_head] = actor
+        with inference_mode():
+            y_pred = actor(x)
+        return Actions(y_pred=y_pred)
+
     def create_model(self, setting: SettingType) -> BaselineModel[SettingType]:
         """Creates the BaselineModel (a LightningModule) for the given Setting.
 
@@ -414,6 +450,28 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
         )
         return trainer
 
+    def reset_trainer(self, trainer: Trainer) -> None:
+        """Resets the state of `trainer` so it can be used to train on a new task.
+
+        This is used instead of `create_trainer` when `trainer_options.reuse_trainer`
+        is True. The epoch counter and the state of the early-stopping callbacks are
+        reset, while the global step, the loggers and the other callbacks are kept.
+
+        Args:
+            trainer (Trainer): The Trainer used in the previous call to `fit`.
+        """
+        trainer.current_epoch = 0
+        trainer.should_stop = False
+        trainer.interrupted = False
+        for callback in trainer.callbacks:
+            if isinstance(callback, EarlyStopping):
+                callback.wait_count = 0
+                callback.stopped_epoch = 0
+                # NOTE: `np.Inf` was removed in NumPy 2.0.
+                callback.best_score = torch.tensor(
+                    float("inf") if callback.monitor_op == torch.lt else float("-inf")
+                )
+
     def get_experiment_name(self, setting: Setting, experiment_id: str = None) -> str:
         """Gets a unique name for the experiment where `self` is applied to `setting`.
 
@@ -496,6 +554,9 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
         database_path: Union[str, Path] = None,
         max_runs: int = None,
         debug: bool = False,
+        n_workers: int = 1,
+        reduction_factor: int = None,
+        warm_start: bool = False,
     ) -> Tuple[BaselineModel.HParams, float]:
         # Setting max epochs to 1, just to keep runs somewhat short.
         # NOTE: Now we're actually going to have the max_epochs as a tunable
@@ -515,8 +576,23 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
             database_path=database_path,
             max_runs=max_runs,
             debug = debug or self.config.debug,
+            n_workers=n_workers,
+            reduction_factor=reduction_factor,
+            warm_start=warm_start,
         )
 
+    def state_dict(self) -> Dict[str, Any]:
+        """ Returns the state of the model.
+
+        NOTE: The optimizers aren't included, since they are re-created by the Trainer
+        at the start of each task.
+        """
+        return {"model": self.model.state_dict()}
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        self.model.load_state_dict(state_dict["model"])
+        self._actors.clear()
+
     def receive_results(self, setting: Setting, results: Results):
         """ Receives the results of an experiment, where `self` was applied to Setting
         `setting`, which produced results `results`.
@@ -548,22 +624,68 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
         ]
 
     def apply_all(
-        self, argv: Union[str, List[str]] = None
+        self,
+        argv: Union[str, List[str]] = None,
+        n_workers: int = 1,
+        threads_per_worker: int = None,
+        dataset_cache_dir: Path = None,
     ) -> Dict[Type[Setting], Results]:
         """(WIP): Runs this Method on all its applicable settings.
 
+        Parameters
+        ----------
+        argv : Union[str, List[str]], optional
+            Command-line arguments used to create the Settings. Defaults to None.
+        n_workers : int, optional
+            Number of Settings to run in parallel, each in its own process and with
+            its own copy of this Method. When 1 (default), the Settings are run
+            sequentially, in this process, with this Method.
+        threads_per_worker : int, optional
+            Number of threads torch can use in each process. By default, the CPUs are
+            split evenly between the processes.
+        dataset_cache_dir : Path, optional
+            Directory where the decoded datasets are cached, so that they can be
+            shared between the Settings. Defaults to `<config.data_dir>/cache` when
+            `n_workers > 1`, and to no cache otherwise.
+
         Returns
         -------
 
             Dict mapping from setting type to the Results produced by this method.
         """
         applicable_settings = self.get_applicable_settings()
-
-        all_results: Dict[Type[Setting], Results] = {}
-        for setting_type in applicable_settings:
-            setting = setting_type.from_args(argv)
-            results = setting.apply(self)
-            all_results[setting_type] = results
+        if dataset_cache_dir is None and n_workers > 1:
+            dataset_cache_dir = self.config.data_dir / "cache"
+
+        if n_workers > 1:
+            # Download and decode each dataset once, before launching the workers.
+            prepare_datasets(
+                [setting_type.from_args(argv) for setting_type in applicable_settings],
+                cache_dir=dataset_cache_dir,
+            )
+            jobs = [
+                dict(
+                    method=self,
+                    setting_type=setting_type,
+                    argv=argv,
+                    dataset_cache_dir=dataset_cache_dir,
+                )
+                for setting_type in applicable_settings
+            ]
+            results_list = run_in_processes(
+                _apply_on_setting,
+                jobs,
+                n_workers=n_workers,
+                threads_per_worker=threads_per_worker,
+            )
+        else:
+            results_list = [
+                _apply_on_setting(self, setting_type, argv, dataset_cache_dir)
+                for setting_type in applicable_settings
+            ]
+        all_results: Dict[Type[Setting], Results] = dict(
+            zip(applicable_settings, results_list)
+        )
         print(f"All results for method of type {type(self)}:")
         print(
             {
@@ -605,6 +727,7 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
             knowing what task we're switching to.
         """
         self.model.on_task_switch(task_id)
+        self._actors.clear()
 
     def setup_wandb(self, run: Run) -> None:
         """ Called by the Setting when using Weights & Biases, after `wandb.init`.
@@ -625,3 +748,18 @@ class BaselineMethod(Method, Serializable, Parseable, target_setting=Setting):
         # Need to check wether this causes any issues.
         # run.config["hparams"] = self.hparams.to_dict()
         # run.config["trainer_config"] = self.trainer_options
+
+
+def _apply_on_setting(
+    method: Method,
+    setting_type: Type[Setting],
+    argv: Union[str, List[str]] = None,
+    dataset_cache_dir: Optional[Path] = None,
+) -> Results:
+    """ Creates a Setting of type `setting_type` from `argv`, and applies `method` on it.
+
+    Used by `BaselineMethod.apply_all`, possibly in another process.
+    """
+    with dataset_cache(dataset_cache_dir):
+        setting = setting_type.from_args(argv)
+        return setting.apply(method)
@@ -1,4 +1,5 @@
-from typing import Type
+from pathlib import Path
+from typing import List, Optional, Type
 
 import numpy as np
 import pytest
@@ -9,8 +10,10 @@ from sequoia.conftest import skip_param, slow
 from sequoia.settings import (ClassIncrementalSetting, IncrementalRLSetting,
                               RLSetting, Setting)
 from sequoia.settings.rl.continual.results import ContinualRLResults
+from sequoia.settings.sl import TaskIncrementalSLSetting
 
 from .baseline_method import BaselineMethod, BaselineModel
+from .models.simple_convnet import SimpleConvNet
 
 
 @pytest.fixture
@@ -75,3 +78,131 @@ def test_device_of_output_head_is_correct():
 
     results = setting.apply(method)
     assert 0.10 <= results.objective <= 0.30
+
+
+@pytest.mark.timeout(120)
+def test_reuse_trainer(config: Config):
+    """ Test that the same Trainer is used to train on all tasks when `reuse_trainer`
+    is set, and that it is reset so that training happens for every task.
+    """
+    method = BaselineMethod(config=config, max_epochs=1, reuse_trainer=True)
+    assert method.trainer_options.reuse_trainer
+
+    trainers: List[Trainer] = []
+    global_steps: List[int] = []
+    fit = method.fit
+
+    def _fit(*args, **kwargs):
+        result = fit(*args, **kwargs)
+        trainers.append(method.trainer)
+        global_steps.append(method.trainer.global_step)
+        return result
+
+    method.fit = _fit
+    setting = IncrementalRLSetting(
+        dataset="cartpole", nb_tasks=2, train_max_steps=200, test_max_steps=200,
+    )
+    setting.apply(method, config=config)
+
+    assert len(trainers) == 2
+    assert trainers[0] is trainers[1]
+    # Training also happened on the second task.
+    assert 0 < global_steps[0] < global_steps[1]
+
+
+@slow
+@pytest.mark.timeout(300)
+@pytest.mark.skipif(not hasattr(torch, "autocast"), reason="Requires torch >= 1.10")
+def test_cpu_bf16_autocast_matches_fp32():
+    """ Training with the encoder in bfloat16 (and channels_last) on the CPU should
+    give roughly the same results as in float32.
+    """
+    objectives: List[float] = []
+    for bf16 in [False, True]:
+        hparams = BaselineModel.HParams(
+            encoder=SimpleConvNet,
+            train_from_scratch=True,
+            cpu_bf16_autocast=bf16,
+            channels_last=bf16,
+        )
+        method = BaselineMethod(
+            hparams=hparams,
+            config=Config(device=torch.device("cpu"), seed=123, debug=True),
+            trainer_options=TrainerConfig(
+                gpus=0, distributed_backend=None, max_epochs=1, limit_train_batches=50
+            ),
+        )
+        setting = ClassIncrementalSetting(dataset="mnist", nb_tasks=1)
+        results = setting.apply(method, config=method.config)
+        objectives.append(results.objective)
+
+    fp32_objective, bf16_objective = objectives
+    assert abs(fp32_objective - bf16_objective) < 0.05
+
+
+class _Interrupted(Exception):
+    pass
+
+
+@slow
+@pytest.mark.timeout(300)
+def test_resume_from_task_checkpoint(tmp_path: Path):
+    """ A run interrupted after a few tasks and resumed from its checkpoint (with a new
+    output head per task) should give the same results as an uninterrupted run.
+    """
+
+    def make_method() -> BaselineMethod:
+        return BaselineMethod(
+            hparams=BaselineModel.HParams(
+                encoder=SimpleConvNet, train_from_scratch=True, multihead=True
+            ),
+            config=Config(device=torch.device("cpu"), seed=123, debug=True),
+            trainer_options=TrainerConfig(
+                gpus=0,
+                distributed_backend=None,
+                max_epochs=1,
+                limit_train_batches=10,
+                limit_val_batches=5,
+            ),
+        )
+
+    def make_setting(checkpoint_dir: Optional[Path] = None) -> TaskIncrementalSLSetting:
+        return TaskIncrementalSLSetting(
+            dataset="mnist", nb_tasks=3, checkpoint_dir=checkpoint_dir
+        )
+
+    method = make_method()
+    expected = make_setting().apply(method, config=method.config)
+
+    # Interrupt the run during the last task, after the checkpoint of task 1.
+    checkpoint_dir = tmp_path / "checkpoints"
+    method = make_method()
+    fit = method.fit
+    n_fit_calls = 0
+
+    def _fit(*args, **kwargs):
+        nonlocal n_fit_calls
+        n_fit_calls += 1
+        if n_fit_calls == 3:
+            raise _Interrupted()
+        return fit(*args, **kwargs)
+
+    method.fit = _fit
+    with pytest.raises(_Interrupted):
+        make_setting(checkpoint_dir).apply(method, config=method.config)
+    assert len(list(checkpoint_dir.iterdir())) == 1
+
+    method = make_method()
+    fit_calls_after_resuming = 0
+    fit = method.fit
+
+    def _count_fit(*args, **kwargs):
+        nonlocal fit_calls_after_resuming
+        fit_calls_after_resuming += 1
+        return fit(*args, **kwargs)
+
+    method.fit = _count_fit
+    results = make_setting(checkpoint_dir).apply(method, config=method.config)
+    # Only the last task was trained on after resuming.
+    assert fit_calls_after_resuming == 1
+    assert results.objective_matrix == expected.objective_matrix
@@ -8,7 +8,7 @@ the `sequoia.methods.aux_tasks.ewc.EwcTask`.
 """
 import warnings
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from gym.utils import colorize
 from simple_parsing import ArgumentParser, mutable_field
@@ -88,6 +88,20 @@ class EwcMethod(BaselineMethod, target_setting=IncrementalAssumption):
     def on_task_switch(self, task_id: Optional[int]):
         super().on_task_switch(task_id)
 
+    def get_hparams_unused_in_first_task(self, setting: Setting) -> List[str]:
+        # The EWC penalty is only applied from the second task onward, and the FIM is
+        # only computed at the end of the first task.
+        return ["hparams.ewc.coefficient", "hparams.ewc.fim_representation"]
+
+    def state_dict(self) -> Dict[str, Any]:
+        state = super().state_dict()
+        state["ewc"] = self.model.tasks["ewc"].task_state_dict()
+        return state
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        super().load_state_dict(state_dict)
+        self.model.tasks["ewc"].load_task_state_dict(state_dict["ewc"])
+
     def create_model(self, setting: Setting) -> EwcModel:
         """Create the Model to use for the given Setting.
 
@@ -0,0 +1,112 @@
+""" Frozen 'actor' used to get actions from observations at test time.
+
+The forward pass of the `BaselineModel` preprocesses the observations, creates a
+`ForwardPass` object and goes through the output head's forward pass, which has a lot
+of python overhead compared to the actual computation when the model is small (e.g.
+an MLP policy). The `Actor` only holds the encoder and the dense layers of an output
+head, and maps a batch of observations `x` directly to a batch of actions. It is
+traced with `torch.jit.trace` when possible (see `make_actor`).
+"""
+from contextlib import nullcontext
+
+import torch
+from torch import Tensor, nn
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+
+
+class Actor(nn.Module):
+    """ Maps a batch of observations `x` to a batch of actions.
+
+    Parameters
+    ----------
+    encoder : nn.Module
+        The encoder of the model.
+    head : nn.Module
+        The dense layers of the output head, which give the logits (or the predicted
+        values) from the representations.
+    discrete : bool, optional
+        Wether the actions are discrete, in which case the action is the argmax of the
+        outputs of the head. Defaults to True.
+    channels_last : bool, optional
+        Wether to convert the (4D) inputs to the channels_last memory format. Defaults
+        to False.
+    bf16_autocast : bool, optional
+        Wether to run the encoder under CPU bfloat16 autocast. Defaults to False.
+    dtype : torch.dtype, optional
+        Dtype of the inputs and representations. Defaults to `torch.float32`.
+    """
+
+    def __init__(
+        self,
+        encoder: nn.Module,
+        head: nn.Module,
+        discrete: bool = True,
+        channels_last: bool = False,
+        bf16_autocast: bool = False,
+        dtype: torch.dtype = torch.float32,
+    ):
+        super().__init__()
+        self.encoder = encoder
+        self.head = head
+        self.discrete = discrete
+        self.channels_last = channels_last
+        self.bf16_autocast = bf16_autocast
+        self.dtype = dtype
+
+    def forward(self, x: Tensor) -> Tensor:
+        x = x.to(self.dtype)
+        if self.channels_last and x.dim() == 4:
+            x = x.contiguous(memory_format=torch.channels_last)
+        autocast = (
+            torch.autocast("cpu", dtype=torch.bfloat16)
+            if self.bf16_autocast
+            else nullcontext()
+        )
+        with autocast:
+            h_x = self.encoder(x)
+        if isinstance(h_x, list) and len(h_x) == 1:
+            h_x = h_x[0]
+        y = self.head(h_x.to(self.dtype))
+        if self.discrete:
+            return y.argmax(dim=-1)
+        return y
+
+
+def make_actor(actor: Actor, example_x: Tensor, trace: bool = True) -> nn.Module:
+    """ Returns a version of `actor` to be used for inference.
+
+    The actor is put in evaluation mode, and traced (and frozen, when available) using
+    `example_x` as the example input. When tracing isn't possible (e.g. if the encoder
+    has some data-dependent control flow), the actor is returned as-is.
+
+    NOTE: The traced actor shares the parameters of the model (or holds a copy of them
+    when frozen), so it needs to be re-created after the model is updated.
+    """
+    actor.eval()
+    if not trace or actor.bf16_autocast:
+        # NOTE: Not tracing the autocast region, since this isn't supported by all the
+        # versions of torch.
+        return actor
+    try:
+        with inference_mode():
+            traced_actor = torch.jit.trace(actor, example_x, check_trace=False)
+            if hasattr(torch.jit, "freeze"):
+                traced_actor = torch.jit.freeze(traced_actor)
+    except Exception as exc:
+        logger.warning(
+            RuntimeWarning(f"Unable to trace the actor, using it as-is: {exc}")
+        )
+        return actor
+    return traced_actor
+
+
+def inference_mode(mode: bool = True):
+    """ Returns `torch.inference_mode(mode)`, or `torch.no_grad()` when not available
+    (torch < 1.9).
+    """
+    if hasattr(torch, "inference_mode"):
+        return torch.inference_mode(mode)
+    return torch.no_grad() if mode else nullcontext()
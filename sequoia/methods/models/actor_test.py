@@ -0,0 +1,50 @@
+import pytest
+import torch
+from torch import nn
+
+from .actor import Actor, inference_mode, make_actor
+
+
+def encoder() -> nn.Module:
+    return nn.Sequential(
+        nn.Conv2d(3, 8, kernel_size=3),
+        nn.BatchNorm2d(8),
+        nn.ReLU(),
+        nn.AdaptiveAvgPool2d(1),
+        nn.Flatten(),
+    )
+
+
+@pytest.mark.parametrize("discrete", [True, False])
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_traced_actor_matches_eager(discrete: bool, channels_last: bool):
+    torch.manual_seed(123)
+    head = nn.Sequential(nn.Linear(8, 16), nn.Dropout(0.5), nn.Linear(16, 4))
+    actor = Actor(encoder(), head, discrete=discrete, channels_last=channels_last)
+    x = torch.rand(5, 3, 16, 16)
+    compiled_actor = make_actor(actor, example_x=x)
+    assert compiled_actor is not actor
+    assert not actor.training
+
+    # The compiled actor works with other batch sizes than the example.
+    for batch_size in [5, 1, 7]:
+        x = torch.rand(batch_size, 3, 16, 16)
+        with torch.no_grad():
+            expected = actor(x)
+        with inference_mode():
+            actions = compiled_actor(x)
+        assert actions.shape == expected.shape
+        if discrete:
+            assert actions.tolist() == expected.tolist()
+        else:
+            assert torch.allclose(actions, expected, atol=1e-6)
+
+
+def test_untraceable_actor_is_used_as_is():
+    class DictEncoder(nn.Module):
+        def forward(self, x):
+            # This can't be traced, since the output isn't a tensor (or a list of them).
+            return {"h": x.flatten(1)}
+
+    actor = Actor(DictEncoder(), nn.Identity())
+    assert make_actor(actor, example_x=torch.rand(2, 3)) is actor
@@ -79,6 +79,18 @@ class BaseHParams(HyperParameters):
     # allowed to affect the representations.
     detach_output_head: bool = False
 
+    # Run the encoder in bfloat16 (using autocast) when the model is on the CPU.
+    # The parameters, the output head and the losses stay in float32. Requires
+    # torch >= 1.10, and is ignored otherwise.
+    cpu_bf16_autocast: bool = False
+    # Use the channels_last memory format for the encoder and its (image) inputs,
+    # which can be faster for convolutional encoders.
+    channels_last: bool = False
+    # Use a frozen, traced 'actor' (the encoder and the dense layers of the current
+    # output head) to get the actions at test time, rather than the full forward pass.
+    # Only used with the classification and regression output heads.
+    compile_actor: bool = False
+
     def __post_init__(self):
         """Use this to initialize (or fix) any fields parsed from the
         command-line.
@@ -4,8 +4,10 @@ This is meant
 
 TODO: There is a bunch of work to be done here.
 """
+import warnings
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Any, Dict, Generic, Optional, Tuple, Type, TypeVar
+from typing import Any, ContextManager, Dict, Generic, Optional, Tuple, Type, TypeVar
 
 import gym
 import numpy as np
@@ -32,6 +34,7 @@ from sequoia.settings.base.setting import Actions, Observations, Rewards
 from sequoia.settings.sl import SLSetting
 from sequoia.utils.logging_utils import get_logger
 
+from ..actor import Actor
 from ..fcnet import FCNet
 from ..forward_pass import ForwardPass
 from ..output_heads import (ActorCriticHead, ClassificationHead, OutputHead,
@@ -101,6 +104,9 @@ class BaseModel(LightningModule, Generic[SettingType]):
             observation_type=self.Observations, reward_type=self.Rewards
         )
         self.config: Config = config
+        # Wether the observations are currently going through the main forward pass,
+        # rather than the encoder / output head being called by an auxiliary task.
+        self.in_main_forward_pass: bool = False
         # TODO: Decided to Not set this property, so the trainer doesn't
         # fallback to using it instead of the passed datamodules/dataloaders.
         # self.datamodule: LightningDataModule = setting
@@ -144,6 +150,22 @@ class BaseModel(LightningModule, Generic[SettingType]):
 
         logger.info(f"Moving encoder to device {self.config.device}")
         self.encoder = self.encoder.to(self.config.device)
+        if self.hp.channels_last:
+            self.encoder = self.encoder.to(memory_format=torch.channels_last)
+        if self.hp.cpu_bf16_autocast and not hasattr(torch, "autocast"):
+            warnings.warn(
+                RuntimeWarning(
+                    f"Ignoring `cpu_bf16_autocast`, since it requires torch >= 1.10 "
+                    f"(current version: {torch.__version__})."
+                )
+            )
+        # The encoder and its first parameter, used to get its device without going
+        # through all its parameters (see `encoder_device`). NOTE: This is a tuple so
+        # that they don't get registered as a submodule / parameter of the model.
+        self._encoder_first_parameter: Tuple[Optional[nn.Module], Optional[Tensor]] = (
+            None,
+            None,
+        )
 
         self.representation_space = add_tensor_support(self.representation_space)
 
@@ -169,16 +191,23 @@ class BaseModel(LightningModule, Generic[SettingType]):
         # Encode the observation to get representations.
         assert observations.x.device == self.device
 
-        representations = self.encode(observations)
-        # Pass the observations and representations to the output head to get
-        # the 'action' (prediction).
+        # NOTE: Lets the statistics of the main task (e.g. the online FIM estimate of
+        # EWC) ignore the other calls to the encoder, e.g. from the auxiliary tasks.
+        was_in_main_forward_pass = self.in_main_forward_pass
+        self.in_main_forward_pass = True
+        try:
+            representations = self.encode(observations)
+            # Pass the observations and representations to the output head to get
+            # the 'action' (prediction).
 
-        if self.hp.detach_output_head:
-            representations = representations.detach()
+            if self.hp.detach_output_head:
+                representations = representations.detach()
 
-        actions = self.output_head(
-            observations=observations, representations=representations
-        )
+            actions = self.output_head(
+                observations=observations, representations=representations
+            )
+        finally:
+            self.in_main_forward_pass = was_in_main_forward_pass
         forward_pass = ForwardPass(
             observations=observations, representations=representations, actions=actions,
         )
@@ -199,18 +228,18 @@ class BaseModel(LightningModule, Generic[SettingType]):
         # observations.
         x = torch.as_tensor(observations.x, device=self.device, dtype=self.dtype)
         assert x.device == self.device
-        encoder_parameters = list(self.encoder.parameters())
-        encoder_device = (
-            encoder_parameters[0].device if encoder_parameters else self.device
-        )
+        encoder_device = self.encoder_device
         # BUG: WHen using the EWCTask, there seems to be some issues related to which
         # device the model is stored on.
 
         if encoder_device != self.device:
             x = x.to(encoder_device)
             # self.encoder = self.encoder.to(self.device)
+        if self.hp.channels_last and x.dim() == 4:
+            x = x.contiguous(memory_format=torch.channels_last)
 
-        h_x = self.encoder(x)
+        with self.encoder_autocast(encoder_device):
+            h_x = self.encoder(x)
 
         if encoder_device != self.device:
             h_x = h_x.to(self.device)
@@ -220,8 +249,40 @@ class BaseModel(LightningModule, Generic[SettingType]):
             h_x = h_x[0]
         if not isinstance(h_x, Tensor):
             h_x = torch.as_tensor(h_x, device=self.device, dtype=self.dtype)
+        elif h_x.dtype != self.dtype:
+            # The representations are in bfloat16 when using autocast.
+            h_x = h_x.to(self.dtype)
         return h_x
 
+    @property
+    def encoder_device(self) -> torch.device:
+        """ Device of the encoder's parameters (the model's device if it has none).
+
+        The first parameter of the encoder is cached, so this doesn't need to go
+        through all the parameters of the encoder at each step.
+        """
+        encoder, parameter = self._encoder_first_parameter
+        if encoder is not self.encoder:
+            parameter = next(iter(self.encoder.parameters()), None)
+            self._encoder_first_parameter = (self.encoder, parameter)
+        if parameter is None:
+            return self.device
+        return parameter.device
+
+    def encoder_autocast(self, device: torch.device) -> ContextManager:
+        """ Returns the autocast context in which to run the encoder.
+
+        When `cpu_bf16_autocast` is set and the encoder is on the CPU, the encoder
+        is run in bfloat16. Otherwise, this doesn't do anything.
+        """
+        if (
+            self.hp.cpu_bf16_autocast
+            and device.type == "cpu"
+            and hasattr(torch, "autocast")
+        ):
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return nullcontext()
+
     def create_output_head(self, task_id: Optional[int]) -> OutputHead:
         """Create an output head for the current action and reward spaces.
 
@@ -474,6 +535,42 @@ class BaseModel(LightningModule, Generic[SettingType]):
             forward_pass, actions=actions, rewards=rewards,
         )
 
+    def get_actor_output_head(self, observations: Observations) -> Optional[OutputHead]:
+        """ Returns the output head of the actor to use for these observations.
+
+        Returns None if an `Actor` can't be used to get the actions for these
+        observations, in which case the forward pass should be used instead.
+        """
+        if not self._supports_actor(self.output_head):
+            return None
+        if not self._are_batched(observations):
+            return None
+        return self.output_head
+
+    def create_actor(self, output_head: OutputHead) -> Actor:
+        """ Creates an `Actor` with the encoder and the dense layers of `output_head`.
+        """
+        assert self._supports_actor(output_head), output_head
+        bf16_autocast = (
+            self.hp.cpu_bf16_autocast
+            and self.encoder_device.type == "cpu"
+            and hasattr(torch, "autocast")
+        )
+        return Actor(
+            encoder=self.encoder,
+            head=output_head.dense,
+            discrete=isinstance(output_head, ClassificationHead),
+            channels_last=self.hp.channels_last,
+            bf16_autocast=bf16_autocast,
+            dtype=self.dtype,
+        )
+
+    @staticmethod
+    def _supports_actor(output_head: OutputHead) -> bool:
+        # NOTE: Not using `isinstance`, since the subclasses of these heads (e.g. the
+        # PolicyHead) do more than just apply their dense layers in `forward`.
+        return type(output_head) in (ClassificationHead, RegressionHead)
+
     def preprocess_observations(self, observations: Observations) -> Observations:
         assert isinstance(observations, self.Observations)
         # TODO: Make sure this also works in the supervised setting.
@@ -16,6 +16,7 @@ from torchvision import models as tv_models
 from sequoia.settings import Setting, Environment
 from sequoia.common.config import Config
 from sequoia.common.loss import Loss
+from sequoia.common.metrics import lazy_metrics
 from sequoia.methods.aux_tasks.auxiliary_task import AuxiliaryTask
 from sequoia.methods.models.output_heads import OutputHead, PolicyHead
 from sequoia.utils.logging_utils import get_logger
@@ -274,18 +275,24 @@ class BaselineModel(
         dataloader_idx: int = None,
         optimizer_idx: int = None,
     ) -> Dict:
-        results = super().shared_step(
-            batch,
-            batch_idx,
-            environment,
-            loss_name,
-            dataloader_idx=dataloader_idx,
-            optimizer_idx=optimizer_idx,
-        )
+        # NOTE: When using lazy metrics, the metrics are only created if they are
+        # logged below.
+        with lazy_metrics(self.config.lazy_metrics):
+            results = super().shared_step(
+                batch,
+                batch_idx,
+                environment,
+                loss_name,
+                dataloader_idx=dataloader_idx,
+                optimizer_idx=optimizer_idx,
+            )
         loss_tensor = results["loss"]
         loss = results["loss_object"]
 
-        if loss_tensor != 0.0:
+        log_losses = (
+            loss_name != "train" or batch_idx % self.config.log_losses_every == 0
+        )
+        if log_losses and loss_tensor != 0.0:
             for key, value in loss.to_pbar_message().items():
                 assert not isinstance(
                     value, (dict, str)
@@ -315,36 +315,25 @@ class MultiHeadModel(BaseModel[SettingType]):
         strict: bool = True,
     ):
         if self.hp.multihead:
-            # TODO: Figure out exactly where/when/how pytorch-lightning is
-            # trying to load the model from, because there are some keys
-            # missing (['output_heads.1.output.weight', 'output_heads.1.output.bias'])
-            # For now, we're just gonna pretend it's not a problem, I guess?
-            strict = False
+            # Create the output heads of the tasks in the state dict that this model
+            # doesn't have yet (e.g. when resuming a run after a few tasks), so that
+            # their weights can be loaded like the others.
+            task_ids = {
+                key.split(".")[1]
+                for key in state_dict
+                if key.startswith("output_heads.")
+            }
+            for task_id in sorted(task_ids):
+                task_id = None if task_id == "None" else int(task_id)
+                self.get_or_create_output_head(task_id)
 
         missing_keys, unexpected_keys = super().load_state_dict(
-            state_dict=state_dict, strict=False
+            state_dict=state_dict, strict=strict
         )
-
-        # TODO: Double-check that this makes sense and works properly.
-        if self.hp.multihead and unexpected_keys:
-            for i in range(self.setting.nb_tasks):
-                # Try to load the output head weights
-                logger.info(f"Creating a new output head for task {i}")
-                new_output_head = self.create_output_head(self.setting, task_id=i)
-                # FIXME: TODO: This is wrong. We should create all the
-                # output heads if they aren't already created, and then try to
-                # load the state_dict again.
-                new_output_head.load_state_dict(
-                    {k: state_dict[k] for k in unexpected_keys}, strict=False,
-                )
-                key = str(i)
-                self.output_heads[key] = new_output_head.to(self.device)
-
         if missing_keys or unexpected_keys:
             logger.debug(
                 f"Missing keys: {missing_keys}, unexpected keys: {unexpected_keys}"
             )
-
         return missing_keys, unexpected_keys
 
     def get_or_create_output_head(self, task_id: int) -> nn.Module:
@@ -427,6 +416,30 @@ class MultiHeadModel(BaseModel[SettingType]):
 
         return super().forward(observations)
 
+    def get_actor_output_head(self, observations: Observations) -> Optional[OutputHead]:
+        """ Returns the output head of the actor to use for these observations.
+
+        When using multiple heads, the actor can only be used if the task labels are
+        available, and if all the observations come from the same (known) task.
+        """
+        if not self.hp.multihead:
+            return super().get_actor_output_head(observations)
+        task_labels = observations.task_labels
+        if task_labels is None or not self._are_batched(observations):
+            return None
+        if isinstance(task_labels, np.ndarray) and task_labels.dtype == object:
+            return None
+        task_ids = torch.unique(torch.as_tensor(task_labels))
+        if len(task_ids) != 1:
+            return None
+        task_id = str(task_ids.item())
+        if task_id not in self.output_heads:
+            return None
+        output_head = self.output_heads[task_id]
+        if not self._supports_actor(output_head):
+            return None
+        return output_head
+
     def setup_for_task(self, task_id: int) -> None:
         if task_id is not None and self.hp.multihead:
             # Setup the model for this task. For now we just switch the output head.
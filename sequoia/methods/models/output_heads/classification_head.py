@@ -9,6 +9,7 @@ from simple_parsing import list_field
 
 from sequoia.common.hparams import uniform, categorical
 from sequoia.common import Batch, ClassificationMetrics, Loss
+from sequoia.common.metrics import make_metrics
 from sequoia.settings import Observations, Actions, Rewards
 
 from .output_head import OutputHead
@@ -142,7 +143,7 @@ class ClassificationHead(OutputHead):
         loss = self.loss_fn(logits, y)
         
         assert loss.shape == ()
-        metrics = ClassificationMetrics(y_pred=logits, y=y)
+        metrics = make_metrics(ClassificationMetrics, y_pred=logits, y=y)
         
         assert self.name, "Output Heads should have a name!"
         loss_object = Loss(
@@ -7,6 +7,7 @@ from gym import spaces
 from torch import Tensor, nn
 
 from sequoia.common import Batch, Loss, RegressionMetrics
+from sequoia.common.metrics import make_metrics
 from sequoia.settings import Actions, Observations, Rewards
 from sequoia.utils import prod
 
@@ -71,7 +72,7 @@ class RegressionHead(OutputHead):
         y: Tensor = rewards.y
 
         loss = self.loss_fn(y_pred, y)
-        metrics = RegressionMetrics(y_pred=y_pred, y=y)
+        metrics = make_metrics(RegressionMetrics, y_pred=y_pred, y=y)
 
         assert self.name, "Output Heads should have a name!"
         loss = Loss(
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Any, Dict, Mapping, Optional, Union
+from typing import Any, Dict, List, Mapping, Optional, Union
 
 import gym
 import numpy as np
@@ -15,6 +15,7 @@ from sequoia.settings.base import Environment
 from sequoia.common import Config
 from sequoia.common.hparams import HyperParameters, categorical, log_uniform, uniform
 from sequoia.common.spaces import Image
+from sequoia.common.spaces.validation import should_validate
 from sequoia.common.transforms.utils import is_image
 from sequoia.methods import register_method
 from sequoia.settings import (
@@ -74,6 +75,8 @@ class PnnMethod(Method, target_setting=IncrementalAssumption):
         # We will create those when `configure` will be called, before training.
         self.config: Optional[Config] = None
         self.task_id: Optional[int] = 0
+        # Id of the task being trained on (the only one with a trainable column).
+        self.training_task_id: Optional[int] = None
         self.hparams: Optional[PnnMethod.HParams] = hparams
         self.model: Union[PnnA2CAgent, PnnClassifier]
         self.optimizer: torch.optim.Optimizer
@@ -161,6 +164,7 @@ class PnnMethod(Method, target_setting=IncrementalAssumption):
         # self.model.current_task = task_id
         if self.training:
             self.model.freeze_columns([task_id])
+            self.training_task_id = task_id
 
         if task_id not in self.added_tasks:
             if isinstance(self.model, PnnA2CAgent):
@@ -176,6 +180,18 @@ class PnnMethod(Method, target_setting=IncrementalAssumption):
 
         self.task_id = task_id
 
+    def get_unchanged_test_tasks(self, setting: Setting) -> List[int]:
+        """ Returns the tasks whose predictions haven't changed since the last test loop.
+
+        When the task labels are available at test time, the predictions for a task
+        only depend on the column of that task and on the columns of the previous
+        tasks. These columns are frozen once training moves on to a following task, so
+        the predictions for all the tasks before the current one can't change.
+        """
+        if not setting.task_labels_at_test_time or self.training_task_id is None:
+            return []
+        return list(range(self.training_task_id))
+
     def set_optimizer(self):
         self.optimizer = torch.optim.Adam(
             self.model.parameters(self.task_id), lr=self.hparams.learning_rate,
@@ -199,7 +215,8 @@ class PnnMethod(Method, target_setting=IncrementalAssumption):
                 y_pred = logits.argmax(dim=-1).cpu().numpy()
                 action = y_pred
 
-        assert action in action_space, (action, action_space)
+        if should_validate("get_actions"):
+            assert action in action_space, (action, action_space)
         return action
 
     def fit(self, train_env: Environment, valid_env: Environment):
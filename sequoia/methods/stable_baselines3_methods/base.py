@@ -30,6 +30,7 @@ from sequoia.common.gym_wrappers.batch_env.batched_vector_env import VectorEnv
 from sequoia.common.gym_wrappers.utils import has_wrapper
 from simple_parsing.helpers.hparams import HyperParameters, log_uniform, categorical
 from sequoia.common.spaces import Image
+from sequoia.common.spaces.validation import should_validate
 from sequoia.common.transforms.utils import is_image
 from sequoia.settings import Method, Setting
 from sequoia.settings.rl.continual import ContinualRLSetting
@@ -305,7 +306,8 @@ class StableBaselines3Method(Method, ABC, target_setting=ContinualRLSetting):
         obs = observations.x
         predictions = self.model.predict(obs)
         action, _ = predictions
-        assert action in action_space, (observations, action, action_space)
+        if should_validate("get_actions"):
+            assert action in action_space, (observations, action, action_space)
         return action
 
     def get_search_space(self, setting: Setting) -> Mapping[str, Union[str, Dict]]:
@@ -7,6 +7,7 @@ from typing import Callable, ClassVar, Optional, Type, Union
 import gym
 from gym import spaces
 from sequoia.common.hparams import categorical
+from sequoia.common.spaces.validation import should_validate
 from sequoia.common.transforms import ChannelsFirst
 from sequoia.methods import register_method
 from sequoia.settings.rl import ContinualRLSetting
@@ -106,7 +107,7 @@ class DQNMethod(OffPolicyMethod):
                 )
 
     def create_model(self, train_env: gym.Env, valid_env: gym.Env) -> DQNModel:
-        return self.Model(env=train_env, **self.hparams.to_dict())
+        return super().create_model(train_env=train_env, valid_env=valid_env)
 
     def fit(self, train_env: gym.Env, valid_env: gym.Env):
         super().fit(train_env=train_env, valid_env=valid_env)
@@ -120,7 +121,8 @@ class DQNMethod(OffPolicyMethod):
             obs = ChannelsFirst.apply(obs)
         predictions = self.model.predict(obs)
         action, _ = predictions
-        assert action in action_space, (observations, action, action_space)
+        if should_validate("get_actions"):
+            assert action in action_space, (observations, action, action_space)
         return action
 
     def on_task_switch(self, task_id: Optional[int]) -> None:
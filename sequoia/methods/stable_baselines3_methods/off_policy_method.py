@@ -18,6 +18,7 @@ from sequoia.settings.rl import ContinualRLSetting
 from sequoia.utils.logging_utils import get_logger
 
 from .base import SB3BaseHParams, StableBaselines3Method
+from .replay_buffer import TaskQuotaReplayBuffer
 
 logger = get_logger(__file__)
 
@@ -95,10 +96,17 @@ class OffPolicyMethod(StableBaselines3Method, ABC):
     hparams: OffPolicyModel.HParams = mutable_field(OffPolicyModel.HParams)
     # Approximate limit on the size of the replay buffer, in megabytes.
     max_buffer_size_megabytes: float = 2_048.0
+    # Wether to replace the replay buffer of the model with a `TaskQuotaReplayBuffer`,
+    # which stores each observation only once, and splits its capacity evenly between
+    # the tasks seen so far, so that earlier tasks can still be rehearsed. (Only
+    # useful when `clear_buffers_between_tasks` is False).
+    task_quota_replay: bool = False
 
     def __post_init__(self):
         super().__post_init__()
         self.model: OffPolicyAlgorithm
+        # Index of the current task, if known.
+        self._task_id: Optional[int] = None
 
     def configure(self, setting: ContinualRLSetting):
         super().configure(setting)
@@ -222,7 +230,22 @@ class OffPolicyMethod(StableBaselines3Method, ABC):
             )
 
     def create_model(self, train_env: gym.Env, valid_env: gym.Env) -> OffPolicyModel:
-        return self.Model(env=train_env, **self.hparams.to_dict())
+        model = self.Model(env=train_env, **self.hparams.to_dict())
+        if self.task_quota_replay:
+            # NOTE: Use the spaces of the model rather than those of the env, since
+            # the model might have wrapped the env (e.g. in a `VecTransposeImage`).
+            model.replay_buffer = TaskQuotaReplayBuffer(
+                model.buffer_size,
+                model.observation_space,
+                model.action_space,
+                device=model.device,
+                n_envs=model.n_envs,
+                # e.g. `handle_timeout_termination` (SB3 >= 1.1).
+                **(getattr(model, "replay_buffer_kwargs", None) or {}),
+            )
+            if self._task_id is not None:
+                model.replay_buffer.on_task_switch(self._task_id)
+        return model
 
     def fit(self, train_env: gym.Env, valid_env: gym.Env):
         super().fit(train_env=train_env, valid_env=valid_env)
@@ -244,6 +267,14 @@ class OffPolicyMethod(StableBaselines3Method, ABC):
         todo: use this to customize how your method handles task transitions.
         """
         super().on_task_switch(task_id=task_id)
+        if not self.training:
+            # NOTE: The replay buffer only keeps track of the tasks trained on, so that
+            # the tasks seen at test time don't get a quota.
+            return
+        if task_id is not None:
+            self._task_id = task_id
+        if self.model and isinstance(self.model.replay_buffer, TaskQuotaReplayBuffer):
+            self.model.replay_buffer.on_task_switch(task_id)
 
     def clear_buffers(self):
         """ Clears out the experience buffer of the Policy. """
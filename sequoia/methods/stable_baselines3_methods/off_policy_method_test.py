@@ -7,6 +7,7 @@ from sequoia.settings.rl import DiscreteTaskAgnosticRLSetting
 from .base import BaseAlgorithm, StableBaselines3Method
 from .base_test import DiscreteActionSpaceMethodTests
 from .off_policy_method import OffPolicyAlgorithm, OffPolicyMethod
+from .replay_buffer import TaskQuotaReplayBuffer
 
 
 class OffPolicyMethodTests:
@@ -15,3 +16,33 @@ class OffPolicyMethodTests:
     debug_dataset: ClassVar[str]
     debug_kwargs: ClassVar[Dict] = {}
 
+    def test_task_quota_replay_keeps_previous_task(self, config: Config):
+        setting = DiscreteTaskAgnosticRLSetting(
+            dataset=self.debug_dataset,
+            nb_tasks=2,
+            steps_per_task=1_000,
+            test_steps_per_task=1_000,
+            config=config,
+        )
+        setting.setup()
+        method = self.Method(task_quota_replay=True, **self.debug_kwargs)
+        method.configure(setting)
+        method.fit(
+            train_env=setting.train_dataloader(), valid_env=setting.val_dataloader(),
+        )
+        replay_buffer = method.model.replay_buffer
+        assert isinstance(replay_buffer, TaskQuotaReplayBuffer)
+        n_transitions = replay_buffer.size()
+        assert n_transitions > 0
+
+        method.on_task_switch(task_id=1)
+        assert replay_buffer.current_task == 1
+        assert replay_buffer.slots_per_task() == {0: n_transitions, 1: 0}
+
+        # The task switches during testing don't change the tasks of the buffer.
+        method.set_testing()
+        method.on_task_switch(task_id=0)
+        method.on_task_switch(task_id=None)
+        method.set_training()
+        assert replay_buffer.current_task == 1
+        assert replay_buffer.slots_per_task() == {0: n_transitions, 1: 0}
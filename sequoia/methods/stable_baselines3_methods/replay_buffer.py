@@ -0,0 +1,304 @@
+""" Compact, task-aware replay buffer for the off-policy algorithms from SB3.
+
+The default `ReplayBuffer` from stable-baselines3 stores both the observation and
+the next observation of every transition, which doubles the memory used by image
+observations, and it can only be either kept as-is or cleared between tasks.
+
+The `TaskQuotaReplayBuffer` defined here instead:
+- Stores the observations in a shared pool of "frames", using the dtype of the
+  observation space (e.g. `np.uint8` for Atari / MonsterKong images). Consecutive
+  transitions from the same environment share the frame between the next
+  observation of one and the observation of the other, so each frame is only stored
+  once;
+- Splits its capacity evenly between all the tasks seen so far. Each task keeps a
+  uniform sample of its transitions (reservoir sampling), so that earlier tasks can
+  be rehearsed at a fixed memory budget.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import torch
+from gym import spaces
+from stable_baselines3.common.buffers import BaseBuffer, ReplayBuffer
+from stable_baselines3.common.type_aliases import ReplayBufferSamples
+from stable_baselines3.common.vec_env import VecNormalize
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+
+
+class TaskQuotaReplayBuffer(ReplayBuffer):
+    """ Replay buffer with deduplicated observation frames and per-task quotas.
+
+    Can be used as a drop-in replacement for the `replay_buffer` attribute of an
+    `OffPolicyAlgorithm` from SB3. `on_task_switch` should be called whenever the
+    task changes, so that the following transitions are attributed to the new task.
+
+    Parameters
+    ----------
+    buffer_size : int
+        Maximum number of transitions stored in the buffer, across all tasks.
+    observation_space : spaces.Space
+        Observation space.
+    action_space : spaces.Space
+        Action space.
+    device : Union[torch.device, str], optional
+        Device on which the sampled tensors are created, by default "cpu".
+    n_envs : int, optional
+        Number of parallel environments, by default 1.
+    handle_timeout_termination : bool, optional
+        Wether to not treat the transitions where the episode was truncated by a time
+        limit (`info["TimeLimit.truncated"]`) as terminal when sampling, like the
+        `ReplayBuffer` of SB3 (>= 1.1). By default True.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Space,
+        action_space: spaces.Space,
+        device: Union[torch.device, str] = "cpu",
+        n_envs: int = 1,
+        optimize_memory_usage: bool = False,
+        handle_timeout_termination: bool = True,
+    ):
+        # NOTE: Don't call `ReplayBuffer.__init__`, since it would allocate the
+        # (duplicated) observation arrays that we're trying to avoid.
+        BaseBuffer.__init__(
+            self,
+            buffer_size,
+            observation_space,
+            action_space,
+            device=device,
+            n_envs=n_envs,
+        )
+        # NOTE: Frames are always deduplicated, this is only kept for compatibility.
+        self.optimize_memory_usage = False
+        self.handle_timeout_termination = handle_timeout_termination
+        # Each transition uses at most two frames, plus one 'pending' frame per env
+        # (the last next observation, which might be the next transition's
+        # observation). `np.zeros` only commits memory for the frames that actually
+        # get written to, so in practice the memory used is proportional to the
+        # number of distinct frames currently in the buffer.
+        self.frame_capacity = 2 * self.buffer_size + self.n_envs
+        self.frames = np.zeros(
+            (self.frame_capacity,) + self.obs_shape, dtype=observation_space.dtype
+        )
+        self.frame_refs = np.zeros(self.frame_capacity, dtype=np.int64)
+
+        self.obs_frame = np.zeros(self.buffer_size, dtype=np.int64)
+        self.next_obs_frame = np.zeros(self.buffer_size, dtype=np.int64)
+        self.actions = np.zeros(
+            (self.buffer_size, self.action_dim), dtype=action_space.dtype
+        )
+        self.rewards = np.zeros(self.buffer_size, dtype=np.float32)
+        self.dones = np.zeros(self.buffer_size, dtype=np.float32)
+        self.timeouts = np.zeros(self.buffer_size, dtype=np.float32)
+        self.task_ids = np.full(self.buffer_size, -1, dtype=np.int64)
+
+        self.current_task: int = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """ Removes all the transitions (from all tasks) from the buffer. """
+        super().reset()
+        self.frame_refs[:] = 0
+        self.task_ids[:] = -1
+        # Stacks of free indices. Popping from the end gives the lowest index first,
+        # which keeps the occupied slots contiguous, i.e. `range(self.pos)`.
+        self._free_frames: List[int] = list(reversed(range(self.frame_capacity)))
+        self._free_slots: List[int] = list(reversed(range(self.buffer_size)))
+        # Slots currently occupied by each task.
+        self._task_slots: Dict[int, List[int]] = defaultdict(list)
+        # Number of transitions from each task that were passed to `add`.
+        self._task_seen: Dict[int, int] = defaultdict(int)
+        # Index of the last next observation of each env, if it can be reused.
+        self._last_frames: List[Optional[int]] = [None] * self.n_envs
+        # Make sure the current task always has an entry (and therefore a quota).
+        self._task_slots[self.current_task]
+
+    def on_task_switch(self, task_id: Optional[int]) -> None:
+        """ Attributes the transitions added from now on to the task `task_id`.
+
+        When `task_id` is None (e.g. when task labels aren't available), the new task
+        is unknown, and the transitions keep being attributed to the current task.
+        """
+        if task_id is not None and task_id != self.current_task:
+            logger.debug(
+                f"Switching replay buffer from task {self.current_task} to {task_id} "
+                f"(slots per task: {self.slots_per_task()})"
+            )
+            self.current_task = task_id
+            self._task_slots[task_id]
+        # The observations from the new task can't be the continuation of the old.
+        for env_index in range(self.n_envs):
+            self._set_last_frame(env_index, None)
+
+    @property
+    def quota(self) -> int:
+        """ Maximum number of transitions that each task can keep in the buffer. """
+        return self.buffer_size // len(self._task_slots)
+
+    def slots_per_task(self) -> Dict[int, int]:
+        """ Returns the number of transitions currently stored for each task. """
+        return {task: len(slots) for task, slots in self._task_slots.items()}
+
+    @property
+    def nbytes(self) -> int:
+        """ Number of bytes used by the frames currently stored in the buffer. """
+        n_frames = self.frame_capacity - len(self._free_frames)
+        return n_frames * self.frames[0].nbytes
+
+    def add(
+        self,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: List[Dict[str, Any]] = None,
+    ) -> None:
+        obs = np.asarray(obs).reshape((self.n_envs,) + self.obs_shape)
+        next_obs = np.asarray(next_obs).reshape((self.n_envs,) + self.obs_shape)
+        action = np.asarray(action).reshape((self.n_envs, self.action_dim))
+        reward = np.asarray(reward).reshape(self.n_envs)
+        done = np.asarray(done).reshape(self.n_envs)
+        timeout = np.zeros(self.n_envs, dtype=bool)
+        if self.handle_timeout_termination and infos is not None:
+            timeout[:] = [info.get("TimeLimit.truncated", False) for info in infos]
+
+        for env_index in range(self.n_envs):
+            self._add_one(
+                env_index,
+                obs[env_index],
+                next_obs[env_index],
+                action[env_index],
+                reward[env_index],
+                done[env_index],
+                timeout[env_index],
+            )
+        n_filled = self.buffer_size - len(self._free_slots)
+        self.pos = n_filled % self.buffer_size
+        self.full = n_filled == self.buffer_size
+
+    def size(self) -> int:
+        return self.buffer_size - len(self._free_slots)
+
+    def sample(
+        self, batch_size: int, env: Optional[VecNormalize] = None
+    ) -> ReplayBufferSamples:
+        # NOTE: The occupied slots are always `range(self.size())`.
+        batch_inds = np.random.randint(0, self.size(), size=batch_size)
+        return self._get_samples(batch_inds, env=env)
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, env: Optional[VecNormalize] = None
+    ) -> ReplayBufferSamples:
+        data = (
+            self._normalize_obs(self.frames[self.obs_frame[batch_inds]], env),
+            self.actions[batch_inds],
+            self._normalize_obs(self.frames[self.next_obs_frame[batch_inds]], env),
+            # Only use the dones that aren't due to timeouts.
+            (self.dones[batch_inds] * (1 - self.timeouts[batch_inds])).reshape(-1, 1),
+            self._normalize_reward(self.rewards[batch_inds].reshape(-1, 1), env),
+        )
+        return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
+
+    def _add_one(
+        self,
+        env_index: int,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: float,
+        done: bool,
+        timeout: bool = False,
+    ) -> None:
+        task = self.current_task
+        self._task_seen[task] += 1
+        slot = self._claim_slot(task)
+        if slot is None:
+            # Rejected by the reservoir sampling: The transition isn't stored.
+            self._set_last_frame(env_index, None)
+            return
+
+        last_frame = self._last_frames[env_index]
+        if last_frame is not None and np.array_equal(self.frames[last_frame], obs):
+            obs_frame = last_frame
+        else:
+            obs_frame = self._new_frame(obs)
+        next_obs_frame = self._new_frame(next_obs)
+
+        self.obs_frame[slot] = obs_frame
+        self.next_obs_frame[slot] = next_obs_frame
+        self.frame_refs[obs_frame] += 1
+        self.frame_refs[next_obs_frame] += 1
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.dones[slot] = done
+        self.timeouts[slot] = timeout
+        self.task_ids[slot] = task
+
+        self._set_last_frame(env_index, None if done else next_obs_frame)
+
+    def _claim_slot(self, task: int) -> Optional[int]:
+        """ Returns the slot where the next transition of `task` should be stored.
+
+        Returns None if the transition should be dropped.
+        """
+        slots = self._task_slots[task]
+        quota = self.quota
+        if len(slots) < quota:
+            if not self._free_slots:
+                self._evict_from_largest_task(excluding=task)
+            slot = self._free_slots.pop()
+            slots.append(slot)
+            return slot
+        # Reservoir sampling: keep the n-th transition with probability quota / n.
+        index = np.random.randint(self._task_seen[task])
+        if index >= len(slots):
+            return None
+        slot = slots[index]
+        self._release_slot(slot)
+        return slot
+
+    def _evict_from_largest_task(self, excluding: int) -> None:
+        """ Removes a random transition from the task using the most slots. """
+        task = max(
+            (t for t in self._task_slots if t != excluding),
+            key=lambda t: len(self._task_slots[t]),
+        )
+        slots = self._task_slots[task]
+        # Removing a random element from a uniform sample keeps it uniform.
+        index = np.random.randint(len(slots))
+        slots[index], slots[-1] = slots[-1], slots[index]
+        slot = slots.pop()
+        self._release_slot(slot)
+        self.task_ids[slot] = -1
+        self._free_slots.append(slot)
+
+    def _release_slot(self, slot: int) -> None:
+        for frame in (self.obs_frame[slot], self.next_obs_frame[slot]):
+            self._decref(frame)
+
+    def _new_frame(self, value: np.ndarray) -> int:
+        frame = self._free_frames.pop()
+        self.frames[frame] = value
+        return frame
+
+    def _decref(self, frame: int) -> None:
+        self.frame_refs[frame] -= 1
+        if self.frame_refs[frame] == 0:
+            self._free_frames.append(int(frame))
+
+    def _set_last_frame(self, env_index: int, frame: Optional[int]) -> None:
+        # The pending frame of each env holds a reference, so it can't be freed
+        # before the next transition of that env gets added.
+        if frame is not None:
+            self.frame_refs[frame] += 1
+        previous = self._last_frames[env_index]
+        if previous is not None:
+            self._decref(previous)
+        self._last_frames[env_index] = frame
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from gym import spaces
+
+from .replay_buffer import TaskQuotaReplayBuffer
+
+
+def make_buffer(buffer_size: int, n_envs: int = 1) -> TaskQuotaReplayBuffer:
+    observation_space = spaces.Box(0, 255, shape=(4, 4), dtype=np.uint8)
+    action_space = spaces.Discrete(3)
+    return TaskQuotaReplayBuffer(
+        buffer_size, observation_space, action_space, n_envs=n_envs
+    )
+
+
+def add_episode(buffer: TaskQuotaReplayBuffer, start: int, length: int) -> None:
+    """ Adds `length` consecutive transitions, where the observation at step `i` is
+    an image filled with the value `start + i` (modulo 256).
+    """
+    n_envs = buffer.n_envs
+    for i in range(length):
+        obs = np.full((n_envs, 4, 4), (start + i) % 256, dtype=np.uint8)
+        next_obs = np.full((n_envs, 4, 4), (start + i + 1) % 256, dtype=np.uint8)
+        done = np.array([i == length - 1] * n_envs)
+        buffer.add(obs, next_obs, np.zeros(n_envs), np.ones(n_envs), done)
+
+
+def test_consecutive_frames_are_deduplicated():
+    buffer = make_buffer(100)
+    add_episode(buffer, start=0, length=10)
+    assert buffer.size() == 10
+    # 11 distinct frames, rather than 20 for a regular replay buffer.
+    assert buffer.nbytes == 11 * 16
+
+    samples = buffer.sample(32)
+    obs = samples.observations.numpy()
+    next_obs = samples.next_observations.numpy()
+    assert obs.dtype == np.uint8
+    np.testing.assert_array_equal(next_obs, obs + 1)
+
+
+def test_frames_stored_with_space_dtype():
+    buffer = make_buffer(10)
+    assert buffer.frames.dtype == np.uint8
+
+
+@pytest.mark.parametrize("n_envs", [1, 2])
+def test_tasks_keep_an_equal_share(n_envs: int):
+    buffer_size = 100
+    buffer = make_buffer(buffer_size, n_envs=n_envs)
+    add_episode(buffer, start=0, length=1000)
+    assert buffer.slots_per_task() == {0: buffer_size}
+
+    buffer.on_task_switch(1)
+    add_episode(buffer, start=0, length=1000)
+    assert buffer.slots_per_task() == {0: buffer_size // 2, 1: buffer_size // 2}
+
+    buffer.on_task_switch(2)
+    add_episode(buffer, start=0, length=1000)
+    slots_per_task = buffer.slots_per_task()
+    assert slots_per_task[2] == buffer_size // 3
+    assert sorted(slots_per_task.values()) == [33, 33, 34]
+    assert buffer.size() == buffer_size
+    assert set(np.unique(buffer.task_ids)) == {0, 1, 2}
+
+
+def test_unknown_task_keeps_the_current_task():
+    buffer_size = 100
+    buffer = make_buffer(buffer_size)
+    add_episode(buffer, start=0, length=1000)
+    buffer.on_task_switch(1)
+    add_episode(buffer, start=0, length=1000)
+    for _ in range(3):
+        buffer.on_task_switch(None)
+        add_episode(buffer, start=0, length=1000)
+    assert buffer.current_task == 1
+    # The quotas are still split between the two tasks.
+    assert buffer.slots_per_task() == {0: buffer_size // 2, 1: buffer_size // 2}
+
+
+def test_old_task_keeps_uniform_sample():
+    """ The transitions kept for a task should come from all over that task, not just
+    the most recent ones.
+    """
+    np.random.seed(123)
+    buffer = make_buffer(100)
+    add_episode(buffer, start=0, length=200)
+    kept = buffer.frames[buffer.obs_frame[: buffer.size()], 0, 0]
+    assert kept.min() < 50
+    assert kept.max() >= 150
+
+
+def test_frames_are_released():
+    buffer = make_buffer(50)
+    for task in range(3):
+        buffer.on_task_switch(task)
+        for _ in range(10):
+            add_episode(buffer, start=0, length=20)
+    assert buffer.size() == 50
+    used_frames = buffer.frame_capacity - len(buffer._free_frames)
+    assert used_frames <= 2 * buffer.size() + buffer.n_envs
+    assert used_frames == np.count_nonzero(buffer.frame_refs)
+
+    buffer.reset()
+    assert buffer.size() == 0
+    assert buffer.nbytes == 0
+
+
+@pytest.mark.parametrize("handle_timeout_termination", [True, False])
+def test_timeouts_are_not_terminal(handle_timeout_termination: bool):
+    observation_space = spaces.Box(0, 255, shape=(4, 4), dtype=np.uint8)
+    buffer = TaskQuotaReplayBuffer(
+        10,
+        observation_space,
+        spaces.Discrete(3),
+        handle_timeout_termination=handle_timeout_termination,
+    )
+    obs = np.zeros((1, 4, 4), dtype=np.uint8)
+    # An episode truncated by a time limit, followed by a terminated one.
+    truncated = [{"TimeLimit.truncated": True}]
+    buffer.add(obs, obs + 1, np.zeros(1), np.ones(1), np.ones(1), infos=truncated)
+    buffer.add(obs + 2, obs + 3, np.zeros(1), np.ones(1), np.ones(1), infos=[{}])
+
+    samples = buffer._get_samples(np.array([0, 1]))
+    dones = samples.dones.numpy().ravel().tolist()
+    assert dones == ([0.0, 1.0] if handle_timeout_termination else [1.0, 1.0])
@@ -56,7 +56,7 @@ class TD3Method(OffPolicyMethod):
         super().configure(setting)
 
     def create_model(self, train_env: gym.Env, valid_env: gym.Env) -> TD3Model:
-        return self.Model(env=train_env, **self.hparams.to_dict())
+        return super().create_model(train_env=train_env, valid_env=valid_env)
 
     def fit(self, train_env: gym.Env, valid_env: gym.Env):
         super().fit(train_env=train_env, valid_env=valid_env)
@@ -21,6 +21,7 @@ from sequoia.settings.base import Actions, Method, Setting
 from sequoia.settings.base.results import Results
 from sequoia.utils import add_prefix, get_logger
 from sequoia.utils.utils import flag
+from sequoia.utils.wandb_log_queue import wandb_log_queue
 from wandb.wandb_run import Run
 from .base import AssumptionBase
 from .iid_results import TaskResults
@@ -298,6 +299,9 @@ class ContinualAssumption(AssumptionBase):
         run.summary["setting"] = self.get_name()
         run.summary["method"] = method.get_name()
         assert wandb.run is run
+        # Configure the queue used to log the online performance metrics.
+        wandb_log_queue.window_steps = self.wandb.log_window_steps
+        wandb_log_queue.window_seconds = self.wandb.log_window_seconds
         return run
 
     def log_results(self, method: Method, results: Results, prefix: str = "") -> None:
@@ -313,6 +317,8 @@ class ContinualAssumption(AssumptionBase):
         logger.info(results.summary())
 
         if wandb.run:
+            # Log the metrics that might still be in the queue before the results.
+            wandb_log_queue.flush()
             wandb.summary["method"] = method.get_name()
             wandb.summary["setting"] = self.get_name()
             dataset = getattr(self, "dataset", "")
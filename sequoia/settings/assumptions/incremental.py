@@ -1,14 +1,30 @@
+import copy
 import itertools
 import json
 import math
+import multiprocessing as mp
 import time
+import traceback
 from abc import ABC, abstractmethod
-from contextlib import redirect_stdout
+from contextlib import ExitStack, contextmanager, redirect_stdout
 from dataclasses import dataclass
 from io import StringIO
 from itertools import accumulate, chain
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
 from pathlib import Path
-from typing import ClassVar, Dict, List, Optional, Sequence, Tuple, Type, TypeVar, Union
+from typing import (
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import gym
 import matplotlib.pyplot as plt
@@ -29,6 +45,7 @@ from sequoia.common.gym_wrappers.step_callback_wrapper import (
     StepCallbackWrapper,
 )
 from sequoia.common.gym_wrappers.utils import IterableWrapper
+from sequoia.common.spaces.validation import ValidationPolicy
 from sequoia.settings.base import (
     Actions,
     Environment,
@@ -38,8 +55,11 @@ from sequoia.settings.base import (
     Setting,
     SettingABC,
 )
+from sequoia.settings.base.first_task_checkpoint import FirstTaskCheckpoint
+from sequoia.settings.base.task_checkpoint import TaskCheckpoint
 from sequoia.utils import constant, flag, mean
 from sequoia.utils.logging_utils import get_logger
+from sequoia.utils.profiling import Profiler, get_batch_size, profile
 from sequoia.utils.utils import add_prefix
 from .continual import ContinualAssumption, TestEnvironment
 from .incremental_results import IncrementalResults, TaskResults, TaskSequenceResults
@@ -61,6 +81,9 @@ class IncrementalAssumption(ContinualAssumption):
     """
 
     Results: ClassVar[Type[Results]] = IncrementalResults
+    # Ids of the tasks in the test environment, when only testing on some of the
+    # tasks (see `_testing_only_on_tasks`). None when testing on all tasks.
+    _test_task_ids: ClassVar[Optional[List[int]]] = None
 
     @dataclass(frozen=True)
     class Observations(Setting.Observations):
@@ -89,6 +112,17 @@ class IncrementalAssumption(ContinualAssumption):
     # training. Only used when `smooth_task_boundaries` is False.
     known_task_boundaries_at_test_time: bool = True
 
+    # Number of worker processes in which to run the test loop. When greater than 1,
+    # the tasks are split between the workers, each with a copy of the Method, which
+    # is faster on machines with many (CPU) cores. By default, the test loop runs in
+    # the current process.
+    test_workers: int = 0
+
+    # Directory in which to save a checkpoint of the run after each task. When the
+    # checkpoint of a previous run with the same configuration is found there, the
+    # completed tasks are skipped, and the run resumes after the last of them.
+    checkpoint_dir: Optional[Path] = None
+
     # The number of tasks. By default 0, which means that it will be set
     # depending on other fields in __post_init__, or eventually be just 1.
     nb_tasks: int = field(5, alias=["n_tasks", "num_tasks"])
@@ -171,9 +205,32 @@ class IncrementalAssumption(ContinualAssumption):
             else:
                 method.on_task_switch(task_id)
 
+    def checkpoint_state(self) -> Dict:
+        """ Returns the state of the Setting to save in the checkpoint of a run (see
+        `checkpoint_dir`), such that it can be restored with `load_checkpoint_state`.
+
+        Subclasses with some additional state that changes between tasks should extend
+        this.
+        """
+        state = {"current_task_id": self.current_task_id}
+        if self.config is not None:
+            state["config_rng"] = self.config.rng.bit_generator.state
+        return state
+
+    def load_checkpoint_state(self, state: Dict) -> None:
+        """ Restores the state of the Setting, as returned by `checkpoint_state`. """
+        self.current_task_id = state["current_task_id"]
+        if self.config is not None and "config_rng" in state:
+            self.config.rng.bit_generator.state = state["config_rng"]
+
     def main_loop(self, method: Method) -> IncrementalResults:
-        """ Runs an incremental training loop, wether in RL or CL. """
-        # TODO: Add ways of restoring state to continue a given run?
+        """ Runs an incremental training loop, wether in RL or CL.
+
+        When `checkpoint_dir` is set, a checkpoint is saved after each task, and the run
+        is resumed from the checkpoint of a previous run with the same configuration, if
+        there is one (see `TaskCheckpoint`). This requires the `state_dict` and
+        `load_state_dict` methods of the Method.
+        """
         # For each training task, for each test task, a list of the Metrics obtained
         # during testing on that task.
         # NOTE: We could also just store a single metric for each test task, but then
@@ -196,34 +253,96 @@ class IncrementalAssumption(ContinualAssumption):
 
         method.set_training()
 
-        self._start_time = time.process_time()
-
-        for task_id in range(self.phases):
+        # During HPO sweeps with warm-starting, the state after the first task can be
+        # shared between trials (see `Method.hparam_sweep`).
+        first_task_checkpoint: Optional[FirstTaskCheckpoint] = None
+        if self.phases > 1:
+            first_task_checkpoint = getattr(method, "_first_task_checkpoint", None)
+
+        checkpoint: Optional[TaskCheckpoint] = None
+        start_task_id = 0
+        previous_runtime = 0.0
+        if self.checkpoint_dir is not None and not _has_state_dict(method):
+            # NOTE: Check this before the first task, rather than failing when saving
+            # the checkpoint at the end of it.
+            logger.warning(
+                RuntimeWarning(
+                    f"Method {type(method).__name__} doesn't implement the "
+                    f"`state_dict` and `load_state_dict` methods, so the run can't be "
+                    f"checkpointed. Ignoring `checkpoint_dir`."
+                )
+            )
+        elif self.checkpoint_dir is not None:
+            checkpoint = TaskCheckpoint.for_run(self.checkpoint_dir, self, method)
+            if checkpoint.exists():
+                last_task_id, previous_runtime = checkpoint.restore(
+                    self, method, results
+                )
+                start_task_id = last_task_id + 1
+
+        profiler = Profiler()
+        validation_policy = ValidationPolicy()
+        if self.config:
+            validation_policy = ValidationPolicy.from_config(self.config)
+        # NOTE: Using an ExitStack rather than a `with` block, to keep the loop below
+        # at the same indentation.
+        contexts = ExitStack()
+        contexts.enter_context(profiler.activate())
+        contexts.enter_context(validation_policy.activate())
+        contexts.enter_context(profile("main_loop"))
+        self._start_time = time.process_time() - previous_runtime
+
+        for task_id in range(start_task_id, self.phases):
             logger.info(
                 f"Starting training"
                 + (f" on task {task_id}." if self.nb_tasks > 1 else ".")
             )
             self.current_task_id = task_id
+            profiler.task_id = task_id
             self.task_boundary_reached(method, task_id=task_id, training=True)
 
-            # Creating the dataloaders ourselves (rather than passing 'self' as
-            # the datamodule):
-            task_train_env = self.train_dataloader()
-            task_valid_env = self.val_dataloader()
-
-            method.fit(
-                train_env=task_train_env, valid_env=task_valid_env,
-            )
-            task_train_env.close()
-            task_valid_env.close()
-
-            if self.monitor_training_performance:
-                results._online_training_performance.append(
-                    task_train_env.get_online_performance()
-                )
+            if (
+                task_id == 0
+                and first_task_checkpoint is not None
+                and first_task_checkpoint.exists()
+            ):
+                # Skip the first task, restoring the state of the Method and the
+                # results of the first task from a previous run instead.
+                restored = first_task_checkpoint.restore(method)
+                test_metrics, online_performance = restored
+                if self.monitor_training_performance:
+                    results._online_training_performance.append(online_performance)
+            else:
+                # Creating the dataloaders ourselves (rather than passing 'self' as
+                # the datamodule):
+                task_train_env = self.train_dataloader()
+                task_valid_env = self.val_dataloader()
+
+                with profile("fit"):
+                    method.fit(
+                        train_env=task_train_env, valid_env=task_valid_env,
+                    )
+                task_train_env.close()
+                task_valid_env.close()
+
+                online_performance = None
+                if self.monitor_training_performance:
+                    online_performance = task_train_env.get_online_performance()
+                    results._online_training_performance.append(online_performance)
+
+                logger.info(f"Finished Training on task {task_id}.")
+                previous_test_metrics: Optional[TaskSequenceResults] = None
+                if results.task_sequence_results:
+                    previous_test_metrics = results.task_sequence_results[-1]
+                with profile("test"):
+                    test_metrics = self._test_loop_reusing_results(
+                        method, previous_test_metrics
+                    )
 
-            logger.info(f"Finished Training on task {task_id}.")
-            test_metrics: TaskSequenceResults = self.test_loop(method)
+                if task_id == 0 and first_task_checkpoint is not None:
+                    first_task_checkpoint.save(
+                        method, test_metrics, online_performance
+                    )
 
             # Add a row to the transfer matrix.
             results.task_sequence_results.append(test_metrics)
@@ -235,13 +354,206 @@ class IncrementalAssumption(ContinualAssumption):
                 d["current_task"] = task_id
                 wandb.log(d)
 
+            if task_id < self.phases - 1 and hasattr(
+                method, "receive_intermediate_objective"
+            ):
+                # Give the Method the objective on the tasks learned so far, i.e.
+                # using the row of the transfer matrix up to the current task.
+                # (This is used to stop the trials early during HPO sweeps).
+                objective = self._intermediate_objective(test_metrics, task_id)
+                method.receive_intermediate_objective(self, task_id, objective)
+
+            if checkpoint is not None:
+                checkpoint.save(
+                    self,
+                    method,
+                    task_id=task_id,
+                    results=results,
+                    runtime=time.process_time() - self._start_time,
+                )
+
+        profiler.task_id = None
+        contexts.close()
+
         self._end_time = time.process_time()
         runtime = self._end_time - self._start_time
         results._runtime = runtime
+        results.profile = profiler.to_log_dict()
         logger.info(f"Finished main loop in {runtime} seconds.")
         self.log_results(method, results)
         return results
 
+    def _intermediate_objective(
+        self, test_metrics: TaskSequenceResults, task_id: int
+    ) -> float:
+        """ Returns the objective of the test results on the tasks from 0 to `task_id`.
+        """
+        seen_tasks_metrics = test_metrics.average_metrics_per_task[: task_id + 1]
+        return sum(seen_tasks_metrics, Metrics()).objective
+
+    def _test_loop_reusing_results(
+        self, method: Method, previous_test_metrics: Optional[TaskSequenceResults]
+    ) -> TaskSequenceResults:
+        """ Runs the test loop, re-using the previous results of the unchanged tasks.
+
+        The Method can report the tasks for which its predictions haven't changed since
+        the previous test loop (see `Method.get_unchanged_test_tasks`). The results of
+        these tasks are copied from `previous_test_metrics`, and only the other tasks
+        are tested on, if the Setting supports it.
+        """
+        if previous_test_metrics is None:
+            return self._run_test_loop(method)
+        n_tasks = len(previous_test_metrics.task_results)
+        unchanged_tasks = set(method.get_unchanged_test_tasks(self))
+        unchanged_tasks.intersection_update(range(n_tasks))
+        if not unchanged_tasks:
+            return self._run_test_loop(method)
+
+        tasks_to_test = [t for t in range(n_tasks) if t not in unchanged_tasks]
+        logger.info(
+            f"Re-using the previous test results of tasks {sorted(unchanged_tasks)}."
+        )
+        test_metrics = copy.copy(previous_test_metrics)
+        test_metrics.task_results = list(previous_test_metrics.task_results)
+        if not tasks_to_test:
+            return test_metrics
+        try:
+            new_test_metrics = self._run_test_loop(method, tasks_to_test)
+        except NotImplementedError:
+            logger.debug(
+                f"Can't test on only some of the tasks in setting {type(self).__name__}, "
+                f"testing on all tasks."
+            )
+            return self._run_test_loop(method)
+
+        for task_id, task_results in zip(tasks_to_test, new_test_metrics.task_results):
+            test_metrics.task_results[task_id] = task_results
+        return test_metrics
+
+    def _run_test_loop(
+        self, method: Method, task_ids: List[int] = None
+    ) -> TaskSequenceResults:
+        """ Runs the test loop on the given tasks (all the tasks by default).
+
+        When `test_workers` is greater than 1, the tasks are split between that many
+        worker processes (see `_sharded_test_loop`). Falls back to running the test
+        loop in the current process when that isn't possible.
+        """
+        shard_task_ids = task_ids if task_ids is not None else list(range(self.nb_tasks))
+        if self.test_workers > 1 and len(shard_task_ids) > 1:
+            try:
+                return self._sharded_test_loop(method, shard_task_ids)
+            except NotImplementedError as exc:
+                logger.warning(
+                    RuntimeWarning(
+                        f"Can't run the test loop in multiple processes ({exc}), "
+                        f"running it in the current process instead."
+                    )
+                )
+        if task_ids is None:
+            return self.test_loop(method)
+        with self._testing_only_on_tasks(task_ids):
+            return self.test_loop(method)
+
+    def _sharded_test_loop(
+        self, method: Method, task_ids: List[int]
+    ) -> TaskSequenceResults:
+        """ Runs the test loop on the given tasks in `test_workers` forked processes.
+
+        The tasks are split into contiguous shards, one per worker process. Each worker
+        runs the usual test loop on the tasks of its shard, with its own (copy-on-write)
+        copy of the Method, and sends back its results. The results of all the shards
+        are then concatenated, in the order of the tasks. The state of the Method in
+        the current process isn't changed.
+
+        Raises a `NotImplementedError` when the Setting can't test on only some of the
+        tasks, or when the worker processes can't be forked.
+        """
+        if "fork" not in mp.get_all_start_methods():
+            raise NotImplementedError("the 'fork' start method isn't available")
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            raise NotImplementedError("CUDA can't be used in forked processes")
+        # Check that the Setting supports it (and prepare/setup the data) before
+        # forking, so the workers don't each have to do it.
+        with self._testing_only_on_tasks(task_ids):
+            pass
+
+        n_shards = min(self.test_workers, len(task_ids))
+        shard_size = math.ceil(len(task_ids) / n_shards)
+        shards = [
+            task_ids[i : i + shard_size] for i in range(0, len(task_ids), shard_size)
+        ]
+        # Share the threads of the current process between the workers.
+        num_threads = max(1, torch.get_num_threads() // len(shards))
+
+        def _test_shard(shard: List[int], connection: Connection) -> None:
+            try:
+                torch.set_num_threads(num_threads)
+                with self._testing_only_on_tasks(shard):
+                    shard_results = self.test_loop(method)
+                connection.send((shard_results, None))
+            except BaseException:
+                connection.send((None, traceback.format_exc()))
+            finally:
+                connection.close()
+
+        logger.info(f"Running the test loop in {len(shards)} processes: {shards}")
+        context = mp.get_context("fork")
+        processes: List[BaseProcess] = []
+        receivers: List[Connection] = []
+        try:
+            for shard in shards:
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_test_shard, args=(shard, sender))
+                process.start()
+                sender.close()
+                processes.append(process)
+                receivers.append(receiver)
+
+            all_shard_results: List[TaskSequenceResults] = []
+            for shard, process, receiver in zip(shards, processes, receivers):
+                try:
+                    shard_results, error = receiver.recv()
+                except EOFError:
+                    shard_results = None
+                    process.join()
+                    error = f"Worker process exited with code {process.exitcode}."
+                if error is not None:
+                    raise RuntimeError(
+                        f"Test loop on tasks {shard} failed in a worker process:\n"
+                        f"{error}"
+                    )
+                all_shard_results.append(shard_results)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+            for receiver in receivers:
+                receiver.close()
+
+        test_results = copy.copy(all_shard_results[0])
+        test_results.task_results = [
+            task_results
+            for shard_results in all_shard_results
+            for task_results in shard_results.task_results
+        ]
+        return test_results
+
+    @contextmanager
+    def _testing_only_on_tasks(self, task_ids: List[int]) -> Iterator[None]:
+        """ Context manager in which the test environment only contains the given tasks.
+
+        The results of the test loop then only contain the results of these tasks, in
+        the same order. Settings which support this should override this method and set
+        the `_test_task_ids` attribute. Raises a `NotImplementedError` by default.
+        """
+        raise NotImplementedError(
+            f"Setting {type(self).__name__} can't test on only some of the tasks."
+        )
+        yield
+
     def test_loop(self, method: Method) -> "IncrementalAssumption.Results":
         """ (WIP): Runs an incremental test loop and returns the Results.
 
@@ -288,6 +600,8 @@ class IncrementalAssumption(ContinualAssumption):
                     # tasks for example), then this wouldn't work, we'd need a
                     # list of the task ids or something like that.
                     task_id = task_steps.index(step)
+                    if self._test_task_ids is not None:
+                        task_id = self._test_task_ids[task_id]
                     logger.debug(
                         f"Calling `method.on_task_switch({task_id})` "
                         f"since task labels are available at test-time."
@@ -359,7 +673,8 @@ class IncrementalAssumption(ContinualAssumption):
                             test_env.single_action_space, obs_batch_size
                         )
 
-                action = method.get_actions(obs, action_space)
+                with profile("get_actions", samples=get_batch_size(obs)):
+                    action = method.get_actions(obs, action_space)
 
                 # logger.debug(f"action: {action}")
                 # TODO: Remove this:
@@ -416,3 +731,13 @@ class IncrementalAssumption(ContinualAssumption):
 
     def _get_objective_scaling_factor(self) -> float:
         return 1.0
+
+
+def _has_state_dict(method: Method) -> bool:
+    """ Returns wether `method` overrides the `state_dict` and `load_state_dict`
+    methods of the base `Method` class (which raise a `NotImplementedError`).
+    """
+    return all(
+        getattr(type(method), name, None) not in (None, getattr(Method, name))
+        for name in ("state_dict", "load_state_dict")
+    )
@@ -12,7 +12,7 @@ import wandb
 from gym.utils import colorize
 from sequoia.common.metrics import Metrics
 from sequoia.settings.base.results import Results
-from simple_parsing.helpers import list_field
+from simple_parsing.helpers import dict_field, list_field
 
 from .iid_results import MetricType, TaskResults
 from .discrete_results import TaskSequenceResults
@@ -30,6 +30,9 @@ class IncrementalResults(Results, Generic[MetricType]):
     """
 
     task_sequence_results: List[TaskSequenceResults[MetricType]] = list_field()
+    # Time spent in each phase of the run (e.g. "fit", "test", "data_loading"), for
+    # each task and in total. See `sequoia.utils.profiling`.
+    profile: Dict[str, Dict[str, Dict[str, float]]] = dict_field()
 
     min_runtime_hours: ClassVar[float] = 0.0
     max_runtime_hours: ClassVar[float] = 12.0
@@ -241,6 +244,11 @@ class IncrementalResults(Results, Generic[MetricType]):
                 "Final/CL Score": self.cl_score,
             }
         )
+        if self.profile:
+            # Only log the total time of each phase, unless `verbose` is True.
+            log_dict["Profile"] = self.profile if verbose else {
+                phase: phase_dict["Total"] for phase, phase_dict in self.profile.items()
+            }
         return log_dict
 
     def summary(self):
@@ -7,7 +7,7 @@ from gym.vector.utils.spaces import batch_space
 from sequoia.methods import Method
 from sequoia.settings import Actions, Environment, Observations, Setting
 
-from .incremental import IncrementalAssumption, TestEnvironment
+from .incremental import IncrementalAssumption, TestEnvironment, _has_state_dict
 
 
 class DummyMethod(Method, target_setting=IncrementalAssumption):
@@ -109,3 +109,15 @@ class OtherDummyMethod(Method, target_setting=IncrementalAssumption):
         else:
             self.batch_sizes.append(0)  # X isn't batched.
         return action_space.sample()
+
+
+def test_has_state_dict():
+    class MethodWithState(DummyMethod):
+        def state_dict(self):
+            return {"n_fit_calls": self.n_fit_calls}
+
+        def load_state_dict(self, state_dict):
+            self.n_fit_calls = state_dict["n_fit_calls"]
+
+    assert not _has_state_dict(DummyMethod())
+    assert _has_state_dict(MethodWithState())
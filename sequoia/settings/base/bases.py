@@ -1,6 +1,9 @@
 """ This module defines the base classes for Settings and Methods.
 """
 import json
+import multiprocessing
+import os
+import queue
 import traceback
 from abc import ABC, abstractmethod
 from functools import partial
@@ -30,7 +33,9 @@ from wandb.wandb_run import Run
 from sequoia.common import Config, Metrics
 from sequoia.settings.base.environment import Environment
 from sequoia.settings.base.objects import Actions, Observations, Rewards
+from sequoia.settings.base.first_task_checkpoint import FirstTaskCheckpoint
 from sequoia.settings.base.results import Results
+from sequoia.settings.base.trial_scheduler import SuccessiveHalvingScheduler, TrialPruned
 from sequoia.utils.logging_utils import get_logger
 from sequoia.utils.parseable import Parseable
 from sequoia.utils.utils import (
@@ -416,6 +421,59 @@ class Method(Generic[SettingType], Parseable, ABC):
             if method_path.exists():
                 wandb.save(str(method_path))
 
+    def receive_intermediate_objective(
+        self, setting: SettingType, task_id: int, objective: float
+    ) -> None:
+        """ Receive the objective obtained so far, after training on task `task_id`.
+
+        This method is optional.
+
+        This is called by the incremental Settings after the test loop that follows
+        training on each task (except the last), with the average test performance on
+        the tasks learned so far.
+
+        During an HPO sweep where early-stopping is enabled (see the `reduction_factor`
+        argument of `hparam_sweep`), this reports the objective to the scheduler of the
+        sweep, which raises a `TrialPruned` exception to stop this trial if it is worse
+        than most previous trials after the same task.
+
+        Parameters
+        ----------
+        setting : Setting
+            The Setting this Method is being applied to.
+        task_id : int
+            Index of the task that the Method was just trained on.
+        objective : float
+            The `objective` of the test results for the tasks from 0 to `task_id`.
+        """
+        trial_scheduler = getattr(self, "_trial_scheduler", None)
+        if trial_scheduler is not None:
+            trial_scheduler.report(task_id, objective)
+
+    def get_unchanged_test_tasks(self, setting: SettingType) -> List[int]:
+        """ Returns the tasks whose predictions haven't changed since the last test loop.
+
+        This method is optional.
+
+        This is called by the incremental Settings before each test loop (except the
+        first). When the Method can guarantee that its predictions on the test data of
+        some tasks are exactly the same as during the previous test loop (for example
+        because the parameters used for these tasks are frozen), the Setting re-uses
+        the previous results for these tasks, rather than testing on them again.
+
+        Parameters
+        ----------
+        setting : Setting
+            The Setting this Method is being applied to.
+
+        Returns
+        -------
+        List[int]
+            The ids of the tasks whose test results can be re-used. Defaults to an
+            empty list, in which case all tasks are tested on again.
+        """
+        return []
+
     def setup_wandb(self, run: Run) -> None:
         """ Called by the Setting when using Weights & Biases, after `wandb.init`.
 
@@ -713,6 +771,44 @@ class Method(Generic[SettingType], Parseable, ABC):
             "method in order to enable HPO sweeps."
         )
 
+    def get_hparams_unused_in_first_task(self, setting: SettingABC) -> List[str]:
+        """Returns the hyper-parameters that have no effect on the first task.
+
+        During HPO sweeps with warm-starting enabled (see `hparam_sweep`), trials that
+        only differ in these hyper-parameters share the state reached after the first
+        task. This requires the `state_dict` and `load_state_dict` methods.
+
+        Parameters
+        ----------
+        setting : Setting
+            The Setting on which the run of HPO will take place.
+
+        Returns
+        -------
+        List[str]
+            Dotted paths to the hyper-parameters in the search space (e.g.
+            "hparams.ewc.coefficient"). A path to a nested dictionary of the search
+            space applies to all the hyper-parameters it contains. Defaults to an empty
+            list.
+        """
+        return []
+
+    def state_dict(self) -> Dict[str, Any]:
+        """Returns the state of this Method (e.g. the weights of its model), such that
+        it can be restored later with `load_state_dict`.
+        """
+        raise NotImplementedError(
+            "You need to provide an implementation for the `state_dict` method in "
+            "order to save the state of the Method."
+        )
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        """Restores the state of this Method, as returned by `state_dict`. """
+        raise NotImplementedError(
+            "You need to provide an implementation for the `load_state_dict` method "
+            "in order to restore the state of the Method."
+        )
+
     def hparam_sweep(
         self,
         setting: SettingABC,
@@ -721,6 +817,9 @@ class Method(Generic[SettingType], Parseable, ABC):
         database_path: Union[str, Path] = None,
         max_runs: int = None,
         debug: bool = False,
+        n_workers: int = 1,
+        reduction_factor: int = None,
+        warm_start: bool = False,
     ) -> Tuple[Dict, float]:
         """ Performs a Hyper-Parameter Optimization sweep using orion.
 
@@ -753,13 +852,32 @@ class Method(Generic[SettingType], Parseable, ABC):
             Wether to run Orion in debug-mode, where the database is an EphemeralDb,
             meaning it gets created for the sweep and destroyed at the end of the sweep.
 
+        n_workers : int, optional
+            Number of worker processes to use. Each worker suggests, runs and observes
+            trials using the shared database (which Orion locks when it is accessed),
+            with its own copy of the Method and the Setting, its own random seed and
+            its own log directory. Defaults to 1, in which case the trials are run
+            sequentially in this process.
+
+        reduction_factor : int, optional
+            When set, enables early-stopping of the trials: After each task, only the
+            trials in the top `1 / reduction_factor` of the trials that reached that
+            task are allowed to continue (asynchronous successive-halving). Pruned
+            trials are reported with a pessimistic objective. Defaults to `None`, in
+            which case the trials are always run until the end.
+
+        warm_start : bool, optional
+            Wether to share the state reached after the first task between the trials
+            which only differ in the hyper-parameters that have no effect on the first
+            task (see `get_hparams_unused_in_first_task`). The state is saved in a
+            directory next to the database. Defaults to False.
+
         Returns
         -------
         Tuple[BaselineModel.HParams, float]
             Best HParams, and the corresponding performance.
         """
         try:
-            from orion.client import build_experiment
             from orion.core.worker.trial import Trial
         except ImportError as e:
             raise RuntimeError(
@@ -774,24 +892,43 @@ class Method(Generic[SettingType], Parseable, ABC):
         logger.info(f"Will use database at path '{database_path}'.")
         experiment_name = self.get_experiment_name(setting, experiment_id=experiment_id)
 
-        experiment = build_experiment(
-            name=experiment_name,
-            space=search_space,
+        if n_workers > 1 and debug:
+            logger.warning(
+                RuntimeWarning(
+                    "Can't use more than one worker in debug mode, since the database "
+                    "only exists in memory. Trials will be run sequentially."
+                )
+            )
+            n_workers = 1
+
+        checkpoints_dir: Optional[Path] = None
+        if warm_start:
+            if self.get_hparams_unused_in_first_task(setting):
+                checkpoints_dir = (
+                    database_path.parent / "first_task_checkpoints" / experiment_name
+                )
+                logger.info(
+                    f"Will share the state after the first task between trials, using "
+                    f"directory {checkpoints_dir}"
+                )
+            else:
+                logger.warning(
+                    RuntimeWarning(
+                        "Can't warm-start the trials, since none of the hparams are "
+                        "marked as unused in the first task (see the "
+                        "`get_hparams_unused_in_first_task` method)."
+                    )
+                )
+
+        experiment = _build_orion_experiment(
+            experiment_name,
+            search_space=search_space,
+            database_path=database_path,
+            max_runs=max_runs,
             debug=debug,
-            algorithms="BayesianOptimizer",
-            max_trials=max_runs,
-            storage={
-                "type": "legacy",
-                "database": {"type": "pickleddb", "host": str(database_path)},
-            },
         )
 
         previous_trials: List[Trial] = experiment.fetch_trials_by_status("completed")
-        # Since Orion works in a 'lower is better' fashion, so if the `objective` of the
-        # Results class for the given Setting have "higher is better", we negate the
-        # objectives when extracting them and again before submitting them to Orion.
-        lower_is_better = setting.Results.lower_is_better
-        sign = 1 if lower_is_better else -1
         if previous_trials:
             logger.info(
                 f"Using existing Experiment {experiment} which has "
@@ -800,13 +937,90 @@ class Method(Generic[SettingType], Parseable, ABC):
         else:
             logger.info(f"Created new experiment with name {experiment_name}")
 
+        if n_workers > 1:
+            trials_performed, failed_trials = _run_hparam_sweep_workers(
+                self,
+                setting,
+                n_workers=n_workers,
+                experiment_name=experiment_name,
+                search_space=search_space,
+                database_path=database_path,
+                max_runs=max_runs,
+                reduction_factor=reduction_factor,
+                checkpoints_dir=checkpoints_dir,
+            )
+            # Reload the experiment, to get the trials performed by the workers.
+            experiment = _build_orion_experiment(
+                experiment_name,
+                search_space=search_space,
+                database_path=database_path,
+                max_runs=max_runs,
+                debug=debug,
+            )
+        else:
+            trials_performed, failed_trials = self._run_hparam_sweep_trials(
+                setting,
+                experiment,
+                reduction_factor=reduction_factor,
+                checkpoints_dir=checkpoints_dir,
+            )
+
+        logger.info(
+            "Experiment statistics: \n"
+            + "\n".join(f"\t{key}: {value}" for key, value in experiment.stats.items())
+        )
+        logger.info(f"Number of previous trials: {len(previous_trials)}")
+        logger.info(f"Trials successfully completed by the workers: {trials_performed}")
+        logger.info(f"Failed Trials attempted by the workers: {failed_trials}")
+
+        if "best_trials_id" not in experiment.stats:
+            raise RuntimeError("Can't find the best trial, experiment might be broken!")
+
+        best_trial: Trial = experiment.get_trial(uid=experiment.stats["best_trials_id"])
+        best_hparams = best_trial.params
+        best_objective = best_trial.objective
+        return best_hparams, best_objective
+
+    def _run_hparam_sweep_trials(
+        self,
+        setting: SettingABC,
+        experiment,
+        max_failed_trials: int = 3,
+        reduction_factor: int = None,
+        checkpoints_dir: Path = None,
+    ) -> Tuple[int, int]:
+        """ Suggests, runs and observes trials of the given Orion experiment, until it
+        is done or until `max_failed_trials` trials have failed.
+
+        When `reduction_factor` is set, trials can be stopped early, and when
+        `checkpoints_dir` is set, trials can be warm-started from the state after the
+        first task of a previous trial (see `hparam_sweep`).
+
+        Returns the number of trials performed, and the number of failed trials.
+        """
+        from orion.core.worker.trial import Trial
+
+        # Since Orion works in a 'lower is better' fashion, so if the `objective` of the
+        # Results class for the given Setting have "higher is better", we negate the
+        # objectives when extracting them and again before submitting them to Orion.
+        lower_is_better = setting.Results.lower_is_better
+        sign = 1 if lower_is_better else -1
+
+        trial_scheduler: Optional[SuccessiveHalvingScheduler] = None
+        if reduction_factor:
+            trial_scheduler = SuccessiveHalvingScheduler(
+                reduction_factor=reduction_factor, lower_is_better=lower_is_better,
+            )
+
         trials_performed = 0
         failed_trials = 0
+        pruned_trials = 0
 
         red = partial(colorize, color="red")
         green = partial(colorize, color="green")
+        yellow = partial(colorize, color="yellow")
 
-        while not (experiment.is_done or failed_trials == 3):
+        while not (experiment.is_done or failed_trials == max_failed_trials):
             # Get a new suggestion of hparams to try:
             trial: Trial = experiment.suggest()
 
@@ -824,11 +1038,53 @@ class Method(Generic[SettingType], Parseable, ABC):
             )
             self.adapt_to_new_hparams(new_hparams)
 
+            if trial_scheduler is not None:
+                # NOTE: Reload the trials each time, since other workers might be
+                # using the same database.
+                trial_scheduler.load_trials(
+                    experiment.fetch_trials_by_status("completed")
+                )
+                trial_scheduler.start_trial()
+                self._trial_scheduler = trial_scheduler
+
+            if checkpoints_dir is not None:
+                self._first_task_checkpoint = FirstTaskCheckpoint.for_trial(
+                    checkpoints_dir,
+                    hparams=new_hparams,
+                    unused_hparams=self.get_hparams_unused_in_first_task(setting),
+                )
+
             # ---------
             # Evaluate the (adapted) method on the setting:
             # ---------
             try:
                 result: Results = setting.apply(self)
+            except TrialPruned as pruned:
+                if wandb.run:
+                    wandb.finish()
+                objective_name = setting.Results.objective_name
+                if not isinstance(objective_name, str):
+                    # (The name is a property on some Results classes).
+                    objective_name = "objective"
+                orion_results = [
+                    dict(
+                        name=objective_name,
+                        type="objective",
+                        value=sign * trial_scheduler.pruned_objective(),
+                    )
+                ]
+                orion_results += trial_scheduler.statistics(
+                    pruned_after_task=pruned.task_id
+                )
+                experiment.observe(trial, orion_results)
+                trials_performed += 1
+                pruned_trials += 1
+                logger.info(
+                    yellow(
+                        f"Trial #{trials_performed}: {pruned} "
+                        f"({pruned_trials} pruned trials so far)."
+                    )
+                )
             except Exception:
 
                 logger.error(red("Encountered an error, this trial will be dropped:"))
@@ -849,7 +1105,10 @@ class Method(Generic[SettingType], Parseable, ABC):
                     type="objective",
                     value=sign * result.objective,
                 )
-                experiment.observe(trial, [orion_result])
+                orion_results = [orion_result]
+                if trial_scheduler is not None:
+                    orion_results += trial_scheduler.statistics()
+                experiment.observe(trial, orion_results)
                 trials_performed += 1
                 logger.info(
                     green(
@@ -858,19 +1117,210 @@ class Method(Generic[SettingType], Parseable, ABC):
                 )
                 # Receive the results, maybe log to wandb, whatever you wanna do.
                 self.receive_results(setting, result)
-
-        logger.info(
-            "Experiment statistics: \n"
-            + "\n".join(f"\t{key}: {value}" for key, value in experiment.stats.items())
+            finally:
+                self._trial_scheduler = None
+                self._first_task_checkpoint = None
+        return trials_performed, failed_trials
+
+
+def _build_orion_experiment(
+    experiment_name: str,
+    search_space: Dict[str, Union[str, Dict]],
+    database_path: Path,
+    max_runs: Optional[int],
+    debug: bool,
+):
+    """ Creates (or loads) the Orion experiment used in `Method.hparam_sweep`. """
+    from orion.client import build_experiment
+
+    return build_experiment(
+        name=experiment_name,
+        space=search_space,
+        debug=debug,
+        algorithms="BayesianOptimizer",
+        max_trials=max_runs,
+        storage={
+            "type": "legacy",
+            "database": {"type": "pickleddb", "host": str(database_path)},
+        },
+    )
+
+
+def _hparam_sweep_worker(
+    method: Method,
+    setting: SettingABC,
+    worker_index: int,
+    experiment_name: str,
+    search_space: Dict[str, Union[str, Dict]],
+    database_path: Path,
+    max_runs: Optional[int],
+    results_queue: "multiprocessing.Queue",
+    reduction_factor: Optional[int] = None,
+    checkpoints_dir: Optional[Path] = None,
+) -> None:
+    """ Entry-point of a worker process of `Method.hparam_sweep`.
+
+    Puts `(worker_index, (trials_performed, failed_trials))` in `results_queue`.
+    """
+    try:
+        results = _hparam_sweep_worker_trials(
+            method,
+            setting,
+            worker_index=worker_index,
+            experiment_name=experiment_name,
+            search_space=search_space,
+            database_path=database_path,
+            max_runs=max_runs,
+            reduction_factor=reduction_factor,
+            checkpoints_dir=checkpoints_dir,
         )
-        logger.info(f"Number of previous trials: {len(previous_trials)}")
-        logger.info(f"Trials successfully completed by this worker: {trials_performed}")
-        logger.info(f"Failed Trials attempted by this worker: {failed_trials}")
-
-        if "best_trials_id" not in experiment.stats:
-            raise RuntimeError("Can't find the best trial, experiment might be broken!")
-
-        best_trial: Trial = experiment.get_trial(uid=experiment.stats["best_trials_id"])
-        best_hparams = best_trial.params
-        best_objective = best_trial.objective
-        return best_hparams, best_objective
+        results_queue.put((worker_index, results))
+    except BaseException:
+        logger.error(f"Worker {worker_index} crashed:\n{traceback.format_exc()}")
+        # NOTE: Report the crash as a failed trial, so the parent doesn't wait for it.
+        results_queue.put((worker_index, (0, 1)))
+        raise
+
+
+def _hparam_sweep_worker_trials(
+    method: Method,
+    setting: SettingABC,
+    worker_index: int,
+    experiment_name: str,
+    search_space: Dict[str, Union[str, Dict]],
+    database_path: Path,
+    max_runs: Optional[int],
+    reduction_factor: Optional[int] = None,
+    checkpoints_dir: Optional[Path] = None,
+) -> Tuple[int, int]:
+    from pytorch_lightning import seed_everything
+
+    # Give each worker a different seed. When no seed is set, the seed is random,
+    # since forked workers would otherwise share the random state of the parent.
+    configs: List[Config] = [
+        config
+        for config in [getattr(method, "config", None), getattr(setting, "config", None)]
+        if isinstance(config, Config)
+    ]
+    base_seed = next((c.seed for c in configs if c.seed is not None), None)
+    if base_seed is None:
+        seed = int.from_bytes(os.urandom(4), "little") // 2
+    else:
+        seed = base_seed + worker_index
+    seed_everything(seed)
+    # Each worker also logs to its own directory.
+    for config in configs:
+        config.seed = seed
+        config.log_dir = Path(config.log_dir) / f"{experiment_name}_worker_{worker_index}"
+        config.log_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Worker {worker_index} starting, with seed {seed}.")
+
+    experiment = _build_orion_experiment(
+        experiment_name,
+        search_space=search_space,
+        database_path=database_path,
+        max_runs=max_runs,
+        debug=False,
+    )
+    return method._run_hparam_sweep_trials(
+        setting,
+        experiment,
+        reduction_factor=reduction_factor,
+        checkpoints_dir=checkpoints_dir,
+    )
+
+
+def _run_hparam_sweep_workers(
+    method: Method,
+    setting: SettingABC,
+    n_workers: int,
+    experiment_name: str,
+    search_space: Dict[str, Union[str, Dict]],
+    database_path: Path,
+    max_runs: Optional[int],
+    reduction_factor: Optional[int] = None,
+    checkpoints_dir: Optional[Path] = None,
+) -> Tuple[int, int]:
+    """ Runs the trials of a sweep in `n_workers` local processes.
+
+    Returns the total number of trials performed and of failed trials.
+    """
+    # NOTE: Forking avoids having to pickle the Method and the Setting, and lets the
+    # workers share the (read-only) memory of the parent, e.g. the datasets.
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+    results_queue = context.Queue()
+    workers = [
+        context.Process(
+            target=_hparam_sweep_worker,
+            name=f"hparam_sweep_worker_{worker_index}",
+            kwargs=dict(
+                method=method,
+                setting=setting,
+                worker_index=worker_index,
+                experiment_name=experiment_name,
+                search_space=search_space,
+                database_path=database_path,
+                max_runs=max_runs,
+                results_queue=results_queue,
+                reduction_factor=reduction_factor,
+                checkpoints_dir=checkpoints_dir,
+            ),
+        )
+        for worker_index in range(n_workers)
+    ]
+    logger.info(f"Launching {n_workers} HPO workers.")
+    for worker in workers:
+        worker.start()
+    results = _get_worker_results(workers, results_queue)
+    for worker in workers:
+        worker.join()
+    trials_performed = sum(performed for performed, _ in results.values())
+    failed_trials = sum(failed for _, failed in results.values())
+    return trials_performed, failed_trials
+
+
+def _get_worker_results(
+    workers: List[multiprocessing.Process],
+    results_queue: "multiprocessing.Queue",
+    poll_interval: float = 1.0,
+) -> Dict[int, Tuple[int, int]]:
+    """ Gets the `(trials_performed, failed_trials)` of each worker of the sweep.
+
+    A worker that dies without reporting its results (e.g. killed by the OOM killer,
+    or after a segfault) is counted as one failed trial, rather than having the parent
+    wait for it forever.
+    """
+    # NOTE: Get the results before joining, so the queue doesn't block the workers.
+    results: Dict[int, Tuple[int, int]] = {}
+    while len(results) < len(workers):
+        try:
+            worker_index, worker_results = results_queue.get(timeout=poll_interval)
+            results[worker_index] = worker_results
+            continue
+        except queue.Empty:
+            pass
+        dead_workers = [
+            worker_index
+            for worker_index, worker in enumerate(workers)
+            if worker_index not in results and not worker.is_alive()
+        ]
+        if not dead_workers:
+            continue
+        # The results of a worker are flushed to the queue before it exits, so any
+        # results of these workers are available by now.
+        while True:
+            try:
+                worker_index, worker_results = results_queue.get_nowait()
+            except queue.Empty:
+                break
+            results[worker_index] = worker_results
+        for worker_index in dead_workers:
+            if worker_index not in results:
+                exitcode = workers[worker_index].exitcode
+                logger.error(
+                    f"Worker {worker_index} exited with code {exitcode} without "
+                    f"reporting its results, counting it as a failed trial."
+                )
+                results[worker_index] = (0, 1)
+    return results
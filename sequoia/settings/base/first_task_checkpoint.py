@@ -0,0 +1,98 @@
+""" Checkpoints of the state after the first task, shared between the trials of a sweep.
+
+Some hyper-parameters of a Method only have an effect from the second task onward
+(e.g. the coefficient of the EWC penalty). Trials of a sweep that only differ in these
+hyper-parameters therefore all end up in the same state after training and testing on
+the first task. When warm-starting is enabled in `Method.hparam_sweep`, the first of
+these trials saves this state, and the following trials restore it instead of training
+on the first task again.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import torch
+
+from sequoia.common.metrics import Metrics
+from sequoia.utils.logging_utils import get_logger
+from sequoia.utils.utils import compute_identity, flatten_dict
+
+from .task_checkpoint import get_rng_state, load_checkpoint, set_rng_state
+
+logger = get_logger(__file__)
+
+
+class FirstTaskCheckpoint:
+    """ State of a Method after the first task, along with the test results and the
+    online training performance for that task, and the state of the random number
+    generators.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the checkpoint file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def for_trial(
+        cls, directory: Path, hparams: Dict, unused_hparams: Iterable[str]
+    ) -> "FirstTaskCheckpoint":
+        """ Returns the checkpoint for a trial with hyper-parameters `hparams`.
+
+        The checkpoints are identified by the values of the hyper-parameters that
+        affect the first task, i.e. all except those in `unused_hparams` (which are
+        dotted paths in the (nested) search space, e.g. "hparams.ewc.coefficient").
+        """
+        unused_hparams = list(unused_hparams)
+
+        def is_unused(key: str) -> bool:
+            return any(
+                key == unused or key.startswith(unused + ".")
+                for unused in unused_hparams
+            )
+
+        first_task_hparams = {
+            key: value
+            for key, value in flatten_dict(hparams, separator=".").items()
+            if not is_unused(key)
+        }
+        key = compute_identity(size=16, **first_task_hparams)
+        return cls(Path(directory) / f"first_task_{key}.pt")
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def save(
+        self,
+        method,
+        test_results: Any,
+        online_performance: Optional[Dict[int, Metrics]] = None,
+    ) -> None:
+        """ Saves the state of `method` and the results of the first task. """
+        state = {
+            "method": method.state_dict(),
+            "test_results": test_results,
+            "online_performance": online_performance,
+            "rng": get_rng_state(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # NOTE: Write to a temporary file first, since workers running in parallel
+        # might be loading or saving the same checkpoint.
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        torch.save(state, temp_path)
+        os.replace(temp_path, self.path)
+        logger.info(f"Saved the state after the first task at path {self.path}")
+
+    def restore(self, method) -> Tuple[Any, Optional[Dict[int, Metrics]]]:
+        """ Restores the state of `method` after the first task.
+
+        Returns the test results and the online training performance of the first task.
+        """
+        state = load_checkpoint(self.path)
+        method.load_state_dict(state["method"])
+        set_rng_state(state["rng"])
+        logger.info(f"Restored the state after the first task from path {self.path}")
+        return state["test_results"], state["online_performance"]
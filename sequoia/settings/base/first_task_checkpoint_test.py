@@ -0,0 +1,66 @@
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import torch
+from torch import nn
+
+from .first_task_checkpoint import FirstTaskCheckpoint
+
+
+class DummyMethod:
+    def __init__(self):
+        self.model = nn.Linear(3, 2)
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"model": self.model.state_dict()}
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        self.model.load_state_dict(state_dict["model"])
+
+
+def test_key_ignores_unused_hparams(tmp_path: Path):
+    unused = ["hparams.ewc.coefficient"]
+
+    def checkpoint(**ewc) -> FirstTaskCheckpoint:
+        hparams = {"hparams": {"learning_rate": 1e-3, "ewc": ewc}}
+        return FirstTaskCheckpoint.for_trial(tmp_path, hparams, unused_hparams=unused)
+
+    a = checkpoint(coefficient=1.0, sample_size_fim=8)
+    b = checkpoint(coefficient=50.0, sample_size_fim=8)
+    c = checkpoint(coefficient=1.0, sample_size_fim=16)
+    assert a.path == b.path
+    assert a.path != c.path
+    # Entire nested dicts of the search space can also be ignored.
+    d = FirstTaskCheckpoint.for_trial(
+        tmp_path,
+        {"hparams": {"learning_rate": 1e-3, "ewc": {"sample_size_fim": 4}}},
+        unused_hparams=["hparams.ewc"],
+    )
+    e = FirstTaskCheckpoint.for_trial(
+        tmp_path, {"hparams": {"learning_rate": 1e-3}}, unused_hparams=["hparams.ewc"],
+    )
+    assert d.path == e.path
+
+
+def test_save_and_restore(tmp_path: Path):
+    checkpoint = FirstTaskCheckpoint(tmp_path / "checkpoint.pt")
+    assert not checkpoint.exists()
+
+    method = DummyMethod()
+    torch.manual_seed(123)
+    np.random.seed(123)
+    checkpoint.save(method, test_results=[0.5, 0.1], online_performance={0: 0.3})
+    assert checkpoint.exists()
+    expected_torch = torch.rand(3)
+    expected_numpy = np.random.rand(3)
+
+    new_method = DummyMethod()
+    assert not torch.equal(new_method.model.weight, method.model.weight)
+    test_results, online_performance = checkpoint.restore(new_method)
+    assert torch.equal(new_method.model.weight, method.model.weight)
+    assert test_results == [0.5, 0.1]
+    assert online_performance == {0: 0.3}
+    # The random state is also the same as after the first task.
+    assert torch.equal(torch.rand(3), expected_torch)
+    np.testing.assert_array_equal(np.random.rand(3), expected_numpy)
@@ -1,4 +1,6 @@
 
+import multiprocessing
+import os
 from dataclasses import dataclass
 
 import pytest
@@ -6,6 +8,7 @@ import pytest
 from sequoia.methods import Method
 from sequoia.utils import constant
 
+from .bases import _get_worker_results
 from .setting import Setting
 
 
@@ -159,3 +162,30 @@ class SettingTests:
 
         results = setting.apply(method, config=config)
         self.assert_chance_level(setting, results=results)
+
+
+def _report_results(worker_index: int, results_queue) -> None:
+    results_queue.put((worker_index, (2, 1)))
+
+
+def _die_without_reporting(worker_index: int, results_queue) -> None:
+    # Like being killed by the OOM killer: No exception handler runs.
+    os._exit(1)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="Needs fork."
+)
+def test_dead_sweep_workers_count_as_failed_trials():
+    context = multiprocessing.get_context("fork")
+    results_queue = context.Queue()
+    workers = [
+        context.Process(target=target, args=(worker_index, results_queue))
+        for worker_index, target in enumerate([_report_results, _die_without_reporting])
+    ]
+    for worker in workers:
+        worker.start()
+    results = _get_worker_results(workers, results_queue, poll_interval=0.1)
+    for worker in workers:
+        worker.join()
+    assert results == {0: (2, 1), 1: (0, 1)}
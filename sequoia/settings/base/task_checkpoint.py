@@ -0,0 +1,143 @@
+""" Checkpoints of a run, saved after each task, from which the run can be resumed.
+
+When the `checkpoint_dir` of an incremental Setting is set, the main loop saves a
+checkpoint after each task, containing the rows of the transfer matrix obtained so far,
+the state of the Setting and of the random number generators, and the state of the
+Method (see `Method.state_dict`). When the run is restarted with the same configuration
+(e.g. after a crash or a preemption), the completed tasks are skipped, and the run
+resumes from the state after the last completed task.
+"""
+import inspect
+import os
+import random
+from dataclasses import fields, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+from sequoia.utils.logging_utils import get_logger
+from sequoia.utils.utils import compute_identity
+
+logger = get_logger(__file__)
+
+
+class TaskCheckpoint:
+    """ State of a run after the last completed task.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the checkpoint file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def for_run(cls, directory: Path, setting: Any, method: Any) -> "TaskCheckpoint":
+        """ Returns the checkpoint for a run of `method` on `setting`.
+
+        The checkpoints are identified by the configuration of the Setting (excluding
+        the checkpoint directory) and by the type and the hyper-parameters of the
+        Method, so that runs with a different configuration don't share checkpoints.
+        """
+        setting_config = _get_config(setting)
+        setting_config.pop("checkpoint_dir", None)
+        key = compute_identity(
+            size=16,
+            setting_type=type(setting).__qualname__,
+            setting=setting_config,
+            method_type=type(method).__qualname__,
+            hparams=_get_config(getattr(method, "hparams", None)),
+        )
+        return cls(Path(directory) / f"run_{key}.pt")
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def save(
+        self,
+        setting: Any,
+        method: Any,
+        task_id: int,
+        results: Any,
+        runtime: float = 0.0,
+    ) -> None:
+        """ Saves the state of the run after task `task_id`.
+
+        `results` are the results of the run so far. Only their rows of the transfer
+        matrix and the online training performance are saved.
+        """
+        state = {
+            "task_id": task_id,
+            "method": method.state_dict(),
+            "setting": setting.checkpoint_state(),
+            "task_sequence_results": results.task_sequence_results,
+            "online_performance": results._online_training_performance,
+            "runtime": runtime,
+            "rng": get_rng_state(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # NOTE: Write to a temporary file first, so that a run interrupted while saving
+        # doesn't leave a corrupted checkpoint.
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        torch.save(state, temp_path)
+        os.replace(temp_path, self.path)
+        logger.info(f"Saved the state after task {task_id} at path {self.path}")
+
+    def restore(self, setting: Any, method: Any, results: Any) -> Tuple[int, float]:
+        """ Restores the state of the run after the last completed task.
+
+        The rows of the transfer matrix and the online training performance are added
+        to `results`. Returns the id of the last completed task and the runtime of the
+        run up to that task.
+        """
+        state = load_checkpoint(self.path)
+        method.load_state_dict(state["method"])
+        setting.load_checkpoint_state(state["setting"])
+        results.task_sequence_results = list(state["task_sequence_results"])
+        if state["online_performance"] is not None:
+            results._online_training_performance = list(state["online_performance"])
+        set_rng_state(state["rng"])
+        task_id = state["task_id"]
+        logger.info(f"Restored the state after task {task_id} from path {self.path}")
+        return task_id, state["runtime"]
+
+
+def get_rng_state() -> Dict[str, Any]:
+    """ Returns the state of the global random number generators. """
+    rng_state = {
+        "random": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        rng_state["cuda"] = torch.cuda.get_rng_state_all()
+    return rng_state
+
+
+def set_rng_state(rng_state: Dict[str, Any]) -> None:
+    """ Restores the state of the global random number generators. """
+    random.setstate(rng_state["random"])
+    np.random.set_state(rng_state["numpy"])
+    torch.set_rng_state(rng_state["torch"])
+    if "cuda" in rng_state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng_state["cuda"])
+
+
+def load_checkpoint(path: Path) -> Dict[str, Any]:
+    """ Loads a checkpoint saved with `torch.save`, on the CPU. """
+    load_kwargs = {}
+    if "weights_only" in inspect.signature(torch.load).parameters:
+        # NOTE: The checkpoints also contain the results, not just tensors.
+        load_kwargs["weights_only"] = False
+    return torch.load(path, map_location="cpu", **load_kwargs)
+
+
+def _get_config(obj: Any) -> Optional[Any]:
+    # The values of the init fields of a dataclass, as a (nested) dict.
+    if not is_dataclass(obj) or isinstance(obj, type):
+        return obj
+    return {f.name: _get_config(getattr(obj, f.name)) for f in fields(obj) if f.init}
@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from torch import nn
+
+from .task_checkpoint import TaskCheckpoint
+
+
+class DummyMethod:
+    def __init__(self, learning_rate: float = 1e-3):
+        self.hparams = DummyHParams(learning_rate=learning_rate)
+        self.model = nn.Linear(3, 2)
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"model": self.model.state_dict()}
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        self.model.load_state_dict(state_dict["model"])
+
+
+@dataclass
+class DummyHParams:
+    learning_rate: float = 1e-3
+
+
+@dataclass
+class DummySetting:
+    nb_tasks: int = 5
+    checkpoint_dir: Optional[Path] = None
+
+    def __post_init__(self):
+        self.current_task_id = 0
+
+    def checkpoint_state(self) -> Dict:
+        return {"current_task_id": self.current_task_id}
+
+    def load_checkpoint_state(self, state: Dict) -> None:
+        self.current_task_id = state["current_task_id"]
+
+
+class DummyResults:
+    def __init__(self):
+        self.task_sequence_results: List = []
+        self._online_training_performance: Optional[List] = None
+
+
+def test_key_depends_on_the_configuration(tmp_path: Path):
+    def checkpoint(setting: DummySetting, method: DummyMethod) -> TaskCheckpoint:
+        return TaskCheckpoint.for_run(tmp_path, setting, method)
+
+    a = checkpoint(DummySetting(), DummyMethod())
+    assert a.path.parent == tmp_path
+    # The checkpoint directory itself doesn't change the configuration.
+    assert checkpoint(DummySetting(checkpoint_dir=tmp_path), DummyMethod()).path == a.path
+    assert checkpoint(DummySetting(nb_tasks=2), DummyMethod()).path != a.path
+    assert checkpoint(DummySetting(), DummyMethod(learning_rate=0.1)).path != a.path
+
+
+def test_save_and_restore(tmp_path: Path):
+    setting = DummySetting()
+    method = DummyMethod()
+    checkpoint = TaskCheckpoint.for_run(tmp_path, setting, method)
+    assert not checkpoint.exists()
+
+    results = DummyResults()
+    results.task_sequence_results = [[0.5, 0.1], [0.4, 0.6]]
+    results._online_training_performance = [{0: 0.3}, {1: 0.2}]
+    setting.current_task_id = 1
+    torch.manual_seed(123)
+    np.random.seed(123)
+    checkpoint.save(setting, method, task_id=1, results=results, runtime=12.0)
+    assert checkpoint.exists()
+    expected_torch = torch.rand(3)
+    expected_numpy = np.random.rand(3)
+
+    # Restore the state in a new run with the same configuration.
+    new_setting = DummySetting()
+    new_method = DummyMethod()
+    new_results = DummyResults()
+    checkpoint = TaskCheckpoint.for_run(tmp_path, new_setting, new_method)
+    assert checkpoint.exists()
+    last_task_id, runtime = checkpoint.restore(new_setting, new_method, new_results)
+    assert last_task_id == 1
+    assert runtime == 12.0
+    assert new_setting.current_task_id == 1
+    assert torch.equal(new_method.model.weight, method.model.weight)
+    assert new_results.task_sequence_results == [[0.5, 0.1], [0.4, 0.6]]
+    assert new_results._online_training_performance == [{0: 0.3}, {1: 0.2}]
+    # The random state is also the same as after the last completed task.
+    assert torch.equal(torch.rand(3), expected_torch)
+    np.testing.assert_array_equal(np.random.rand(3), expected_numpy)
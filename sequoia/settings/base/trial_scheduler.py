@@ -0,0 +1,143 @@
+""" Early-stopping of the trials of an HPO sweep, using successive-halving.
+
+In the incremental settings, the Method receives an 'intermediate' objective after
+training on each task (the average test performance on the tasks learned so far, see
+`Method.receive_intermediate_objective`). The sweep compares this value with the
+values that the previous trials had after training on the same task, and stops
+('prunes') the trials that are clearly worse, ASHA-style.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+
+
+class TrialPruned(Exception):
+    """ Raised when a trial is stopped early by a `SuccessiveHalvingScheduler`. """
+
+    def __init__(self, task_id: int, objective: float):
+        super().__init__(
+            f"Trial pruned after task {task_id} (intermediate objective: {objective})"
+        )
+        self.task_id = task_id
+        self.objective = objective
+
+
+# Name of the statistic that marks the trials which were pruned, in the database.
+PRUNED_STATISTIC = "pruned_after_task"
+
+
+def intermediate_objective_name(task_id: int) -> str:
+    """ Name of the statistic used to store the intermediate objective of a trial in
+    the database.
+    """
+    return f"task_{task_id}_objective"
+
+
+class SuccessiveHalvingScheduler:
+    """ Asynchronous successive-halving (ASHA) scheduler, where the 'rungs' are tasks.
+
+    After task `i`, a trial is allowed to continue only if its intermediate objective
+    is in the top `1 / reduction_factor` of the intermediate objectives obtained after
+    task `i` by the trials seen so far (including itself). No trial is pruned until at
+    least `reduction_factor` trials have reached a given task.
+
+    Parameters
+    ----------
+    reduction_factor : int, optional
+        Fraction of the trials that are kept at each task is `1 / reduction_factor`.
+        By default 3.
+    lower_is_better : bool, optional
+        Wether lower values of the objective are better. By default False.
+    """
+
+    def __init__(self, reduction_factor: int = 3, lower_is_better: bool = False):
+        if reduction_factor < 2:
+            raise ValueError(
+                f"`reduction_factor` should be at least 2 (got {reduction_factor})."
+            )
+        self.reduction_factor = reduction_factor
+        self.lower_is_better = lower_is_better
+        # Intermediate objectives of the previous trials, for each task.
+        self.previous_objectives: Dict[int, List[float]] = defaultdict(list)
+        # Final objectives of the previous trials that weren't pruned.
+        self.final_objectives: List[float] = []
+        # Intermediate objectives of the current trial, for each task.
+        self.objectives: Dict[int, float] = {}
+
+    def load_trials(self, trials: Iterable) -> None:
+        """ Loads the intermediate objectives of the given (completed) Orion trials.
+        """
+        self.previous_objectives.clear()
+        self.final_objectives.clear()
+        sign = 1 if self.lower_is_better else -1
+        for trial in trials:
+            statistics = {result.name: result.value for result in trial.statistics}
+            if PRUNED_STATISTIC not in statistics and trial.objective is not None:
+                # NOTE: The objectives in the database are always 'lower is better'.
+                self.final_objectives.append(sign * trial.objective.value)
+            task_id = 0
+            while intermediate_objective_name(task_id) in statistics:
+                self.previous_objectives[task_id].append(
+                    statistics[intermediate_objective_name(task_id)]
+                )
+                task_id += 1
+
+    def start_trial(self) -> None:
+        self.objectives = {}
+
+    def should_prune(self, task_id: int, objective: float) -> bool:
+        """ Returns wether a trial with the given objective after task `task_id`
+        should be stopped.
+        """
+        values = self.previous_objectives.get(task_id, []) + [objective]
+        if len(values) < self.reduction_factor:
+            return False
+        n_kept = math.floor(len(values) / self.reduction_factor)
+        # Number of trials strictly better than this one.
+        if self.lower_is_better:
+            rank = sum(value < objective for value in values)
+        else:
+            rank = sum(value > objective for value in values)
+        return rank >= n_kept
+
+    def report(self, task_id: int, objective: float) -> None:
+        """ Reports the intermediate objective of the current trial after `task_id`.
+
+        Raises a `TrialPruned` exception if the trial should be stopped.
+        """
+        self.objectives[task_id] = objective
+        if self.should_prune(task_id, objective):
+            raise TrialPruned(task_id=task_id, objective=objective)
+
+    def statistics(self, pruned_after_task: int = None) -> List[Dict]:
+        """ Returns the intermediate objectives of the current trial, in the format
+        used for the 'statistic' results of Orion.
+        """
+        statistics = [
+            dict(name=intermediate_objective_name(task_id), type="statistic", value=value)
+            for task_id, value in sorted(self.objectives.items())
+        ]
+        if pruned_after_task is not None:
+            statistics.append(
+                dict(name=PRUNED_STATISTIC, type="statistic", value=pruned_after_task)
+            )
+        return statistics
+
+    def pruned_objective(self) -> Optional[float]:
+        """ Returns the objective to report for a pruned trial.
+
+        The intermediate objective of a pruned trial usually isn't comparable with the
+        final objective of the other trials (since the performance on the tasks
+        learned so far tends to go down as more tasks are learned). Therefore, we report
+        the worst of its last intermediate objective and of the final objectives of the
+        trials that were run until the end, so a pruned trial is never the best.
+        """
+        if not self.objectives:
+            return None
+        last_objective = self.objectives[max(self.objectives)]
+        values = self.final_objectives + [last_objective]
+        return max(values) if self.lower_is_better else min(values)
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import pytest
+
+from .trial_scheduler import (
+    PRUNED_STATISTIC,
+    SuccessiveHalvingScheduler,
+    TrialPruned,
+    intermediate_objective_name,
+)
+
+
+def fake_trial(objective: Optional[float], statistics: Dict[str, float]):
+    """ Creates an object that looks like a completed orion Trial. """
+    return SimpleNamespace(
+        objective=None if objective is None else SimpleNamespace(value=objective),
+        statistics=[
+            SimpleNamespace(name=name, value=value) for name, value in statistics.items()
+        ],
+    )
+
+
+def test_no_pruning_with_too_few_trials():
+    scheduler = SuccessiveHalvingScheduler(reduction_factor=3)
+    scheduler.start_trial()
+    assert not scheduler.should_prune(0, 0.1)
+    scheduler.load_trials(
+        [fake_trial(-0.9, {intermediate_objective_name(0): 0.9})]
+    )
+    # Only two trials reached task 0 (including this one).
+    assert not scheduler.should_prune(0, 0.1)
+
+
+@pytest.mark.parametrize("lower_is_better", [False, True])
+def test_keeps_top_fraction(lower_is_better: bool):
+    scheduler = SuccessiveHalvingScheduler(
+        reduction_factor=3, lower_is_better=lower_is_better
+    )
+    sign = 1 if lower_is_better else -1
+    task_0_objectives: List[float] = [0.2, 0.4, 0.6, 0.8, 0.9]
+    scheduler.load_trials(
+        [
+            fake_trial(sign * value, {intermediate_objective_name(0): value})
+            for value in task_0_objectives
+        ]
+    )
+    best, worst = (0.1, 0.95) if lower_is_better else (0.95, 0.1)
+    assert not scheduler.should_prune(0, best)
+    assert scheduler.should_prune(0, worst)
+    # Only the top 2 of the 6 trials are kept.
+    second_best = 0.3 if lower_is_better else 0.85
+    third_best = 0.5 if lower_is_better else 0.7
+    assert not scheduler.should_prune(0, second_best)
+    assert scheduler.should_prune(0, third_best)
+    # There are no trials that reached task 1 yet.
+    assert not scheduler.should_prune(1, worst)
+
+    scheduler.start_trial()
+    with pytest.raises(TrialPruned) as exc_info:
+        scheduler.report(0, worst)
+    assert exc_info.value.task_id == 0
+    statistics = scheduler.statistics(pruned_after_task=0)
+    assert statistics == [
+        dict(name=intermediate_objective_name(0), type="statistic", value=worst),
+        dict(name=PRUNED_STATISTIC, type="statistic", value=0),
+    ]
+
+
+def test_pruned_objective_is_never_the_best():
+    scheduler = SuccessiveHalvingScheduler(reduction_factor=2)
+    scheduler.load_trials(
+        [
+            # Run until the end: final accuracy is lower than after the first task.
+            fake_trial(-0.5, {intermediate_objective_name(0): 0.9}),
+            # Pruned after the first task.
+            fake_trial(
+                -0.3, {intermediate_objective_name(0): 0.3, PRUNED_STATISTIC: 0}
+            ),
+        ]
+    )
+    assert scheduler.final_objectives == [0.5]
+    assert scheduler.previous_objectives[0] == [0.9, 0.3]
+
+    scheduler.start_trial()
+    with pytest.raises(TrialPruned):
+        scheduler.report(0, 0.6)
+    assert scheduler.pruned_objective() == 0.5
@@ -52,12 +52,14 @@ from sequoia.common.batch import Batch
 from sequoia.common.gym_wrappers.batch_env import AsyncVectorEnv, BatchedVectorEnv
 from sequoia.common.gym_wrappers.utils import StepResult, has_wrapper
 from sequoia.common.gym_wrappers.policy_env import PolicyEnv
+from sequoia.common.spaces.validation import should_validate
 from sequoia.common.gym_wrappers.convert_tensors import (
     has_tensor_support,
     add_tensor_support,
 )
 from sequoia.settings.rl.environment import ActiveEnvironment
 from sequoia.utils.logging_utils import get_logger
+from sequoia.utils.profiling import profile
 from sequoia.common.gym_wrappers import EnvDataset
 from sequoia.common.gym_wrappers import IterableWrapper
 from sequoia.settings.base.environment import Observations, Actions, Rewards
@@ -333,7 +335,8 @@ class GymDataLoader(
 
     def step(self, action: Union[ActionType, Any]) -> StepResult:
         # logger.debug(f"Calling step on self.env")
-        return super().step(action)
+        with profile("env_step", samples=self.batch_size or 1):
+            return super().step(action)
 
     def send(self, action: Union[ActionType, Any]) -> RewardType:
         # TODO: Remove this unwrapping code, and instead only unwrap stuff if necessary
@@ -348,8 +351,10 @@ class GymDataLoader(
             action, np.ndarray
         ):
             action = action.tolist()
-        assert action in self.env.action_space, (action, self.env.action_space)
-        return super().send(action)
+        if should_validate("GymDataLoader.send"):
+            assert action in self.env.action_space, (action, self.env.action_space)
+        with profile("env_step", samples=self.batch_size or 1):
+            return super().send(action)
         # self.action_ = action
         # self.observation_, self.reward_, self.done_, self.info_ = su(action)
         # return self.reward_
@@ -30,6 +30,7 @@ def make_batched_env(base_env: Union[str, Callable],
                      wrappers: Iterable[Union[Type[Wrapper], WrapperAndKwargs]] = None,
                      shared_memory: bool = True,
                      num_workers: Optional[int] = None,
+                     copy: bool = True,
                      **kwargs) -> VectorEnv:
     """Create a vectorized environment from multiple copies of an environment.
 
@@ -56,6 +57,11 @@ def make_batched_env(base_env: Union[str, Callable],
         AsyncVectorEnv. When `num_workers` != `batch_size`, returns a
         `BatchVectorEnv`.
 
+    copy : bool
+        Wether the vectorized environment returns a copy of its observations at each
+        step (default). When False, the observations are written in-place into the
+        same arrays at each step, which avoids a copy per step.
+
     wrappers : Callable or Iterable of Callables (default: `None`)
         If not `None`, then apply the wrappers to each internal environment
         during creation.
@@ -120,12 +126,14 @@ def make_batched_env(base_env: Union[str, Callable],
                 f"slow. Consider setting the `num_workers` argument, perhaps to "
                 f"the number of CPUs on your machine."
             ))
-        return SyncVectorEnv(env_fns)
+        return SyncVectorEnv(env_fns, copy=copy)
     
     if num_workers == batch_size:
-        return AsyncVectorEnv(env_fns, shared_memory=shared_memory)
+        return AsyncVectorEnv(env_fns, shared_memory=shared_memory, copy=copy)
     
-    return BatchedVectorEnv(env_fns, shared_memory=shared_memory, n_workers=num_workers)
+    return BatchedVectorEnv(
+        env_fns, shared_memory=shared_memory, n_workers=num_workers, copy=copy
+    )
 
    
 
@@ -240,6 +240,13 @@ class ContinualRLSetting(RLSetting, ContinualAssumption):
     # (as does the baseline method).
     add_done_to_observations: bool = False
 
+    # Wether the vectorized environments write their observations in-place into the
+    # same arrays at each step, rather than returning copies. The same `Observations`
+    # object is then returned at each step, so a Method must copy the observations
+    # that it wants to keep (e.g. in a replay buffer). Only has an effect when
+    # `batch_size` is set and `add_done_to_observations` isn't.
+    reuse_observation_buffers: bool = False
+
     # The maximum number of steps per episode. When None, there is no limit.
     max_episode_steps: Optional[int] = None
 
@@ -1102,6 +1109,7 @@ class ContinualRLSetting(RLSetting, ContinualAssumption):
                 num_workers=num_workers,
                 # TODO: Still debugging shared memory + custom spaces (e.g. Sparse).
                 shared_memory=False,
+                copy=not self.reuse_observation_buffers,
             )
         if max_steps:
             env = ActionLimit(env, max_steps=max_steps)
@@ -1124,6 +1132,7 @@ class ContinualRLSetting(RLSetting, ContinualAssumption):
             observations_type=self.Observations,
             rewards_type=self.Rewards,
             actions_type=self.Actions,
+            reuse_observations=self.reuse_observation_buffers and batch_size is not None,
         )
         # Create an IterableDataset from the env using the EnvDataset wrapper.
         dataset = EnvDataset(env)
@@ -631,6 +631,24 @@ def test_fit_and_on_task_switch_calls():
     # == 30 task switches in total.
 
 
+@pytest.mark.parametrize("reuse_observation_buffers", [False, True])
+def test_reuse_observation_buffers(reuse_observation_buffers: bool):
+    setting = ContinualRLSetting(
+        dataset="CartPole-v0",
+        reuse_observation_buffers=reuse_observation_buffers,
+        train_transforms=[],
+    )
+    with setting.train_dataloader(batch_size=2, num_workers=0) as env:
+        first_obs = env.reset()
+        first_x = np.array(first_obs.x, copy=True)
+        obs, *_ = env.step(env.action_space.sample())
+        # The observations are written in-place into the same buffers.
+        assert np.shares_memory(obs.x, first_obs.x) == reuse_observation_buffers
+        assert not np.array_equal(obs.x, first_x)
+        if not reuse_observation_buffers:
+            np.testing.assert_array_equal(first_obs.x, first_x)
+
+
 if MUJOCO_INSTALLED:
     from sequoia.settings.rl.envs.mujoco import (
         ContinualHalfCheetahEnv,
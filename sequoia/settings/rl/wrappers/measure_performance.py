@@ -16,7 +16,8 @@ import numpy as np
 from sequoia.settings.base import Observations, Actions, Rewards
 import wandb
 from torch import Tensor
-from sequoia.utils import add_prefix
+from sequoia.utils.profiling import profile
+from sequoia.utils.wandb_log_queue import wandb_log_queue
 
 
 class MeasureRLPerformanceWrapper(
@@ -87,7 +88,8 @@ class MeasureRLPerformanceWrapper(
                 self._current_episode_reward[0] += reward
                 self._current_episode_steps[0] += 1
 
-            metrics = self.get_metrics(action, reward, done)
+            with profile("metrics", samples=self._batch_size):
+                metrics = self.get_metrics(action, reward, done)
 
             if metrics is not None:
                 assert self._steps not in self._metrics, "two metrics at same step?"
@@ -169,12 +171,13 @@ class MeasureRLPerformanceWrapper(
 
         metric = sum(metrics, Metrics())
         if wandb.run:
-            log_dict = metric.to_log_dict()
-            if self.wandb_prefix:
-                log_dict = add_prefix(log_dict, prefix=self.wandb_prefix, sep="/")
-            log_dict["steps"] = self._steps
-            log_dict["episode"] = self._episodes
-            wandb.log(log_dict)
+            # NOTE: The metrics are logged from a background thread.
+            wandb_log_queue.log(
+                metric,
+                prefix=self.wandb_prefix or "",
+                steps=self._steps,
+                episode=self._episodes,
+            )
 
         return metric
 
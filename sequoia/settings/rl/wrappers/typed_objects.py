@@ -13,6 +13,7 @@ from sequoia.common import Batch
 from sequoia.common.gym_wrappers import IterableWrapper, TransformObservation
 from sequoia.common.spaces import Sparse, TypedDictSpace
 from sequoia.common.spaces.named_tuple import NamedTuple, NamedTupleSpace
+from sequoia.common.spaces.validation import should_validate
 from sequoia.settings.base.environment import Environment
 from sequoia.settings.base.objects import (Actions, ActionType, Observations,
                                            ObservationType, Rewards,
@@ -37,16 +38,36 @@ class TypedObjectsWrapper(IterableWrapper, Environment[ObservationType, ActionTy
     TaskIncrementalSLSetting (which inherits from ClassIncrementalSetting), then
     the observations from that setting should be isinstances (or subclasses of)
     the Observations class that this method was designed to receive!   
+
+    The function used to convert the observations is chosen once per type of
+    observation (and in advance for the type of samples of the observation space), so
+    no type checks are done at each step.
+
+    When `reuse_observations` is True, the wrapper assumes that the wrapped env
+    writes its observations in-place into the same buffers at each step (e.g. a
+    vector env created with `copy=False`). The same `Observations` object, which
+    holds these buffers, is then returned at each step, instead of creating a new
+    one. The observations from previous steps must then be copied by the consumer if
+    they need to be kept.
     """
     def __init__(self,
                  env: gym.Env,
                  observations_type: ObservationType,
                  rewards_type: RewardType,
-                 actions_type: ActionType):
+                 actions_type: ActionType,
+                 reuse_observations: bool = False):
         self.Observations = observations_type
         self.Rewards = rewards_type
         self.Actions = actions_type
+        self.reuse_observations = reuse_observations
         super().__init__(env=env)
+        # Functions used to create the `Observations`, for each type of observation.
+        self._observation_converters: Dict[Type, Callable[[Any], ObservationType]] = {}
+        # The last observation from the env and its buffers, along with the
+        # `Observations` created from them (when `reuse_observations` is True).
+        self._last_observation: Any = None
+        self._last_buffers: Tuple[Any, ...] = ()
+        self._last_typed_observation: Optional[ObservationType] = None
 
         # TODO: Also change the action and reward spaces?
         if isinstance(self.env.observation_space, (TypedDictSpace, NamedTupleSpace)):
@@ -54,6 +75,11 @@ class TypedObjectsWrapper(IterableWrapper, Environment[ObservationType, ActionTy
             self.observation_space = self.env.observation_space
             self.observation_space.dtype = self.Observations
 
+        # Choose the converter for the observations of the observation space now.
+        sample_type = _sample_type(self.observation_space)
+        if sample_type is not None:
+            self._observation_converter(sample_type)
+
         # if isinstance(self.env.observation_space, NamedTupleSpace):
         #     self.observation_space = self.env.observation_space
         #     self.observation_space.dtype = self.Observations
@@ -71,21 +97,57 @@ class TypedObjectsWrapper(IterableWrapper, Environment[ObservationType, ActionTy
         return observation, reward, done, info
 
     def observation(self, observation: Any) -> ObservationType:
-        if isinstance(observation, self.Observations):
-            return observation
-        if isinstance(observation, tuple):
+        if self.reuse_observations:
+            buffers = _buffers(observation)
+            if (
+                observation is self._last_observation
+                and len(buffers) == len(self._last_buffers)
+                and all(a is b for a, b in zip(buffers, self._last_buffers))
+            ):
+                return self._last_typed_observation
+        convert = self._observation_converters.get(type(observation))
+        if convert is None:
+            convert = self._observation_converter(type(observation))
+        typed_observation = convert(observation)
+        if self.reuse_observations:
+            self._last_observation = observation
+            self._last_buffers = buffers
+            self._last_typed_observation = typed_observation
+        return typed_observation
+
+    def _observation_converter(
+        self, observation_type: Type
+    ) -> Callable[[Any], ObservationType]:
+        """ Returns the function used to create `Observations` from observations of
+        type `observation_type`, and saves it for the next observations of that type.
+        """
+        convert: Callable[[Any], ObservationType]
+        if issubclass(observation_type, self.Observations):
+            convert = _identity
+        elif issubclass(observation_type, tuple):
             # TODO: Fix this, shouldn't get tuples like this since it's quite ambiguous.
             # assert False, observation 
-            return self.Observations(*observation)
-        if isinstance(observation, dict):
-            try:
-                return self.Observations(**observation)
-            except TypeError:
-                assert False, (self.Observations, observation)
-        assert isinstance(observation, (Tensor, np.ndarray))
-        return self.Observations(observation)
+            convert = self._observations_from_tuple
+        elif issubclass(observation_type, dict):
+            convert = self._observations_from_dict
+        else:
+            assert issubclass(observation_type, (Tensor, np.ndarray)), observation_type
+            convert = self.Observations
+        self._observation_converters[observation_type] = convert
+        return convert
+
+    def _observations_from_tuple(self, observation: Tuple) -> ObservationType:
+        return self.Observations(*observation)
+
+    def _observations_from_dict(self, observation: Dict) -> ObservationType:
+        try:
+            return self.Observations(**observation)
+        except TypeError:
+            assert False, (self.Observations, observation)
 
     def action(self, action: ActionType) -> Any:
+        if isinstance(action, Actions):
+            return action.y_pred
         return unwrap(action)
     
     def reward(self, reward: Any) -> RewardType:
@@ -110,6 +172,32 @@ class TypedObjectsWrapper(IterableWrapper, Environment[ObservationType, ActionTy
         return self.reward(reward)
 
 
+def _identity(value: T) -> T:
+    return value
+
+
+def _sample_type(space: Space) -> Optional[Type]:
+    """ Returns the type of the samples of `space`, if it is known in advance. """
+    if isinstance(space, (TypedDictSpace, NamedTupleSpace)):
+        return space.dtype
+    if isinstance(space, spaces.Dict):
+        return dict
+    if isinstance(space, spaces.Tuple):
+        return tuple
+    if isinstance(space, (spaces.Box, spaces.MultiDiscrete, spaces.MultiBinary)):
+        return np.ndarray
+    return None
+
+
+def _buffers(observation: Any) -> Tuple[Any, ...]:
+    """ Returns the arrays held by an observation from the env. """
+    if isinstance(observation, Mapping):
+        return tuple(observation.values())
+    if isinstance(observation, tuple):
+        return observation
+    return (observation,)
+
+
 # TODO: turn unwrap into a single-dispatch callable.
 # TODO: Atm 'unwrap' basically means "get rid of everything apart from the first
 # item", which is a bit ugly.
@@ -182,7 +270,8 @@ class NoTypedObjectsWrapper(IterableWrapper):
             action = unwrap(action)
         if hasattr(action, "detach"):
             action = action.detach()
-        assert action in self.action_space, (action, type(action), self.action_space)        
+        if should_validate("NoTypedObjectsWrapper.step"):
+            assert action in self.action_space, (action, type(action), self.action_space)
         observation, reward, done, info = self.env.step(action)
         observation = unwrap(observation)
         reward = unwrap(reward)
@@ -0,0 +1,37 @@
+from functools import partial
+
+import numpy as np
+import pytest
+from gym.vector import SyncVectorEnv
+
+from sequoia.conftest import DummyEnvironment
+from sequoia.settings.base.objects import Actions, Observations, Rewards
+
+from .typed_objects import TypedObjectsWrapper
+
+
+@pytest.mark.parametrize("reuse_observations", [False, True])
+def test_reuse_observations(reuse_observations: bool):
+    env = SyncVectorEnv(
+        [partial(DummyEnvironment, start=i, max_value=10) for i in range(3)],
+        copy=False,
+    )
+    env = TypedObjectsWrapper(
+        env,
+        observations_type=Observations,
+        rewards_type=Rewards,
+        actions_type=Actions,
+        reuse_observations=reuse_observations,
+    )
+    env.seed(123)
+    first_obs = env.reset()
+    assert isinstance(first_obs, Observations)
+    assert first_obs.x.tolist() == [0, 1, 2]
+
+    obs, reward, done, info = env.step(Actions(y_pred=np.ones(3, dtype=int)))
+    assert isinstance(obs, Observations)
+    assert isinstance(reward, Rewards)
+    assert obs.x.tolist() == [1, 2, 3]
+    # The vector env writes the observations in the same buffer (copy=False).
+    assert obs.x is first_obs.x
+    assert (obs is first_obs) == reuse_observations
@@ -35,6 +35,7 @@ from sequoia.settings.assumptions.continual import ContinualAssumption
 from sequoia.settings.base import Method, SettingABC
 from sequoia.settings.sl import SLSetting
 from sequoia.settings.sl.environment import PassiveEnvironment
+from sequoia.settings.sl.dataset_cache import make_cached_dataset
 
 # TODO: When we add other kinds of datasets, then add the obs/action/reward spaces to
 # these dicts.
@@ -552,14 +553,22 @@ class ContinualSLSetting(SLSetting, ContinualAssumption):
 
         if self.dataset in self.available_datasets:
             dataset_class = self.available_datasets[self.dataset]
-            return dataset_class(
-                data_path=data_dir, download=download, train=train, **kwargs
+            return make_cached_dataset(
+                dataset_class,
+                data_path=data_dir,
+                download=download,
+                train=train,
+                **kwargs,
             )
 
         elif self.dataset in self.available_datasets.values():
             dataset_class = self.dataset
-            return dataset_class(
-                data_path=data_dir, download=download, train=train, **kwargs
+            return make_cached_dataset(
+                dataset_class,
+                data_path=data_dir,
+                download=download,
+                train=train,
+                **kwargs,
             )
 
         elif isinstance(self.dataset, Dataset):
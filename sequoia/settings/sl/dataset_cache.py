@@ -0,0 +1,204 @@
+""" On-disk cache of the decoded datasets, shared between Settings and processes.
+
+Many Settings use the same datasets (e.g. the Class-Incremental, Task-Incremental,
+Domain-Incremental and Traditional settings on MNIST), and each of them creates, and
+decodes, its own copy of the dataset in `make_dataset`.
+
+When a cache directory is active (see `dataset_cache`), the arrays returned by the
+dataset's `get_data()` method are saved in that directory the first time the dataset
+is created. The next Settings (possibly in other processes) then load them as
+memory-mapped arrays, without creating the original dataset again. The memory-mapped
+arrays are copy-on-write: the pages of the cache files are shared between processes,
+and any modification stays local to a process.
+
+```python
+with dataset_cache("data/cache"):
+    results = setting.apply(method)
+```
+"""
+import hashlib
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from continuum.datasets import _ContinuumDataset
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+
+_cache_dir: Optional[Path] = None
+
+
+@contextmanager
+def dataset_cache(cache_dir: Optional[Union[str, Path]]) -> Iterator[Optional[Path]]:
+    """ Makes `cache_dir` the active dataset cache directory in this context.
+
+    Passing `None` disables the cache.
+    """
+    global _cache_dir
+    previous = _cache_dir
+    _cache_dir = Path(cache_dir) if cache_dir is not None else None
+    try:
+        yield _cache_dir
+    finally:
+        _cache_dir = previous
+
+
+def get_cache_dir() -> Optional[Path]:
+    return _cache_dir
+
+
+class CachedDataset(_ContinuumDataset):
+    """ Continuum dataset with the data and the properties of another dataset. """
+
+    def __init__(
+        self,
+        data: Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]],
+        data_type: str = "image_array",
+        transformations: List[Callable] = None,
+        class_order: Optional[List[int]] = None,
+        bounding_boxes: Any = None,
+        train: bool = True,
+    ):
+        super().__init__(train=train, download=False)
+        self.data = data
+        self._data_type = data_type
+        self._transformations = transformations
+        self._class_order = class_order
+        self._bounding_boxes = bounding_boxes
+
+    def get_data(self) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        return self.data
+
+    @property
+    def data_type(self) -> str:
+        return self._data_type
+
+    @property
+    def transformations(self):
+        if self._transformations is None:
+            return super().transformations
+        return self._transformations
+
+    @property
+    def class_order(self) -> Optional[List[int]]:
+        return self._class_order
+
+    @property
+    def bounding_boxes(self):
+        return self._bounding_boxes
+
+    def save(self, path: Path) -> None:
+        """ Saves the data and the properties of this dataset in directory `path`.
+
+        The files are first written in a temporary directory, which is then renamed,
+        so that other processes never see a partially-written entry.
+        """
+        path = Path(path)
+        temp_path = path.with_name(f"{path.name}_temp_{os.getpid()}")
+        temp_path.mkdir(parents=True, exist_ok=True)
+        try:
+            x, y, t = self.data
+            np.save(temp_path / "x.npy", np.asarray(x))
+            np.save(temp_path / "y.npy", np.asarray(y))
+            if t is not None:
+                np.save(temp_path / "t.npy", np.asarray(t))
+            properties = {
+                "data_type": self._data_type,
+                "transformations": self._transformations,
+                "class_order": self._class_order,
+                "bounding_boxes": self._bounding_boxes,
+                "train": self.train,
+            }
+            with open(temp_path / "properties.pkl", "wb") as f:
+                pickle.dump(properties, f)
+            try:
+                temp_path.rename(path)
+            except OSError:
+                # Another process already saved this entry: discard this copy.
+                pass
+        finally:
+            if temp_path.exists():
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: Path) -> "CachedDataset":
+        """ Loads a dataset saved with `save`, with memory-mapped (copy-on-write)
+        arrays.
+        """
+        path = Path(path)
+        with open(path / "properties.pkl", "rb") as f:
+            properties = pickle.load(f)
+        x = np.load(path / "x.npy", mmap_mode="c")
+        y = np.load(path / "y.npy", mmap_mode="c")
+        t_path = path / "t.npy"
+        t = np.load(t_path, mmap_mode="c") if t_path.exists() else None
+        return cls(data=(x, y, t), **properties)
+
+
+def make_cached_dataset(
+    dataset_class: Callable[..., _ContinuumDataset], **kwargs
+) -> _ContinuumDataset:
+    """ Creates the dataset `dataset_class(**kwargs)`, or loads it from the active
+    cache directory.
+
+    When no cache directory is active, this just creates the dataset.
+    """
+    cache_dir = _cache_dir
+    if cache_dir is None:
+        return dataset_class(**kwargs)
+
+    path = cache_dir / _cache_key(dataset_class, **kwargs)
+    if path.exists():
+        logger.debug(f"Loading dataset from the cache at {path}")
+        return CachedDataset.load(path)
+
+    dataset = dataset_class(**kwargs)
+    if dataset.need_class_remapping or dataset.data_type == "image_path":
+        # NOTE: Not caching the datasets that remap their classes, since the remapping
+        # isn't part of the data, or the datasets that only hold paths to the images.
+        return dataset
+    logger.info(f"Saving dataset {dataset} to the cache at {path}")
+    try:
+        CachedDataset(
+            data=dataset.get_data(),
+            data_type=dataset.data_type,
+            transformations=dataset.transformations,
+            class_order=dataset.class_order,
+            bounding_boxes=dataset.bounding_boxes,
+            train=dataset.train,
+        ).save(path)
+    except (OSError, pickle.PicklingError, AttributeError, TypeError) as exc:
+        logger.warning(
+            RuntimeWarning(f"Unable to save dataset {dataset} to the cache: {exc}")
+        )
+        return dataset
+    return CachedDataset.load(path)
+
+
+def prepare_datasets(settings: Iterable[Any], cache_dir: Union[str, Path]) -> None:
+    """ Downloads the datasets of the given (SL) settings, and saves them in the cache.
+
+    This can be used before running the Settings in different processes, so that each
+    dataset is only downloaded and decoded once.
+    """
+    with dataset_cache(cache_dir):
+        for setting in settings:
+            if hasattr(setting, "make_dataset"):
+                setting.prepare_data()
+
+
+def _cache_key(dataset_class: Callable[..., _ContinuumDataset], **kwargs) -> str:
+    # NOTE: The data path and the `download` argument don't change the data.
+    kwargs = {k: v for k, v in kwargs.items() if k not in {"data_path", "download"}}
+    name = getattr(dataset_class, "__qualname__", type(dataset_class).__name__)
+    module = getattr(dataset_class, "__module__", "")
+    key = f"{module}.{name}:{sorted(kwargs.items())!r}"
+    digest = hashlib.md5(key.encode()).hexdigest()[:10]
+    split = "train" if kwargs.get("train", True) else "test"
+    return f"{name}_{split}_{digest}"
@@ -0,0 +1,63 @@
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+from continuum.datasets import _ContinuumDataset
+
+from .dataset_cache import CachedDataset, dataset_cache, make_cached_dataset
+
+
+class FakeDataset(_ContinuumDataset):
+    created: int = 0
+
+    def __init__(self, data_path: str = "", train: bool = True, download: bool = True):
+        super().__init__(data_path=data_path, train=train, download=download)
+        FakeDataset.created += 1
+        n = 10 if train else 5
+        self.x = np.random.randint(0, 255, size=(n, 4, 4, 3), dtype=np.uint8)
+        self.y = np.arange(n) % 2
+
+    def get_data(self):
+        return self.x, self.y, None
+
+    @property
+    def class_order(self):
+        return [1, 0]
+
+
+def test_dataset_is_only_created_once(tmp_path: Path):
+    FakeDataset.created = 0
+    # Without a cache, the dataset is created each time.
+    make_cached_dataset(FakeDataset, data_path=tmp_path, train=True)
+    assert FakeDataset.created == 1
+
+    with dataset_cache(tmp_path / "cache"):
+        first = make_cached_dataset(FakeDataset, data_path=tmp_path, train=True)
+        assert FakeDataset.created == 2
+        second = make_cached_dataset(FakeDataset, data_path=tmp_path, train=True)
+        assert FakeDataset.created == 2
+        test = make_cached_dataset(FakeDataset, data_path=tmp_path, train=False)
+        assert FakeDataset.created == 3
+
+    assert isinstance(second, CachedDataset)
+    x, y, t = second.get_data()
+    assert np.array_equal(x, first.get_data()[0])
+    assert y.tolist() == [0, 1] * 5
+    assert t is None
+    assert second.class_order == [1, 0]
+    assert len(test.get_data()[0]) == 5
+    # The arrays are copy-on-write: modifying them doesn't change the cache.
+    x[0] = 0
+    with dataset_cache(tmp_path / "cache"):
+        third = make_cached_dataset(FakeDataset, data_path=tmp_path, train=True)
+    assert np.array_equal(third.get_data()[0], first.get_data()[0])
+
+
+def test_failed_save_removes_the_temporary_directory(tmp_path: Path):
+    x, y, t = FakeDataset(data_path=str(tmp_path)).get_data()
+    # A transformation that can't be pickled.
+    dataset = CachedDataset(data=(x, y, t), transformations=[lambda x: x])
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        dataset.save(tmp_path / "entry")
+    assert list(tmp_path.iterdir()) == []
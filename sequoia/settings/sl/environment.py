@@ -21,6 +21,7 @@ from sequoia.common.gym_wrappers.convert_tensors import add_tensor_support
 from sequoia.common.transforms import Compose, Transforms
 from sequoia.common.spaces import Image
 from sequoia.utils.logging_utils import get_logger
+from sequoia.utils.profiling import get_batch_size, profile, profile_iterator
 from ..base.environment import (
     Actions,
     ActionType,
@@ -290,10 +291,12 @@ class PassiveEnvironment(
             raise gym.error.ClosedEnvironmentError("Can't get the next batch: Env is closed.")
         if self._iterator is None:
             self._iterator = super().__iter__()
-        try:
-            batch = next(self._iterator)
-        except StopIteration:
-            batch = None
+        with profile("data_loading") as measurement:
+            try:
+                batch = next(self._iterator)
+            except StopIteration:
+                batch = None
+            measurement.samples = get_batch_size(batch)
 
         if self.split_batch_fn and batch is not None:
             batch = self.split_batch_fn(batch)
@@ -403,7 +406,7 @@ class PassiveEnvironment(
         if self._is_closed:
             raise gym.error.ClosedEnvironmentError("Can't iterate over closed env.")
 
-        for batch in super().__iter__():
+        for batch in profile_iterator(super().__iter__(), "data_loading"):
 
             if self.split_batch_fn:
                 observations, rewards = self.split_batch_fn(batch)
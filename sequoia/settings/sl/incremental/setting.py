@@ -19,9 +19,21 @@ Class-Incremental definition from [iCaRL](https://arxiv.org/abs/1611.07725):
         seen so far."
 """
 import itertools
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple, Type, Union
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 import wandb
 import gym
 import numpy as np
@@ -71,6 +83,7 @@ from sequoia.utils import get_logger
 from sequoia.settings.sl.environment import Actions, PassiveEnvironment, Rewards
 from sequoia.settings.sl.setting import SLSetting
 from sequoia.settings.sl.continual import ContinualSLSetting
+from sequoia.settings.sl.dataset_cache import make_cached_dataset
 from sequoia.settings.sl.wrappers import MeasureSLPerformanceWrapper
 from sequoia.settings.rl.wrappers import HideTaskLabelsWrapper
 from continuum.tasks import concat
@@ -306,6 +319,24 @@ class IncrementalSLSetting(IncrementalAssumption, DiscreteTaskAgnosticSLSetting)
         self.test_env = test_env
         return self.test_env
 
+    @contextmanager
+    def _testing_only_on_tasks(self, task_ids: List[int]) -> Iterator[None]:
+        """ Context manager in which the test environment only contains the test
+        datasets of the given tasks.
+        """
+        if not self.has_prepared_data:
+            self.prepare_data()
+        if not self.has_setup_test:
+            self.setup("test")
+        test_datasets = self.test_datasets
+        self.test_datasets = [test_datasets[task_id] for task_id in task_ids]
+        self._test_task_ids = list(task_ids)
+        try:
+            yield
+        finally:
+            self.test_datasets = test_datasets
+            self._test_task_ids = None
+
     def split_batch_function(
         self, training: bool
     ) -> Callable[[Tuple[Tensor, ...]], Tuple[Observations, Rewards]]:
@@ -387,14 +418,22 @@ class IncrementalSLSetting(IncrementalAssumption, DiscreteTaskAgnosticSLSetting)
 
         if self.dataset in self.available_datasets:
             dataset_class = self.available_datasets[self.dataset]
-            return dataset_class(
-                data_path=data_dir, download=download, train=train, **kwargs
+            return make_cached_dataset(
+                dataset_class,
+                data_path=data_dir,
+                download=download,
+                train=train,
+                **kwargs,
             )
 
         elif self.dataset in self.available_datasets.values():
             dataset_class = self.dataset
-            return dataset_class(
-                data_path=data_dir, download=download, train=train, **kwargs
+            return make_cached_dataset(
+                dataset_class,
+                data_path=data_dir,
+                download=download,
+                train=train,
+                **kwargs,
             )
 
         elif isinstance(self.dataset, Dataset):
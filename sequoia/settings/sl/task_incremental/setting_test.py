@@ -8,6 +8,7 @@ import numpy as np
 import pytest
 import torch
 import torch.multiprocessing as mp
+from gym import Space
 from torch import Tensor
 from torch.utils.data import DataLoader, IterableDataset
 from torchvision.transforms import Compose, ToTensor
@@ -23,7 +24,7 @@ from ..incremental.setting_test import (
 )
 
 logger = get_logger(__file__)
-from sequoia.settings import Setting
+from sequoia.settings import Actions, Observations, Setting
 
 
 class TestTaskIncrementalSLSetting(IncrementalSLSettingTests):
@@ -207,3 +208,90 @@ def test_action_space_always_matches_obs_batch_size(config: Config):
     assert sum(method.batch_sizes) == total_samples * nb_tasks
     assert len(method.batch_sizes) == math.ceil(total_samples / batch_size) * nb_tasks
     assert set(method.batch_sizes) == {batch_size, total_samples % batch_size}
+
+
+class FrozenPreviousTasksMethod(OtherDummyMethod):
+    """ Dummy Method that reports its predictions on the previous tasks as unchanged.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.training_task_id: Optional[int] = None
+        self.tested_task_ids: List[int] = []
+
+    def on_task_switch(self, task_id: Optional[int]) -> None:
+        if self.training:
+            self.training_task_id = task_id
+        else:
+            self.tested_task_ids.append(task_id)
+
+    def get_unchanged_test_tasks(self, setting: Setting) -> List[int]:
+        return list(range(self.training_task_id))
+
+
+def test_unchanged_test_tasks_are_not_tested_again(config: Config):
+    nb_tasks = 3
+    setting = TaskIncrementalSLSetting(
+        dataset="mnist", nb_tasks=nb_tasks, batch_size=128, num_workers=0,
+    )
+    method = FrozenPreviousTasksMethod()
+    results = setting.apply(method, config=config)
+
+    # Test loop after task 0: all tasks. After task 1: tasks 1 and 2. After task 2:
+    # only task 2.
+    assert method.tested_task_ids == [0, 1, 2, 1, 2, 2]
+    task_sequence_results = results.task_sequence_results
+    assert len(task_sequence_results) == nb_tasks
+    for i in range(1, nb_tasks):
+        for task_id in range(i):
+            assert (
+                task_sequence_results[i].task_results[task_id]
+                is task_sequence_results[i - 1].task_results[task_id]
+            )
+    # The test datasets of the setting are restored after each test loop.
+    assert len(setting.test_datasets) == nb_tasks
+
+
+class DeterministicMethod(OtherDummyMethod):
+    """ Dummy Method whose predictions only depend on the observations. """
+
+    def __init__(self):
+        super().__init__()
+        self.tested_task_ids: List[int] = []
+
+    def get_actions(self, observations: Observations, action_space: Space) -> Actions:
+        x = observations.x.reshape(observations.x.shape[0], -1)
+        y_pred = (x.sum(1) * 100).long() % action_space.nvec[0]
+        return y_pred.numpy()
+
+    def on_task_switch(self, task_id: Optional[int]) -> None:
+        if not self.training:
+            self.tested_task_ids.append(task_id)
+
+
+def test_sharded_test_loop_gives_same_results(config: Config):
+    setting = TaskIncrementalSLSetting(
+        dataset="mnist", nb_tasks=2, batch_size=9, num_workers=0, test_workers=2,
+    )
+    setting.prepare_data()
+    setting.setup()
+    # NOTE: When a batch contains samples from two tasks, the serial test loop counts
+    # it in the first task, so we use a batch size that divides the size of the
+    # first task.
+    assert len(setting.test_datasets[0]) % setting.batch_size == 0
+
+    method = DeterministicMethod()
+    method.set_testing()
+    serial_results = setting.test_loop(method)
+    assert method.tested_task_ids == [0, 1]
+
+    sharded_results = setting._run_test_loop(method)
+    # The Method of the current process isn't used by the workers.
+    assert method.tested_task_ids == [0, 1]
+    assert len(sharded_results.task_results) == 2
+    for serial, sharded in zip(
+        serial_results.average_metrics_per_task,
+        sharded_results.average_metrics_per_task,
+    ):
+        assert serial.n_samples == sharded.n_samples
+        assert serial.accuracy == sharded.accuracy
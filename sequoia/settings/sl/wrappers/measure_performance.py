@@ -24,7 +24,8 @@ from sequoia.common.metrics import ClassificationMetrics, Metrics, MetricsType
 from sequoia.common.metrics.rl_metrics import EpisodeMetrics
 from sequoia.settings.base import Actions, Environment, Observations, Rewards
 from sequoia.settings.sl.environment import PassiveEnvironment
-from sequoia.utils.utils import add_prefix
+from sequoia.utils.profiling import get_batch_size, profile
+from sequoia.utils.wandb_log_queue import wandb_log_queue
 from torch import Tensor
 from sequoia.common.gym_wrappers.batch_env.tile_images import tile_images
 
@@ -126,18 +127,18 @@ class MeasureSLPerformanceWrapper(
         return reward
 
     def get_metrics(self, action: Actions, reward: Rewards) -> Metrics:
-        assert action.y_pred.shape == reward.y.shape, (action.shapes, reward.shapes)
-        metric = ClassificationMetrics(
-            y_pred=action.y_pred, y=reward.y, num_classes=self.n_classes
-        )
-
-        if wandb.run:
-            log_dict = metric.to_log_dict()
-            if self.wandb_prefix:
-                log_dict = add_prefix(log_dict, prefix=self.wandb_prefix, sep="/")
-            log_dict["steps"] = self._steps
-            wandb.log(log_dict)
-        return metric
+        with profile("metrics", samples=get_batch_size(reward)):
+            assert action.y_pred.shape == reward.y.shape, (action.shapes, reward.shapes)
+            metric = ClassificationMetrics(
+                y_pred=action.y_pred, y=reward.y, num_classes=self.n_classes
+            )
+
+            if wandb.run:
+                # NOTE: The metrics are logged from a background thread.
+                wandb_log_queue.log(
+                    metric, prefix=self.wandb_prefix or "", steps=self._steps
+                )
+            return metric
 
     def __iter__(self) -> Iterable[Tuple[Observations, Optional[Rewards]]]:
         if self.__epochs == 1 and self.first_epoch_only:
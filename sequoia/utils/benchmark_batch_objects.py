@@ -0,0 +1,55 @@
+""" Utility script used to benchmark the overhead of the `Batch` objects (e.g.
+`Observations`, `Actions`, `Rewards`), for the operations that are done at every
+step of the training / test loops.
+"""
+import timeit
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import torch
+from torch import Tensor
+
+from sequoia.common.batch import Batch
+
+
+@dataclass(frozen=True)
+class Observations(Batch):
+    x: Tensor
+    task_labels: Optional[Tensor] = None
+    done: Optional[Tensor] = None
+
+
+def benchmark(batch_size: int = 32, n_steps: int = 10_000) -> Dict[str, float]:
+    """ Returns the average time (in microseconds) taken by each operation. """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    observations = Observations(
+        x=torch.rand(batch_size, 3, 32, 32, device=device),
+        task_labels=torch.zeros(batch_size, dtype=int, device=device),
+        done=torch.zeros(batch_size, dtype=bool, device=device),
+    )
+    operations: Dict[str, Callable] = {
+        "create": lambda: Observations(*observations.values()),
+        "getitem (str)": lambda: observations["x"],
+        "getitem (int)": lambda: observations[0],
+        "values": observations.values,
+        "device": lambda: Observations(*observations.values()).device,
+        "batch_size": lambda: Observations(*observations.values()).batch_size,
+        "to (same device)": lambda: observations.to(device, non_blocking=True),
+        "to (dtype)": lambda: observations.to(dtype=torch.float),
+        "detach": observations.detach,
+    }
+    return {
+        name: timeit.timeit(operation, number=n_steps) / n_steps * 1e6
+        for name, operation in operations.items()
+    }
+
+
+def main():
+    # NOTE: The "device" and "batch_size" operations include the time to create the
+    # object, since these properties are cached on the instances.
+    for name, micro_seconds in benchmark().items():
+        print(f"{name:<20}: {micro_seconds:8.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
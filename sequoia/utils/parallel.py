@@ -0,0 +1,68 @@
+""" Runs independent jobs (e.g. applying a Method on different Settings) in a pool of
+local processes.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import torch
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+T = TypeVar("T")
+
+
+def run_in_processes(
+    fn: Callable[..., T],
+    jobs: List[Dict[str, Any]],
+    n_workers: int = 1,
+    threads_per_worker: Optional[int] = None,
+) -> List[T]:
+    """ Calls `fn(**job)` for each job, using a pool of `n_workers` processes.
+
+    Parameters
+    ----------
+    fn : Callable[..., T]
+        The function to call. Must be picklable (e.g. defined at the module level).
+    jobs : List[Dict[str, Any]]
+        The keyword arguments of each call. Each worker gets its own copy of them.
+    n_workers : int, optional
+        Number of processes to use. When 1 (default), the jobs are run sequentially in
+        the current process.
+    threads_per_worker : int, optional
+        Number of threads that torch (and OpenMP / MKL) can use in each worker. By
+        default, the CPUs are split evenly between the workers.
+
+    Returns
+    -------
+    List[T]
+        The results of each job, in the same order as `jobs`.
+    """
+    if n_workers <= 1 or len(jobs) <= 1:
+        return [fn(**job) for job in jobs]
+
+    n_workers = min(n_workers, len(jobs))
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // n_workers)
+    logger.info(
+        f"Running {len(jobs)} jobs in {n_workers} processes, with "
+        f"{threads_per_worker} threads each."
+    )
+    # NOTE: Using "spawn" rather than "fork", since CUDA can't be used in forked
+    # processes once it has been initialized.
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker,),
+    ) as executor:
+        futures = [executor.submit(fn, **job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def _init_worker(threads_per_worker: int) -> None:
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads_per_worker)
+    torch.set_num_threads(threads_per_worker)
@@ -0,0 +1,23 @@
+import os
+
+import torch
+
+from .parallel import run_in_processes
+
+
+def _job(x: int) -> tuple:
+    return x * x, os.getpid(), torch.get_num_threads()
+
+
+def test_run_in_processes():
+    jobs = [dict(x=i) for i in range(4)]
+    results = run_in_processes(_job, jobs, n_workers=2, threads_per_worker=1)
+    assert [square for square, _, _ in results] == [0, 1, 4, 9]
+    # The jobs ran in other processes, with the given number of threads.
+    assert all(pid != os.getpid() for _, pid, _ in results)
+    assert all(n_threads == 1 for _, _, n_threads in results)
+
+
+def test_run_sequentially():
+    results = run_in_processes(_job, [dict(x=3)], n_workers=1)
+    assert results == [(9, os.getpid(), torch.get_num_threads())]
@@ -0,0 +1,232 @@
+""" Lightweight profiler of the wall-clock and CPU time spent in each phase of a run.
+
+The `main_loop` of the incremental Settings activates a `Profiler`, and the different
+components of a run (training and test loops, environments, performance wrappers)
+report the time they spend into the active profiler, using the `profile` context
+manager:
+
+```python
+with profile("get_actions", samples=batch_size):
+    actions = method.get_actions(observations, action_space)
+```
+
+The measurements are attributed to the current task of the profiler (the task being
+trained on). When no profiler is active, `profile` doesn't measure anything.
+
+NOTE: Phases can be nested (e.g. "data_loading" happens during "fit"). The time of a
+phase includes the time of the phases nested in it. The CPU time only includes the
+time of the current process, while the wall-clock time also includes the time spent
+waiting on other processes (e.g. dataloader workers or vectorized environments).
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, ContextManager, Dict, Iterable, Iterator, Optional, TypeVar
+
+from sequoia.utils.logging_utils import get_logger
+
+logger = get_logger(__file__)
+T = TypeVar("T")
+
+_active_profiler: Optional["Profiler"] = None
+
+
+@dataclass
+class PhaseStats:
+    """ Time spent in a phase, and number of samples processed during that time. """
+
+    # Number of times the phase was entered.
+    calls: int = 0
+    # Total wall-clock time spent in the phase, in seconds.
+    wall_time: float = 0.0
+    # Total CPU time (of the current process) spent in the phase, in seconds.
+    cpu_time: float = 0.0
+    # Total number of samples (or environment steps) processed during the phase.
+    samples: int = 0
+
+    @property
+    def samples_per_second(self) -> Optional[float]:
+        if not self.samples or not self.wall_time:
+            return None
+        return self.samples / self.wall_time
+
+    def __add__(self, other: "PhaseStats") -> "PhaseStats":
+        if not isinstance(other, PhaseStats):
+            return NotImplemented
+        return PhaseStats(
+            calls=self.calls + other.calls,
+            wall_time=self.wall_time + other.wall_time,
+            cpu_time=self.cpu_time + other.cpu_time,
+            samples=self.samples + other.samples,
+        )
+
+    def to_log_dict(self) -> Dict[str, float]:
+        log_dict = {
+            "calls": self.calls,
+            "wall time (seconds)": self.wall_time,
+            "cpu time (seconds)": self.cpu_time,
+        }
+        if self.samples:
+            log_dict["samples"] = self.samples
+            log_dict["samples per second"] = self.samples_per_second
+        return log_dict
+
+
+class Measurement:
+    """ Object given by `profile`, used to set the number of samples processed in a
+    phase when it isn't known in advance (e.g. the size of the next batch).
+    """
+
+    __slots__ = ("samples",)
+
+    def __init__(self, samples: int = 0):
+        self.samples = samples
+
+
+class Profiler:
+    """ Accumulates the time spent in each phase, for each task. """
+
+    def __init__(self):
+        # Stats for each phase, for each task (None when outside of a task).
+        self.stats: Dict[str, Dict[Optional[int], PhaseStats]] = defaultdict(dict)
+        # Task to which the measurements are currently attributed.
+        self.task_id: Optional[int] = None
+
+    def record(
+        self, phase: str, wall_time: float, cpu_time: float, samples: int = 0
+    ) -> None:
+        """ Adds a measurement for `phase`, attributed to the current task. """
+        self._record(phase, self.task_id, wall_time, cpu_time, samples)
+
+    @contextmanager
+    def phase(self, phase: str, samples: int = 0) -> Iterator[Measurement]:
+        """ Measures the time spent in the block, and records it for `phase`.
+
+        The measurement is attributed to the current task when entering the block.
+        """
+        task_id = self.task_id
+        measurement = Measurement(samples)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield measurement
+        finally:
+            self._record(
+                phase,
+                task_id,
+                wall_time=time.perf_counter() - wall_start,
+                cpu_time=time.process_time() - cpu_start,
+                samples=measurement.samples,
+            )
+
+    def _record(
+        self,
+        phase: str,
+        task_id: Optional[int],
+        wall_time: float,
+        cpu_time: float,
+        samples: int = 0,
+    ) -> None:
+        phase_stats = self.stats[phase]
+        stats = phase_stats.get(task_id)
+        if stats is None:
+            stats = phase_stats[task_id] = PhaseStats()
+        stats.calls += 1
+        stats.wall_time += wall_time
+        stats.cpu_time += cpu_time
+        stats.samples += int(samples)
+
+    @contextmanager
+    def activate(self) -> Iterator["Profiler"]:
+        """ Makes this the active profiler, which `profile` reports into. """
+        global _active_profiler
+        previous_profiler = _active_profiler
+        _active_profiler = self
+        try:
+            yield self
+        finally:
+            _active_profiler = previous_profiler
+
+    def total(self, phase: str) -> PhaseStats:
+        """ Returns the stats of `phase`, summed over all tasks. """
+        return sum(self.stats.get(phase, {}).values(), PhaseStats())
+
+    def to_log_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """ Returns the stats of each phase, for each task and in total. """
+        log_dict: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for phase, phase_stats in self.stats.items():
+            task_ids = sorted(task_id for task_id in phase_stats if task_id is not None)
+            phase_dict = {
+                f"Task {task_id}": phase_stats[task_id].to_log_dict()
+                for task_id in task_ids
+            }
+            phase_dict["Total"] = self.total(phase).to_log_dict()
+            log_dict[phase] = phase_dict
+        return log_dict
+
+
+def get_active_profiler() -> Optional[Profiler]:
+    return _active_profiler
+
+
+def profile(phase: str, samples: int = 0) -> ContextManager[Measurement]:
+    """ Measures the time spent in the block, if there is an active profiler. """
+    if _active_profiler is None:
+        return _NullPhase(samples)
+    return _active_profiler.phase(phase, samples=samples)
+
+
+def profile_iterator(
+    iterable: Iterable[T], phase: str, samples: int = None
+) -> Iterator[T]:
+    """ Yields the items from `iterable`, measuring the time taken to produce each one.
+
+    When `samples` isn't given, the number of samples in each item is inferred using
+    `get_batch_size`.
+    """
+    iterator = iter(iterable)
+    while True:
+        profiler = _active_profiler
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        if profiler is not None:
+            profiler.record(
+                phase,
+                wall_time=time.perf_counter() - wall_start,
+                cpu_time=time.process_time() - cpu_start,
+                samples=get_batch_size(item) if samples is None else samples,
+            )
+        yield item
+
+
+def get_batch_size(batch: Any) -> int:
+    """ Returns the number of samples in `batch` (0 if it can't be determined). """
+    if isinstance(batch, (list, tuple)):
+        return get_batch_size(batch[0]) if batch else 0
+    batch_size = getattr(batch, "batch_size", None)
+    if isinstance(batch_size, int):
+        return batch_size
+    shape = getattr(batch, "shape", None)
+    if shape:
+        return int(shape[0])
+    return 0
+
+
+class _NullPhase:
+    """ Context manager used by `profile` when there is no active profiler. """
+
+    __slots__ = ("measurement",)
+
+    def __init__(self, samples: int = 0):
+        self.measurement = Measurement(samples)
+
+    def __enter__(self) -> Measurement:
+        return self.measurement
+
+    def __exit__(self, *args) -> None:
+        return None
@@ -0,0 +1,40 @@
+import time
+
+import torch
+
+from .profiling import Profiler, get_active_profiler, profile, profile_iterator
+
+
+def test_profile_does_nothing_without_active_profiler():
+    assert get_active_profiler() is None
+    with profile("foo", samples=3) as measurement:
+        measurement.samples = 4
+    assert list(profile_iterator(range(3), "bar")) == [0, 1, 2]
+
+
+def test_profiler_records_phases_per_task():
+    profiler = Profiler()
+    with profiler.activate():
+        assert get_active_profiler() is profiler
+        with profile("main_loop"):
+            for task_id in range(2):
+                profiler.task_id = task_id
+                with profile("fit"):
+                    time.sleep(0.01)
+                batches = [torch.zeros(4, 2), torch.zeros(3, 2)]
+                assert len(list(profile_iterator(batches, "data_loading"))) == 2
+            profiler.task_id = None
+    assert get_active_profiler() is None
+
+    log_dict = profiler.to_log_dict()
+    assert set(log_dict) == {"main_loop", "fit", "data_loading"}
+    # The main loop was entered outside of any task.
+    assert list(log_dict["main_loop"]) == ["Total"]
+    assert list(log_dict["fit"]) == ["Task 0", "Task 1", "Total"]
+    assert log_dict["fit"]["Task 0"]["calls"] == 1
+    assert log_dict["fit"]["Task 0"]["wall time (seconds)"] >= 0.01
+    assert log_dict["data_loading"]["Task 1"]["samples"] == 7
+    assert log_dict["data_loading"]["Total"]["samples"] == 14
+    assert log_dict["data_loading"]["Total"]["calls"] == 4
+    total = profiler.total("main_loop")
+    assert total.wall_time >= profiler.total("fit").wall_time
@@ -0,0 +1,204 @@
+""" Queue used to log metrics to wandb from a background thread.
+
+Calling `wandb.log` at every step of the environment can take a significant fraction
+of the time of a step, for fast environments. The performance wrappers instead add
+their `Metrics` to the `wandb_log_queue`. A background thread then aggregates the
+metrics logged with the same prefix over a window of steps (and/or of time) and calls
+`wandb.log` with the aggregated metrics.
+
+The queue is drained (i.e. all the pending metrics are logged) when calling `flush`,
+which the Settings do at the end of each task, and when the wrappers are closed.
+
+The queue can be used from forked processes (e.g. the workers of an HPO sweep): a
+process that didn't start the background thread starts its own, and the metrics still
+pending in the parent when forking are not logged by the child.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import wandb
+from sequoia.common.metrics import Metrics
+from sequoia.utils.logging_utils import get_logger
+from sequoia.utils.utils import add_prefix
+
+logger = get_logger(__file__)
+
+# Items put in the queue to ask the background thread to flush / stop.
+_FLUSH = object()
+_STOP = object()
+
+
+@dataclass
+class _Window:
+    """ Metrics logged with a given prefix, aggregated since the last flush. """
+
+    metrics: Metrics
+    # Extra values to log (e.g. the current step). The most recent values are kept.
+    extras: Dict[str, Any] = field(default_factory=dict)
+    steps: int = 1
+    start_time: float = field(default_factory=time.monotonic)
+
+
+class WandbLogQueue:
+    """ Logs metrics to wandb from a background thread, aggregating them over windows.
+
+    Parameters
+    ----------
+    window_steps : int, optional
+        Number of calls to `log` (with the same prefix) over which the metrics are
+        aggregated before being logged. By default 1, in which case the metrics are
+        logged for every step, but still from the background thread.
+    window_seconds : float, optional
+        Maximum duration of a window, in seconds. When non-zero, the aggregated
+        metrics are logged after that amount of time, even if the window doesn't have
+        `window_steps` steps yet. By default 0, i.e. no limit.
+    log_fn : Callable[[Dict], None], optional
+        Function used to log the dicts. Defaults to `wandb.log`.
+    """
+
+    def __init__(
+        self,
+        window_steps: int = 1,
+        window_seconds: float = 0.0,
+        log_fn: Callable[[Dict], None] = None,
+    ):
+        self.window_steps = window_steps
+        self.window_seconds = window_seconds
+        self.log_fn = log_fn
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        # Id of the process in which the queue (and the thread) were created.
+        self._pid = os.getpid()
+
+    def log(self, metrics: Metrics, prefix: str = "", **extras: Any) -> None:
+        """ Adds `metrics` to the window of `prefix`.
+
+        The `extras` are logged along with the aggregated metrics of the window (the
+        most recent values are used).
+        """
+        self._start_thread()
+        self._queue.put((prefix, metrics, extras))
+
+    def flush(self) -> None:
+        """ Logs all the pending metrics, and waits until this is done. """
+        self._reset_after_fork()
+        if self._thread is None:
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self) -> None:
+        """ Logs all the pending metrics, and stops the background thread. """
+        self._reset_after_fork()
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join()
+
+    def _reset_after_fork(self) -> None:
+        # NOTE: A forked process inherits the queue and the thread attribute, but not
+        # the thread itself, so nothing would consume the queue in the child.
+        if self._pid == os.getpid():
+            return
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _start_thread(self) -> None:
+        self._reset_after_fork()
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="WandbLogQueue", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        windows: Dict[str, _Window] = {}
+        while True:
+            timeout: Optional[float] = None
+            if self.window_seconds and windows:
+                oldest = min(window.start_time for window in windows.values())
+                timeout = max(0.0, oldest + self.window_seconds - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_windows(windows, expired_only=True)
+                continue
+            try:
+                if item is _FLUSH:
+                    self._flush_windows(windows)
+                elif item is _STOP:
+                    self._flush_windows(windows)
+                    return
+                else:
+                    self._add_to_window(windows, *item)
+            except Exception:
+                # NOTE: Don't let the thread die, otherwise `flush` would hang.
+                logger.exception("Unable to aggregate the metrics:")
+            finally:
+                self._queue.task_done()
+
+    def _add_to_window(
+        self,
+        windows: Dict[str, _Window],
+        prefix: str,
+        metrics: Metrics,
+        extras: Dict[str, Any],
+    ) -> None:
+        window = windows.get(prefix)
+        if window is None:
+            windows[prefix] = window = _Window(metrics, extras)
+        else:
+            window.metrics = window.metrics + metrics
+            window.extras.update(extras)
+            window.steps += 1
+        if window.steps >= self.window_steps:
+            self._flush_windows(windows, prefixes=[prefix])
+        elif self.window_seconds:
+            self._flush_windows(windows, expired_only=True)
+
+    def _flush_windows(
+        self,
+        windows: Dict[str, _Window],
+        prefixes: Iterable[str] = None,
+        expired_only: bool = False,
+    ) -> None:
+        now = time.monotonic()
+        for prefix in list(windows if prefixes is None else prefixes):
+            window = windows[prefix]
+            if expired_only and now - window.start_time < self.window_seconds:
+                continue
+            del windows[prefix]
+            log_dict = window.metrics.to_log_dict()
+            if prefix:
+                log_dict = add_prefix(log_dict, prefix=prefix, sep="/")
+            log_dict.update(window.extras)
+            try:
+                self._log(log_dict)
+            except Exception:
+                logger.exception(f"Unable to log the metrics with prefix {prefix!r}:")
+
+    def _log(self, log_dict: Dict) -> None:
+        if self.log_fn is not None:
+            self.log_fn(log_dict)
+            return
+        if wandb.run:
+            wandb.log(log_dict)
+
+
+# Queue shared by the performance wrappers. Configured by the Settings using the
+# options of their `WandbConfig`.
+wandb_log_queue = WandbLogQueue()
+atexit.register(wandb_log_queue.close)
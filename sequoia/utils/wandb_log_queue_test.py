@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import time
+from typing import Dict, List
+
+import pytest
+
+from sequoia.common.metrics.rl_metrics import EpisodeMetrics
+
+from .wandb_log_queue import WandbLogQueue
+
+
+def episode(reward: float) -> EpisodeMetrics:
+    return EpisodeMetrics(
+        n_samples=1, mean_episode_reward=reward, mean_episode_length=1
+    )
+
+
+def test_metrics_are_aggregated_over_window():
+    logged: List[Dict] = []
+    log_queue = WandbLogQueue(window_steps=3, log_fn=logged.append)
+    for step in range(7):
+        log_queue.log(episode(float(step)), prefix="Train", steps=step)
+    log_queue.log(episode(10.0), prefix="Valid", steps=0)
+    log_queue.flush()
+
+    train_logs = [d for d in logged if "Train/Mean reward per episode" in d]
+    assert [d["steps"] for d in train_logs] == [2, 5, 6]
+    assert [d["Train/Mean reward per episode"] for d in train_logs] == [1.0, 4.0, 6.0]
+    assert [d["Train/Episodes"] for d in train_logs] == [3, 3, 1]
+    # The metrics with a different prefix are aggregated separately, and flushed.
+    valid_log = logged[-1]
+    assert valid_log["Valid/Mean reward per episode"] == 10.0
+    assert valid_log["steps"] == 0
+    log_queue.close()
+
+
+def test_close_logs_pending_metrics():
+    logged: List[Dict] = []
+    log_queue = WandbLogQueue(window_steps=100, log_fn=logged.append)
+    for step in range(10):
+        log_queue.log(episode(1.0), steps=step)
+    log_queue.close()
+    assert len(logged) == 1
+    assert logged[0]["Episodes"] == 10
+    assert logged[0]["steps"] == 9
+
+
+def test_window_seconds():
+    logged: List[Dict] = []
+    log_queue = WandbLogQueue(
+        window_steps=100, window_seconds=0.05, log_fn=logged.append
+    )
+    log_queue.log(episode(1.0), steps=0)
+    log_queue.log(episode(2.0), steps=1)
+    time.sleep(0.5)
+    # The window was logged after `window_seconds`, without flushing.
+    assert len(logged) == 1
+    assert logged[0]["Mean reward per episode"] == 1.5
+    log_queue.close()
+
+
+class BrokenMetrics(EpisodeMetrics):
+    def __add__(self, other):
+        raise RuntimeError("Can't add these metrics.")
+
+
+def test_error_while_aggregating_doesnt_stop_the_thread():
+    logged: List[Dict] = []
+    log_queue = WandbLogQueue(window_steps=2, log_fn=logged.append)
+    log_queue.log(BrokenMetrics(n_samples=1, mean_episode_reward=1.0), prefix="A")
+    log_queue.log(episode(2.0), prefix="A")
+    log_queue.flush()
+    # The thread is still running, and logs the next metrics.
+    log_queue.log(episode(3.0), prefix="B")
+    log_queue.flush()
+    assert logged[-1]["B/Mean reward per episode"] == 3.0
+    log_queue.close()
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="Needs fork."
+)
+def test_can_be_used_in_forked_process():
+    logged: List[Dict] = []
+    log_queue = WandbLogQueue(log_fn=logged.append)
+    log_queue.log(episode(1.0))
+    log_queue.flush()
+
+    def child(connection) -> None:
+        # NOTE: `logged` is a copy of the parent's list in the child.
+        log_queue.log(episode(2.0))
+        log_queue.flush()
+        log_queue.close()
+        connection.send(logged[-1]["Mean reward per episode"])
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=child, args=(sender,))
+    process.start()
+    try:
+        assert receiver.poll(timeout=10), "The child process is stuck."
+        assert receiver.recv() == 2.0
+        process.join()
+    finally:
+        if process.is_alive():
+            process.terminate()
+    assert process.exitcode == 0
+    # The queue of the parent still works.
+    log_queue.log(episode(3.0))
+    log_queue.close()
+    assert [d["Mean reward per episode"] for d in logged] == [1.0, 3.0]